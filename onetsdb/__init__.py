@@ -4,6 +4,6 @@ Created on 2019-10-22
 '''
 
 from .base import connect, TSDBPoint, TSDBBase
-from . import influx, mongo, sqlite
+from . import influx, mongo, sqlite, columnar, segment
 
-__version__ = '1.3.1'
+__version__ = '1.4.0'
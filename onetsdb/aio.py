@@ -0,0 +1,144 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+asyncio interface (python 3.6+), the blocking backend calls run on a bounded thread pool:
+
+    tsdb = onetsdb.aio.connect('mongodb://localhost/tsdb')
+    await tsdb.write_points('device', points)
+    async for p in tsdb.query('device').filter(devid='A1'):
+        ...
+    count = await tsdb.query('device').count()
+'''
+import asyncio
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from .base import connect as sync_connect
+
+
+class AsyncTSDB(object):
+    '''
+    asyncio facade of a TSDBBase
+    '''
+
+    def __init__(self, tsdb, max_workers=4, executor=None):
+        self.tsdb = tsdb
+        self._own_executor = executor == None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers)
+
+    def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def write_points(self, table, points):
+        return await self._run(self.tsdb.write_points, table, points)
+
+    async def write_point(self, table, point):
+        return await self._run(self.tsdb.write_point, table, point)
+
+    async def register_table(self, table, options):
+        return await self._run(self.tsdb.register_table, table, options)
+
+    async def drop_table(self, table):
+        return await self._run(self.tsdb.drop_table, table)
+
+    async def flush(self):
+        return await self._run(self.tsdb.flush)
+
+    async def commit(self):
+        return await self._run(self.tsdb.commit)
+
+    async def close(self):
+        await self._run(self.tsdb.close)
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    def query(self, table, **kwargs):
+        return AsyncTSDBQuery(self, self.tsdb.query(table, **kwargs))
+
+
+class AsyncTSDBQuery(object):
+    '''
+    asyncio facade of a TSDBQuery, building the query is synchronous, running it is awaited
+    '''
+    chunk_size = 500
+
+    def __init__(self, atsdb, query):
+        self.atsdb = atsdb
+        self.query = query
+
+    def _wrap(self, query):
+        return self.__class__(self.atsdb, query)
+
+    def filter(self, **kwargs):
+        return self._wrap(self.query.filter(**kwargs))
+
+    def order_by(self, *args):
+        return self._wrap(self.query.order_by(*args))
+
+    def time_range(self, start=None, end=None):
+        return self._wrap(self.query.time_range(start, end))
+
+    def after(self, time):
+        return self._wrap(self.query.after(time))
+
+    def before(self, time):
+        return self._wrap(self.query.before(time))
+
+    def time_group(self, group):
+        return self._wrap(self.query.time_group(group))
+
+    def values(self, **kwargs):
+        return self._wrap(self.query.values(**kwargs))
+
+    def chunk(self, size):
+        return self._wrap(self.query.chunk(size))
+
+    def view(self):
+        return self._wrap(self.query.view())
+
+    async def __aiter__(self):
+        # 在线程池中分批取出, 每批 chunk_size 个点
+        size = self.query.options.get('chunk_size') or self.chunk_size
+        it = await self.atsdb._run(iter, self.query)
+        while True:
+            points = await self.atsdb._run(lambda: list(itertools.islice(it, size)))
+            for p in points:
+                yield p
+            if len(points) < size:
+                break
+
+    async def all(self):
+        return await self.atsdb._run(self.query.all)
+
+    async def _getitem(self, item):
+        if type(item) == slice:
+            return await self.atsdb._run(lambda: list(self.query[item]))
+        return await self.atsdb._run(self.query.__getitem__, item)
+
+    def __getitem__(self, item):
+        return self._getitem(item)
+
+    async def count(self):
+        return await self.atsdb._run(self.query.count)
+
+    async def first(self):
+        return await self.atsdb._run(self.query.first)
+
+    async def last(self):
+        return await self.atsdb._run(self.query.last)
+
+    async def delete(self):
+        return await self.atsdb._run(self.query.delete)
+
+    async def columns(self, *fields):
+        return await self.atsdb._run(self.query.columns, *fields)
+
+
+def connect(uri, max_workers=4):
+    '''
+    connect with onetsdb.connect(uri) and wrap it in an AsyncTSDB
+    '''
+    return AsyncTSDB(sync_connect(uri), max_workers=max_workers)
@@ -5,9 +5,12 @@ Created on 2019-10-22
 
 from __future__ import print_function
 
+import threading
+
 NotImplemented = NotImplementedError()
 
 str_types = tuple({type(''), type(u'')})
+int_types = tuple({type(0), type(10 ** 20)})
 
 DATETIME_FORMATS = ['%Y-%m-%d %H:%M:%S',
                     '%Y/%m/%d %H:%M:%S',
@@ -17,6 +20,14 @@ DATETIME_FORMATS = ['%Y-%m-%d %H:%M:%S',
                     '%Y/%m/%d %H',
                     '%Y-%m-%d', ]
 
+TIME_GROUP_FORMATS = {
+    'year': "%Y-01-01",
+    'month': "%Y-%m-01",
+    'day': "%Y-%m-%d",
+    'hour': "%Y-%m-%d %H:00:00",
+    'minute': "%Y-%m-%d %H:%M:00",
+}
+
 
 def try_parset_datetime_str(s):
     import datetime
@@ -31,9 +42,102 @@ class TSDBException(Exception):
     pass
 
 
+def seek_range(item):
+    '''
+    Map an index or slice onto (reverse, offset, limit) for a seek on the time index.
+    Negative positions are read from the tail in descending order, limit None means no limit.
+    Return None when the item can only be resolved with the total count.
+    '''
+    if type(item) != slice:
+        if item < 0:
+            return True, -item - 1, 1
+        return False, item, 1
+    start = item.start or 0
+    stop = item.stop
+    if start >= 0:
+        if stop == None:
+            return False, start, None
+        elif stop >= 0:
+            return False, start, max(0, stop - start)
+    else:
+        if stop == None:
+            return True, 0, -start
+        elif stop < 0:
+            return True, -stop, max(0, stop - start)
+
+
+def to_epoch_us(tm):
+    '''
+    naive (local) datetime to int epoch microseconds
+    '''
+    import time
+    return int(time.mktime(tm.timetuple())) * 1000000 + tm.microsecond
+
+
+def _pack_column(typecode, values):
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if typecode == None:
+        return numpy.array(values, dtype=object) if numpy else values
+    if numpy:
+        return numpy.array(values, dtype='int64' if typecode == 'q' else 'float64')
+    import array
+    if typecode == 'd' and None in values:
+        values = [float('nan') if v == None else v for v in values]
+    return array.array(typecode, values)
+
+
+def to_column(values, kind=None):
+    '''
+    Pack a list of values into one contiguous column: a NumPy array when NumPy is installed, else an array.array.
+    kind ('int' or 'float') skips type inference, None is stored as nan in float columns,
+    non numeric values are kept as a list (an object array with NumPy).
+    '''
+    typecode = {'int': 'q', 'float': 'd'}.get(kind)
+    if typecode:
+        try:
+            return _pack_column(typecode, values)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    typecode = 'q'
+    for v in values:
+        if v == None or isinstance(v, float):
+            typecode = 'd'
+        elif isinstance(v, bool) or not isinstance(v, int_types):
+            return _pack_column(None, values)
+    return _pack_column(typecode, values)
+
+
+def get_order_by(query, time_field, reverse=False):
+    '''
+    (field, descending) pairs of query.order_by, `time` and `_time` both name the time field.
+    Default to ascending time, reverse flips every direction.
+    '''
+    orders = []
+    for o in query.options.get('order_by') or ['time']:
+        desc = o.startswith('-')
+        f = o.lstrip('-+')
+        if f in ('time', '_time'):
+            f = time_field
+        orders.append((f, desc != reverse))
+    return orders
+
+
+def is_time_descending(query):
+    orders = get_order_by(query, 'time')
+    return orders[0] == ('time', True)
+
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
 class TSDBPoint(object):
-    time = 0
-    data = {}
+    __slots__ = ('time', 'data')
 
     def __init__(self, time=None, data=None):
         # if not time:
@@ -52,7 +156,44 @@ class TSDBPoint(object):
         return self.__str__()
 
 
+class RowView(Mapping):
+    '''
+    Read-only data of a point that wraps the driver's row instead of copying it into a dict,
+    fields are looked up through an index map shared by all rows of a result.
+    '''
+    __slots__ = ('_index', '_row')
+
+    def __init__(self, index, row):
+        self._index = index
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._row[self._index[key]]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
 class TSDBBase(object):
+    # connect() 的 uri
+    uri = None
+    # 可否在多个线程中同时查询
+    _thread_safe = True
+    _write_buffer = None
+    _query_cache = None
+    _instrument = None
+    _rollups = None
+    _partitions = None
+    _hot_tiers = None
+    # rollup 表的额外选项
+    _rollup_table_options = {}
+
     def write_points(self, table, points):
         '''
         write points
@@ -61,10 +202,224 @@ class TSDBBase(object):
 
     def write_point(self, table, point):
         '''
-        write point
+        write point, through the write buffer if there is one
         '''
+        if self._write_buffer:
+            return self._write_buffer.add(table, [point])
         return self.write_points(table, [point])
 
+    def set_write_buffer(self, size=1000, age=1.0):
+        '''
+        Buffer write_point calls per table, a background thread writes them when size points are pending or
+        the oldest is age seconds old. flush() writes the pending points now, size=0 turns the buffer off.
+        Points without a time get the time of their write_point call.
+        Points of failed background writes are handed back by a WriteBufferError from the next write_point or flush().
+        '''
+        from .buffer import WriteBuffer
+        self._close_buffers()
+        if size:
+            self._write_buffer = WriteBuffer(self, size=size, age=age)
+
+    def flush(self):
+        if self._write_buffer:
+            self._write_buffer.flush()
+
+    def add_hook(self, hook):
+        '''
+        call hook(event) after every backend operation, see onetsdb.instrument for the event
+        '''
+        from .instrument import Instrument
+        if self._instrument == None:
+            self._instrument = Instrument()
+        self._instrument.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        if self._instrument != None and hook in self._instrument.hooks:
+            self._instrument.hooks.remove(hook)
+            if not self._instrument.hooks:
+                self._instrument = None
+
+    def set_slow_log(self, threshold=1.0, logger=None):
+        '''
+        log (to the onetsdb.slow logger by default) the operations taking threshold seconds or more, None turns it off
+        '''
+        from .instrument import SlowLog
+        for hook in list(self._instrument.hooks if self._instrument else []):
+            if isinstance(hook, SlowLog):
+                self.remove_hook(hook)
+        if threshold != None:
+            return self.add_hook(SlowLog(threshold, logger))
+
+    def enable_stats(self):
+        '''
+        collect in-memory stats per operation and statement shape, returns the StatsCollector
+        '''
+        from .instrument import StatsCollector
+        for hook in (self._instrument.hooks if self._instrument else []):
+            if isinstance(hook, StatsCollector):
+                return hook
+        return self.add_hook(StatsCollector())
+
+    def _operation(self, op, table=None, query=None):
+        if self._instrument == None:
+            return _no_operation
+        return self._instrument.operation(self, op, table, query)
+
+    def _trace(self, statement):
+        # 后端执行的语句
+        if self._instrument != None:
+            self._instrument.statement(self, statement)
+
+    def set_query_cache(self, size=1000, ttl=60):
+        '''
+        Cache query results (LRU of size entries, ttl seconds), entries of a table are dropped when
+        points are written or deleted in their time range, results of time ranges ended in the past do not expire.
+        size=0 turns the cache off.
+        '''
+        from .cache import QueryCache
+        self._query_cache = QueryCache(size=size, ttl=ttl) if size else None
+
+    def cache_stats(self):
+        '''
+        hits, misses, evictions... of the query cache, None without cache
+        '''
+        if self._query_cache:
+            return self._query_cache.stats()
+
+    def set_hot_tier(self, table, tags, points=1, window=None, max_series=10000):
+        '''
+        Keep the last points (and the points of the last window seconds) of each combination of the tags of table
+        in memory, at most max_series series. Queries on one series within the kept points are answered from memory.
+        Only the writes of this process are seen. points=0 turns it off.
+        '''
+        from .hot import HotTier
+        tiers = dict(self._hot_tiers or {})
+        tiers.pop(table, None)
+        if points:
+            tiers[table] = HotTier(self, table, tags, points=points, window=window, max_series=max_series)
+        self._hot_tiers = tiers or None
+
+    def hot_stats(self, table):
+        '''
+        series, hits, misses, loads, evictions... of the hot tier of table, None without one
+        '''
+        if self._hot_tiers and table in self._hot_tiers:
+            return self._hot_tiers[table].stats()
+
+    def _point_columns(self, table):
+        # 读出的点包含的字段 {字段: 类型}, None 为写入的字段
+        return None
+
+    def _memory_define(self, table):
+        # 只保存在本连接中的表定义, 新的连接需重新注册; 保存在数据库中时为 None
+        return None
+
+    def register_rollup(self, table, group, values, tags=None):
+        '''
+        Keep partial aggregates of values per group bucket and tags in the table <table>__<group>, updated by write_points,
+        time_group queries on group or a coarser one, filtering only on tags, are answered from it.
+        '''
+        from .rollup import Rollup
+        rollup = Rollup(self, table, group, values, tags)
+        rollup.register()
+        rollups = [r for r in self._get_rollups(table) if r.name != rollup.name]
+        self._rollups = dict(self._rollups or {})
+        self._rollups[table] = rollups + [rollup]
+        return rollup
+
+    def _get_rollups(self, table):
+        return self._rollups.get(table, []) if self._rollups else []
+
+    def _merge_rollup(self, rollup, partials):
+        '''
+        merge partials {(bucket, tag values): partial} into the table of rollup, generic version rewriting the touched buckets
+        '''
+        rollup.rewrite(partials)
+
+    def _find_rollup(self, query):
+        # 可用的 rollup 中粒度最粗的
+        from .rollup import GROUPS
+        best = None
+        for r in self._get_rollups(query.table):
+            if r.match(query) and (best == None or GROUPS.index(r.group) > GROUPS.index(best.group)):
+                best = r
+        return best
+
+    def _list_tables(self):
+        '''
+        names of the tables, for the partitions of partitioned tables
+        '''
+        return []
+
+    def _register_partitioned(self, table, options):
+        # register_table 中 partition 选项的处理
+        from .partition import Partitioned
+        options = dict(options)
+        unit = options.pop('partition')
+        retention = options.pop('retention', None)
+        if table in self._list_tables():
+            raise TSDBException('Table %s exists and is not partitioned' % table)
+        part = Partitioned(self, table, unit, options, retention)
+        self._partitions = dict(self._partitions or {})
+        self._partitions[table] = part
+        part.register()
+        return part
+
+    def _get_partitioned(self, table):
+        # 本进程注册的, 或按已有分区的表名发现的分区表
+        part = self._partitions.get(table, False) if self._partitions else False
+        if part == False:
+            from .partition import Partitioned, find_partitions
+            tables = self._list_tables()
+            parts, unit = find_partitions(tables, table)
+            part = Partitioned(self, table, unit) if parts and table not in tables else None
+            self._partitions = dict(self._partitions or {})
+            self._partitions[table] = part
+        return part
+
+    def expire(self, table=None):
+        '''
+        drop the partitions older than the retention of table (default every partitioned table), returns their names
+        '''
+        dropped = []
+        for t, part in list((self._partitions or {}).items()):
+            if part != None and table in (None, t):
+                dropped.extend(part.expire())
+        return dropped
+
+    def _before_write(self, table, points):
+        # 有 rollup 或缓存时写入后还需遍历一次
+        return list(points) if self._get_rollups(table) or self._query_cache or self._hot_tiers else points
+
+    def _after_write(self, table, points, rollups=True):
+        # rollups=False: rollup 已在写入的事务中更新
+        if not points:
+            return
+        for r in self._get_rollups(table) if rollups else ():
+            r.update(points)
+        if self._hot_tiers and table in self._hot_tiers:
+            self._hot_tiers[table].update(points)
+        if self._query_cache:
+            times = [p.time for p in points if p.time != None]
+            self._query_cache.invalidate(table, min(times) if times else None, max(times) if times else None)
+
+    def _after_delete(self, query):
+        options = query.options
+        start = options.get('time_start') or options.get('time_after')
+        end = options.get('time_end') or options.get('time_before')
+        for r in self._get_rollups(query.table):
+            r.rebuild(start, end)
+        if self._hot_tiers and query.table in self._hot_tiers:
+            self._hot_tiers[query.table].invalidate()
+        if self._query_cache:
+            self._query_cache.invalidate(query.table, start, end)
+
+    def _close_buffers(self):
+        if self._write_buffer:
+            wb, self._write_buffer = self._write_buffer, None
+            wb.close()
+
     def query(self, table, **kwargs):
         q = TSDBQuery(self, table)
         if kwargs:
@@ -89,6 +444,43 @@ class TSDBBase(object):
     def getitem_with_query(self, query, item):
         raise NotImplemented
 
+    def columns_with_query(self, query, fields=None):
+        '''
+        columns of the query result, generic version built from the points
+        '''
+        times = []
+        cols = {f: [] for f in fields} if fields else {}
+        n = 0
+        for p in query:
+            times.append(to_epoch_us(p.time))
+            if not fields:
+                for k in p.data:
+                    if k not in cols:
+                        cols[k] = [None] * n
+            for k, c in cols.items():
+                c.append(p.data.get(k))
+            n += 1
+        res = {'time': to_column(times, 'int')}
+        for k, c in cols.items():
+            res[k] = to_column(c)
+        return res
+
+    def pages_with_query(self, query, size):
+        '''
+        pages of the query, generic version slicing one stream of the points (read in chunks of size where the backend
+        supports it), several points at the same time never fall between two pages
+        '''
+        if not query.options.get('chunk_size'):
+            query = query.chunk(size)
+        page = []
+        for p in query:
+            page.append(p)
+            if len(page) >= size:
+                yield page
+                page = []
+        if page:
+            yield page
+
     def register_table(self, table, options):
         raise NotImplemented
 
@@ -133,11 +525,52 @@ class TSDBQuery(object):
         q.options['time_end'] = end
         return q
 
+    def after(self, time):
+        '''
+        only points strictly after time, used to resume from the last time seen
+        '''
+        q = self.copy()
+        q.options['time_after'] = time
+        return q
+
+    def before(self, time):
+        '''
+        only points strictly before time, used to resume a descending read
+        '''
+        q = self.copy()
+        q.options['time_before'] = time
+        return q
+
     def time_group(self, group):
         q = self.copy()
         q.options['time_group'] = group
         return q
 
+    def view(self):
+        '''
+        points carry a read-only RowView over the driver's row as data instead of a new dict, where the backend supports it
+        '''
+        q = self.copy()
+        q.options['row_view'] = True
+        return q
+
+    def chunk(self, size):
+        '''
+        stream results from the backend in chunks of size rows
+        '''
+        q = self.copy()
+        q.options['chunk_size'] = size
+        return q
+
+    def parallel(self, workers=4, shards=None, processes=False, factory=None):
+        '''
+        Run iteration, count() and columns() as shards of the time range in a pool of workers threads (or processes),
+        each shard on factory(), the tsdb itself when it is thread safe, or its own connect(tsdb.uri).
+        '''
+        q = self.copy()
+        q.options['parallel'] = {'workers': workers, 'shards': shards, 'processes': processes, 'factory': factory}
+        return q
+
     def values(self, **kwargs):
         q = self.copy()
         q.options['values'] = kwargs
@@ -146,23 +579,185 @@ class TSDBQuery(object):
     def all(self):
         return list(self)
 
+    def pages(self, size=1000):
+        '''
+        iterate points page by page, backends with a unique key seek on (time, key) after (or before, if ordered by -time) the last point seen
+        '''
+        return self._backend().pages_with_query(self, size)
+
+    def _backend(self):
+        # 分区表由各分区的查询组成
+        return self.tsdb._get_partitioned(self.table) or self.tsdb
+
+    def _hot(self, op, *args):
+        # 由内存中的最新点回答
+        tiers = self.tsdb._hot_tiers
+        if tiers and self.table in tiers:
+            return tiers[self.table].answer(self, op, *args)
+        return False, None
+
+    def _rollup_points(self):
+        # 可由 rollup 计算的聚合查询, 结果只有每个桶一个点
+        if self.options.get('values'):
+            rollup = self.tsdb._find_rollup(self)
+            if rollup != None:
+                return list(rollup.fetch(self))
+
+    def _run(self, op, func, *args):
+        # 缓存, 统计
+        cache = self.tsdb._query_cache
+        if self.tsdb._instrument == None:
+            return cache.run(self, op, func, *args) if cache != None else func(*args)
+        with self.tsdb._operation(op, self.table, self) as o:
+            res = cache.run(self, op, func, *args) if cache != None else func(*args)
+            o.rows_out = len(res) if isinstance(res, list) else 1 if res != None else 0
+            if op == 'columns':
+                o.rows_out = len(res['time'])
+                o.bytes = sum([getattr(c, 'nbytes', None) or len(c) * getattr(c, 'itemsize', 0) for c in res.values()])
+        return res
+
+    def _fetch(self):
+        hit, res = self._hot('fetch')
+        if hit:
+            return iter(res)
+        if self.options.get('values'):
+            rollup = self.tsdb._find_rollup(self)
+            if rollup != None:
+                return rollup.fetch(self)
+        if self.options.get('parallel'):
+            from .parallel import fetch_parallel
+            return fetch_parallel(self)
+        return self._backend().fetch_with_query(self)
+
+    def _iter(self):
+        cache = self.tsdb._query_cache
+        if cache != None:
+            return cache.iterate(self, self._fetch)
+        return self._fetch()
+
     def __iter__(self):
-        return self.tsdb.fetch_with_query(self)
+        if self.tsdb._instrument != None:
+            return self.tsdb._instrument.iterate(self.tsdb, 'aggregate' if self.options.get('values') else 'fetch', self, self._iter)
+        return self._iter()
+
+    def _getitem(self, item):
+        hit, res = self._hot('getitem', item)
+        if hit:
+            return res
+        pts = self._rollup_points()
+        if pts != None:
+            return pts[item]
+        return self._backend().getitem_with_query(self, item)
 
     def __getitem__(self, item):
-        return self.tsdb.getitem_with_query(self, item)
+        if type(item) == slice and (self.tsdb._query_cache != None or self.tsdb._instrument != None):
+            return iter(self._run('getitem', lambda item: list(self._getitem(item)), item))
+        return self._run('getitem', self._getitem, item)
+
+    def _columns(self, fields):
+        hit, res = self._hot('columns', fields)
+        if hit:
+            return res
+        if self.options.get('parallel'):
+            from .parallel import columns_parallel
+            return columns_parallel(self, fields)
+        return self._backend().columns_with_query(self, fields)
+
+    def columns(self, *fields):
+        '''
+        Result as columns: {'time': int64 epoch microseconds, field: values, ...}, one contiguous array per column
+        '''
+        return self._run('columns', self._columns, fields)
 
     def delete(self):
-        return self.tsdb.delete_with_query(self)
+        with self.tsdb._operation('delete', self.table, self):
+            res = self._backend().delete_with_query(self)
+        self.tsdb._after_delete(self)
+        return res
+
+    def _count(self):
+        hit, res = self._hot('count')
+        if hit:
+            return res
+        pts = self._rollup_points()
+        if pts != None:
+            return len(pts)
+        if self.options.get('parallel'):
+            from .parallel import count_parallel
+            return count_parallel(self)
+        return self._backend().count_with_query(self)
 
     def count(self):
-        return self.tsdb.count_with_query(self)
+        return self._run('count', self._count)
+
+    def _first(self):
+        hit, res = self._hot('first')
+        if hit:
+            return res
+        pts = self._rollup_points()
+        if pts != None:
+            return pts[0] if pts else None
+        return self._backend().first_with_query(self)
 
     def first(self):
-        return self.tsdb.first_with_query(self)
+        return self._run('first', self._first)
+
+    def _last(self):
+        hit, res = self._hot('last')
+        if hit:
+            return res
+        pts = self._rollup_points()
+        if pts != None:
+            return pts[-1] if pts else None
+        return self._backend().last_with_query(self)
 
     def last(self):
-        return self.tsdb.last_with_query(self)
+        return self._run('last', self._last)
+
+
+class _NoOperation(object):
+    '''
+    operation used when nothing is instrumented
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, et, ev, tb):
+        pass
+
+    def __setattr__(self, key, value):
+        pass
+
+
+_no_operation = _NoOperation()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(key, factory, pooled=True):
+    '''
+    process-wide client registry, the client for key is made by factory() once and shared by every connect()
+    '''
+    if not pooled:
+        return factory()
+    with _clients_lock:
+        client = _clients.get(key)
+        if client == None:
+            client = _clients[key] = factory()
+        return client
+
+
+def release_clients():
+    '''
+    close and forget all shared clients
+    '''
+    with _clients_lock:
+        for client in _clients.values():
+            if hasattr(client, 'close'):
+                client.close()
+        _clients.clear()
 
 
 def connect(uri):
@@ -182,39 +777,87 @@ def connect(uri):
         dbname = param['db'][0]
     if not dbname.strip():
         dbname = 'tsdb'
+    # 默认复用同一服务器的客户端, pool=0 时每次新建
+    pooled = param.get('pool', ['1'])[0] not in ('0', 'false')
+    try:
+        port = res.port
+    except ValueError:
+        # sqlite3://:memory:
+        port = None
+    server = (res.scheme, res.hostname, port, res.username, res.password)
     if res.scheme == 'mongodb':
         # MongoDB
         from pymongo import MongoClient
         from .mongo import MongoTSDB
-        client = MongoClient(host=res.hostname, port=int(res.port or 27017), username=res.username or None, password=res.password or None)
+        kwargs = {}
+        if param.get('pool_size'):
+            kwargs['maxPoolSize'] = int(param['pool_size'][0])
+        client = get_client(server, lambda: MongoClient(host=res.hostname, port=int(port or 27017), username=res.username or None, password=res.password or None, **kwargs), pooled)
         dbname = dbname.strip('/')
         db = client.get_database(dbname)
         tsdb = MongoTSDB(db)
+        if param.get('default_time'):
+            tsdb.default_time = param['default_time'][0] not in ('0', 'false')
     elif res.scheme == 'influxdb':
         # InfluxDB
         from influxdb import InfluxDBClient
         from .influx import InfluxDB, InfluxTSDB
-        client = InfluxDBClient(host=res.hostname, port=int(res.port or 8086), username=res.username or None, password=res.password or None)
+        kwargs = {}
+        if param.get('pool_size'):
+            kwargs['pool_size'] = int(param['pool_size'][0])
+        client = get_client(server, lambda: InfluxDBClient(host=res.hostname, port=int(port or 8086), username=res.username or None, password=res.password or None, **kwargs), pooled)
         dbname = dbname.strip('/')
-        db = InfluxDB(dbname, client)
+        # 数据库在首次写入时才创建, 同一进程只创建一次
+        db = get_client(server + (dbname,), lambda: InfluxDB(dbname, client), pooled)
         tsdb = InfluxTSDB(db)
+        if param.get('chunk_size'):
+            tsdb.chunk_size = int(param['chunk_size'][0])
     elif res.scheme == 'sqlite3':
         # sqlite3
         import sqlite3
-        from .sqlite import SqliteTSDB
-        if ':memory:' in dbname:
+        from .sqlite import SqliteTSDB, configure
+        if ':memory:' in dbname or ':memory:' in res.netloc:
             # momery db
             dbname = ':memory:'
-        con = sqlite3.connect(dbname, check_same_thread=False)
-        tsdb = SqliteTSDB(con)
+        pragmas = {
+            'journal_mode': param.get('journal_mode', [None])[0],
+            'synchronous': param.get('synchronous', [None])[0],
+        }
+        if dbname != ':memory:' and param.get('thread_local', ['0'])[0] not in ('0', 'false'):
+            # 每个线程使用自己的连接
+            tsdb = SqliteTSDB(factory=lambda: configure(sqlite3.connect(dbname, check_same_thread=False), **pragmas))
+        else:
+            con = configure(sqlite3.connect(dbname, check_same_thread=False), **pragmas)
+            tsdb = SqliteTSDB(con)
+        if param.get('durability'):
+            tsdb.set_durability(param['durability'][0], float(param['commit_interval'][0]) if param.get('commit_interval') else None)
     elif res.scheme == 'tslite':
         # tslite
         import tslite
         from .xtslite import TsliteTSDB
         db = tslite.Database(dbname)
         tsdb = TsliteTSDB(db=db)
+    elif res.scheme == 'columnar':
+        # 列式存储
+        from .columnar import ColumnarTSDB
+        tsdb = ColumnarTSDB(dbname)
+    elif res.scheme == 'segment':
+        # mmap 段文件
+        from .segment import SegmentTSDB
+        tsdb = SegmentTSDB(dbname)
     else:
         raise TSDBException('Unknow uri: %s' % uri)
+    if param.get('batch_size'):
+        tsdb.batch_size = int(param['batch_size'][0])
+    if param.get('cache_size'):
+        tsdb.set_query_cache(size=int(param['cache_size'][0]), ttl=float(param['cache_ttl'][0]) if param.get('cache_ttl') else 60)
+    if param.get('slow_log'):
+        tsdb.set_slow_log(float(param['slow_log'][0]))
+    if param.get('stats', ['0'])[0] not in ('0', 'false'):
+        tsdb.enable_stats()
+    if param.get('buffer_size') or param.get('buffer_age'):
+        tsdb.set_write_buffer(size=int(param.get('buffer_size', [1000])[0]), age=float(param.get('buffer_age', [1.0])[0]))
+    tsdb.uri = uri
     return tsdb
 
 
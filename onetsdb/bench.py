@@ -0,0 +1,244 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Benchmarks for any connect() uri, results as JSON:
+
+    python -m onetsdb.bench sqlite3://:memory: --size 100000 --output bench.json
+    python -m onetsdb.bench sqlite3://:memory: --compare bench.json --threshold 0.2
+'''
+from __future__ import print_function
+
+import datetime
+import json
+import platform
+import random
+import sys
+import time
+
+from . import __version__
+from .base import connect, TSDBPoint, Mean, Max, Min, Count
+
+timer = getattr(time, 'perf_counter', time.time)
+
+CASES = ['write_single', 'write_batch', 'scan', 'scan_range', 'count_filter', 'first', 'last', 'index', 'aggregate', 'aggregate_group', 'columns']
+
+START = datetime.datetime(2020, 1, 1)
+DEVICES = 10
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100.0
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+def summarize(latencies, points):
+    '''
+    throughput and latency percentiles (ms) of a case, latencies in seconds
+    '''
+    total = sum(latencies)
+    if not latencies:
+        return {'ops': 0, 'points': points, 'seconds': 0, 'ops_per_sec': None, 'points_per_sec': None, 'latency_ms': None}
+    return {
+        'ops': len(latencies),
+        'points': points,
+        'seconds': total,
+        'ops_per_sec': len(latencies) / total if total else None,
+        'points_per_sec': points / total if total else None,
+        'latency_ms': {
+            'min': min(latencies) * 1000,
+            'p50': percentile(latencies, 50) * 1000,
+            'p90': percentile(latencies, 90) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': max(latencies) * 1000,
+            'mean': total / len(latencies) * 1000,
+        },
+    }
+
+
+def make_points(start, count, rnd=random):
+    return [TSDBPoint(time=START + datetime.timedelta(seconds=i), data={
+        'devid': 'D%d' % (i % DEVICES),
+        'v': rnd.random() * 100,
+        'i': i,
+    }) for i in range(start, start + count)]
+
+
+def timed(func, repeat):
+    latencies = []
+    points = 0
+    for _ in range(repeat):
+        s = timer()
+        n = func()
+        latencies.append(timer() - s)
+        points += n or 0
+    return latencies, points
+
+
+class Bench(object):
+    '''
+    Run the cases on a table of uri, size points written in batches then single points after them
+    '''
+
+    def __init__(self, uri, size=10000, single=1000, batch=1000, repeat=10, table='bench', cases=None, seed=0):
+        self.uri = uri
+        self.size = size
+        self.single = min(single, size)
+        self.batch = batch
+        self.repeat = repeat
+        self.table = table
+        self.cases = cases or CASES
+        self.random = random.Random(seed)
+
+    def setup(self):
+        self.tsdb = connect(self.uri)
+        self.tsdb.drop_table(self.table)
+        self.tsdb.register_table(self.table, {
+            'tags': {'devid': 'str'},
+            'fields': {'v': 'float', 'i': 'int'},
+        })
+
+    def teardown(self):
+        self.tsdb.drop_table(self.table)
+        self.tsdb.close()
+
+    def query(self):
+        return self.tsdb.query(self.table)
+
+    def case_write_batch(self):
+        pts = make_points(0, self.size, self.random)
+        batches = iter([pts[i:i + self.batch] for i in range(0, len(pts), self.batch)])
+        return timed(lambda: self.tsdb.write_points(self.table, next(batches)), (len(pts) + self.batch - 1) // self.batch)
+
+    def case_write_single(self):
+        pts = iter(make_points(self.size, self.single, self.random))
+        return timed(lambda: self.tsdb.write_point(self.table, next(pts)) and 1, self.single)
+
+    def _count(self, q):
+        n = 0
+        for _ in q:
+            n += 1
+        return n
+
+    def case_scan(self):
+        return timed(lambda: self._count(self.query()), self.repeat)
+
+    def case_scan_range(self):
+        total = self.size + self.single
+
+        def run():
+            # 随机位置的 10% 时间段
+            s = self.random.randint(0, total - total // 10)
+            return self._count(self.query().time_range(START + datetime.timedelta(seconds=s), START + datetime.timedelta(seconds=s + total // 10 - 1)))
+
+        return timed(run, self.repeat)
+
+    def case_count_filter(self):
+        return timed(lambda: self.query().filter(devid='D%d' % self.random.randint(0, DEVICES - 1)).count() and 1, self.repeat)
+
+    def case_first(self):
+        return timed(lambda: self.query().first() and 1, self.repeat)
+
+    def case_last(self):
+        return timed(lambda: self.query().last() and 1, self.repeat)
+
+    def case_index(self):
+        total = self.size + self.single
+        return timed(lambda: self.query()[self.random.randint(0, total - 1)] and 1, self.repeat if total else 0)
+
+    def case_aggregate(self):
+        q = self.query().values(mean=Mean('v'), max=Max('v'), min=Min('v'), count=Count('v'))
+        return timed(lambda: len(list(q)), self.repeat)
+
+    def case_aggregate_group(self):
+        q = self.query().time_group('hour').values(mean=Mean('v'), max=Max('v'), count=Count('v'))
+        return timed(lambda: len(list(q)), self.repeat)
+
+    def case_columns(self):
+        return timed(lambda: len(self.query().columns('v', 'i')['time']), self.repeat)
+
+    def run(self):
+        self.setup()
+        try:
+            cases = {}
+            # 写入在前, 读取的用例依赖写入的数据
+            order = ['write_batch', 'write_single'] + [c for c in CASES if c not in ('write_batch', 'write_single')]
+            for name in order:
+                if name in ('write_batch', 'write_single') or name in self.cases:
+                    latencies, points = getattr(self, 'case_%s' % name)()
+                    if name in self.cases:
+                        cases[name] = summarize(latencies, points)
+        finally:
+            self.teardown()
+        return {
+            'uri': self.uri,
+            'size': self.size,
+            'single': self.single,
+            'batch': self.batch,
+            'repeat': self.repeat,
+            'cases': cases,
+        }
+
+
+def compare(result, baseline, threshold=0.2):
+    '''
+    cases of result slower than baseline by more than threshold (fraction of ops_per_sec)
+    '''
+    slower = []
+    base = {r['uri']: r for r in baseline.get('results', [])}
+    for r in result['results']:
+        b = base.get(r['uri'])
+        if not b:
+            continue
+        for name, c in r['cases'].items():
+            bc = b['cases'].get(name)
+            if bc and bc['ops_per_sec'] and c['ops_per_sec'] and c['ops_per_sec'] < bc['ops_per_sec'] * (1 - threshold):
+                slower.append({'uri': r['uri'], 'case': name, 'ops_per_sec': c['ops_per_sec'], 'baseline': bc['ops_per_sec']})
+    return slower
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m onetsdb.bench', description='onetsdb benchmarks, results as JSON')
+    parser.add_argument('uris', nargs='*', default=['sqlite3://:memory:'], help='connect() uris, default sqlite3://:memory:')
+    parser.add_argument('--size', type=int, default=10000, help='points written in batches')
+    parser.add_argument('--single', type=int, default=1000, help='points written one by one')
+    parser.add_argument('--batch', type=int, default=1000, help='points per write_points')
+    parser.add_argument('--repeat', type=int, default=10, help='runs of each read case')
+    parser.add_argument('--table', default='bench')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random values and positions')
+    parser.add_argument('--cases', help='comma separated cases, default all: %s' % ','.join(CASES))
+    parser.add_argument('--output', help='write the JSON to this file instead of stdout')
+    parser.add_argument('--compare', help='baseline JSON, exit 1 when a case is slower than it by more than threshold')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args(argv)
+    cases = args.cases.split(',') if args.cases else None
+    for c in cases or []:
+        if c not in CASES:
+            parser.error('unknown case: %s' % c)
+    result = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': datetime.datetime.now().isoformat(),
+        'results': [Bench(uri, size=args.size, single=args.single, batch=args.batch, repeat=args.repeat, table=args.table, cases=cases, seed=args.seed).run() for uri in args.uris],
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            result['regressions'] = compare(result, json.load(f), args.threshold)
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 1 if result.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
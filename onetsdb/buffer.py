@@ -0,0 +1,124 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+
+import datetime
+import threading
+import time
+
+from .base import TSDBException
+
+
+class WriteBufferError(TSDBException):
+    '''
+    Raised by flush(), close() or the next buffered write after background writes failed.
+    failed is [(table, points, exception)] of every failed batch in order, these points are no longer buffered.
+    '''
+
+    def __init__(self, failed):
+        TSDBException.__init__(self, 'Failed to write %d buffered batches, last error: %r' % (len(failed), failed[-1][2]))
+        self.failed = failed
+
+
+class WriteBuffer(object):
+    '''
+    Collect points per table and write them with write_points from a background thread,
+    flushed when size points are pending, when the oldest point is older than age seconds,
+    or on flush()/close().
+    '''
+
+    def __init__(self, tsdb, size=1000, age=1.0, max_pending=None):
+        self.tsdb = tsdb
+        self.size = size
+        self.age = age
+        self.max_pending = max_pending or size * 10
+        self._points = {}
+        self._count = 0
+        self._first = None
+        self._failed = []
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='onetsdb-write-buffer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add(self, table, points):
+        self._raise_error()
+        if getattr(self.tsdb, 'default_time', True):
+            # 没有时间的点取加入缓冲的时间, 而不是后台写入的时间
+            now = datetime.datetime.now()
+            for p in points:
+                if p.time == None:
+                    p.time = now
+        with self._cond:
+            while self._count >= self.max_pending and not self._closed:
+                # 后台写入跟不上, 限制内存
+                self._cond.wait()
+            self._points.setdefault(table, []).extend(points)
+            self._count += len(points)
+            if self._first == None:
+                self._first = time.time()
+                self._cond.notify_all()
+            elif self._count >= self.size:
+                self._cond.notify_all()
+        return len(points)
+
+    def _take(self):
+        points = self._points
+        self._points = {}
+        self._count = 0
+        self._first = None
+        self._cond.notify_all()
+        return points
+
+    def _write(self, points):
+        for table, pts in points.items():
+            try:
+                self.tsdb.write_points(table, pts)
+            except Exception as e:
+                # 交还给调用者, 不重试
+                with self._cond:
+                    self._failed.append((table, pts, e))
+
+    def _due(self):
+        if self._closed or self._count >= self.size:
+            return True
+        return self._first != None and time.time() - self._first >= self.age
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due():
+                    self._cond.wait(None if self._first == None else max(0, self.age - (time.time() - self._first)))
+                if self._closed and not self._count:
+                    return
+            with self._flush_lock:
+                with self._cond:
+                    points = self._take()
+                self._write(points)
+
+    def _raise_error(self):
+        with self._cond:
+            failed, self._failed = self._failed, []
+        if failed:
+            raise WriteBufferError(failed)
+
+    def flush(self):
+        '''
+        write everything pending now, in the calling thread
+        '''
+        with self._flush_lock:
+            with self._cond:
+                points = self._take()
+            self._write(points)
+        self._raise_error()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._raise_error()
@@ -0,0 +1,168 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+
+import array
+import collections
+import datetime
+import threading
+import time
+
+from .base import Aggregate, TSDBPoint
+
+
+def _freeze(v):
+    # 查询参数 -> 可哈希的 key
+    if isinstance(v, dict):
+        return tuple(sorted((k, _freeze(x)) for k, x in v.items()))
+    elif isinstance(v, (list, tuple)):
+        return tuple(_freeze(x) for x in v)
+    elif isinstance(v, slice):
+        return ('slice', v.start, v.stop, v.step)
+    elif isinstance(v, Aggregate):
+        return (v.__class__.__name__, v.field)
+    return v
+
+
+def _copy(value):
+    # 缓存与调用者各有一份点和列, 修改返回的结果不影响缓存
+    if isinstance(value, TSDBPoint):
+        return TSDBPoint(time=value.time, data=dict(value.data))
+    elif isinstance(value, list):
+        return [_copy(v) for v in value]
+    elif isinstance(value, dict):
+        return dict((k, _copy(v)) for k, v in value.items())
+    elif isinstance(value, array.array):
+        return value[:]
+    elif hasattr(value, 'copy') and hasattr(value, 'dtype'):
+        # numpy 数组
+        return value.copy()
+    return value
+
+
+class QueryCache(object):
+    '''
+    LRU cache of query results, keyed by table, options and operation.
+    Entries expire after ttl seconds unless their time range ended in the past,
+    writes and deletes drop the entries of the table whose time range they touch.
+    '''
+    # 不影响结果的选项
+    IGNORED_OPTIONS = ('chunk_size',)
+
+    def __init__(self, size=1000, ttl=60, max_rows=10000):
+        self.size = size
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._entries = collections.OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key(self, query, op, args=()):
+        options = dict((k, v) for k, v in query.options.items() if k not in self.IGNORED_OPTIONS and v not in (None, {}, []))
+        return (query.table, op, _freeze(options), _freeze(args))
+
+    def _time_range(self, options):
+        return options.get('time_start') or options.get('time_after'), options.get('time_end') or options.get('time_before')
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry != None and entry[4] != None and entry[4] < time.time():
+                entry = None
+            if entry == None:
+                self.misses += 1
+                return False, None
+            self._entries[key] = entry
+            self.hits += 1
+            return True, _copy(entry[0])
+
+    def generation(self, table):
+        return self._generations.get(table, 0)
+
+    def put(self, key, query, value, generation):
+        '''
+        store value, a copy the caller no longer references
+        '''
+        start, end = self._time_range(query.options)
+        # 已结束的历史时间段不过期, 只在写入/删除该时间段时失效
+        expires = None if self.ttl == None or (end != None and end < datetime.datetime.now()) else time.time() + self.ttl
+        with self._lock:
+            if self._generations.get(query.table, 0) != generation:
+                # 查询期间有写入
+                return
+            self._entries.pop(key, None)
+            self._entries[key] = (value, query.table, start, end, expires)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def run(self, query, op, func, *args):
+        key = self.key(query, op, args)
+        hit, value = self.get(key)
+        if hit:
+            return value
+        generation = self.generation(query.table)
+        value = func(*args)
+        self.put(key, query, _copy(value), generation)
+        return value
+
+    def iterate(self, query, func):
+        '''
+        iterate the points of func(), cached when there are at most max_rows of them
+        '''
+        key = self.key(query, 'iter')
+        hit, value = self.get(key)
+        if hit:
+            return iter(value)
+        return self._iterate(key, query, func)
+
+    def _iterate(self, key, query, func):
+        generation = self.generation(query.table)
+        points = []
+        for p in func():
+            if points != None:
+                points.append(_copy(p))
+                if len(points) > self.max_rows:
+                    points = None
+            yield p
+        if points != None:
+            self.put(key, query, points, generation)
+
+    def invalidate(self, table, start=None, end=None):
+        '''
+        drop the entries of table whose time range overlaps start..end (None is unbounded)
+        '''
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for key, entry in list(self._entries.items()):
+                if entry[1] != table:
+                    continue
+                if start != None and entry[3] != None and entry[3] < start:
+                    continue
+                if end != None and entry[2] != None and entry[2] > end:
+                    continue
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / float(total) if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
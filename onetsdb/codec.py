@@ -0,0 +1,225 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Column encodings of the columnar storage, in pure Python:
+
+    'dod'      integers (and times in microseconds) as delta-of-delta in variable bit buckets
+    'gorilla'  floats XOR-ed with the previous value, only the meaningful bits are written
+    'json'     anything else (bools, big integers, integers mixed with floats...), zlib compressed JSON
+               (values JSON can not hold are stored as str)
+
+A column is a presence bitmap (omitted when there are no None) followed by the encoded non-None values.
+'''
+from __future__ import print_function
+
+import json
+import struct
+import zlib
+
+from .base import TSDBException, int_types
+
+# delta-of-delta 的位数分档: (前缀, 前缀位数, 数值位数)
+DOD_BUCKETS = [
+    (0b10, 2, 7),
+    (0b110, 3, 12),
+    (0b1110, 4, 20),
+    (0b11110, 5, 32),
+    (0b11111, 5, 64),
+]
+# |v| < 2**61 保证 delta-of-delta 在 64 位的分档内
+MAX_INT = 1 << 61
+
+
+class BitWriter(object):
+    def __init__(self):
+        self.buf = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value, bits):
+        self._acc = (self._acc << bits) | (value & ((1 << bits) - 1))
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self.buf.append((self._acc >> self._bits) & 0xff)
+        self._acc &= (1 << self._bits) - 1
+
+    def getvalue(self):
+        if self._bits:
+            return bytes(self.buf + bytearray([(self._acc << (8 - self._bits)) & 0xff]))
+        return bytes(self.buf)
+
+
+class BitReader(object):
+    def __init__(self, data):
+        self.data = bytearray(data)
+        self._pos = 0
+        self._acc = 0
+        self._bits = 0
+
+    def read(self, bits):
+        while self._bits < bits:
+            self._acc = (self._acc << 8) | self.data[self._pos]
+            self._pos += 1
+            self._bits += 8
+        self._bits -= bits
+        v = self._acc >> self._bits
+        self._acc &= (1 << self._bits) - 1
+        return v
+
+    def read_signed(self, bits):
+        v = self.read(bits)
+        return v - (1 << bits) if v >= 1 << (bits - 1) else v
+
+
+def encode_dod(values):
+    '''
+    integers as delta-of-delta, a run of equal deltas costs one bit per value
+    '''
+    w = BitWriter()
+    prev = delta = 0
+    for v in values:
+        d = v - prev
+        dod = d - delta
+        prev, delta = v, d
+        if dod == 0:
+            w.write(0, 1)
+            continue
+        for prefix, pbits, bits in DOD_BUCKETS:
+            if -(1 << (bits - 1)) <= dod < 1 << (bits - 1):
+                w.write(prefix, pbits)
+                w.write(dod, bits)
+                break
+        else:
+            raise TSDBException('Integer out of range: %s' % v)
+    return w.getvalue()
+
+
+def decode_dod(data, count):
+    r = BitReader(data)
+    res = []
+    prev = delta = 0
+    for _ in range(count):
+        if r.read(1):
+            n = 1
+            while n < 5 and r.read(1):
+                n += 1
+            delta += r.read_signed(DOD_BUCKETS[n - 1][2])
+        prev += delta
+        res.append(prev)
+    return res
+
+
+def _float_bits(v):
+    return struct.unpack('>Q', struct.pack('>d', v))[0]
+
+
+def encode_gorilla(values):
+    '''
+    floats XOR-ed with the previous one: 0 when equal, else the meaningful bits,
+    reusing the previous leading/trailing zero window when they fit in it
+    '''
+    w = BitWriter()
+    prev = None
+    lead = trail = None
+    for v in values:
+        bits = _float_bits(v)
+        if prev == None:
+            w.write(bits, 64)
+            prev = bits
+            continue
+        x = bits ^ prev
+        prev = bits
+        if x == 0:
+            w.write(0, 1)
+            continue
+        w.write(1, 1)
+        l = min(64 - x.bit_length(), 31)
+        t = (x & -x).bit_length() - 1
+        if lead != None and l >= lead and t >= trail:
+            w.write(0, 1)
+            w.write(x >> trail, 64 - lead - trail)
+        else:
+            lead, trail = l, t
+            w.write(1, 1)
+            w.write(lead, 5)
+            w.write(64 - lead - trail - 1, 6)
+            w.write(x >> trail, 64 - lead - trail)
+    return w.getvalue()
+
+
+def decode_gorilla(data, count):
+    r = BitReader(data)
+    res = []
+    prev = None
+    lead = trail = 0
+    for _ in range(count):
+        if prev == None:
+            prev = r.read(64)
+        elif r.read(1):
+            if r.read(1):
+                lead = r.read(5)
+                trail = 64 - lead - r.read(6) - 1
+            prev ^= r.read(64 - lead - trail) << trail
+        res.append(struct.unpack('>d', struct.pack('>Q', prev))[0])
+    return res
+
+
+def encode_json(values):
+    return zlib.compress(json.dumps(values, separators=(',', ':'), default=str).encode('utf-8'))
+
+
+def decode_json(data, count):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+ENCODERS = {
+    'dod': (encode_dod, decode_dod),
+    'gorilla': (encode_gorilla, decode_gorilla),
+    'json': (encode_json, decode_json),
+}
+
+
+def get_encoding(values):
+    '''
+    the encoding of the non None values, json keeps the type of integers mixed with floats
+    '''
+    ints = floats = False
+    for v in values:
+        if isinstance(v, float):
+            floats = True
+        elif isinstance(v, bool) or not isinstance(v, int_types) or not -MAX_INT < v < MAX_INT:
+            return 'json'
+        else:
+            ints = True
+        if ints and floats:
+            return 'json'
+    return 'gorilla' if floats else 'dod'
+
+
+def encode_column(values):
+    '''
+    values (None allowed) -> (encoding, presence bitmap or b'', encoded non None values)
+    '''
+    present = [v for v in values if v != None]
+    nulls = b''
+    if len(present) < len(values):
+        w = BitWriter()
+        for v in values:
+            w.write(0 if v == None else 1, 1)
+        nulls = w.getvalue()
+    encoding = get_encoding(present)
+    return encoding, nulls, ENCODERS[encoding][0](present)
+
+
+def decode_column(encoding, nulls, data, count, present):
+    '''
+    the count values of a column with present non None values
+    '''
+    values = ENCODERS[encoding][1](data, present) if present else []
+    if not nulls:
+        return values
+    r = BitReader(nulls)
+    it = iter(values)
+    return [next(it) if r.read(1) else None for _ in range(count)]
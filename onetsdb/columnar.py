@@ -0,0 +1,816 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Pure Python columnar storage, a directory per database:
+
+    <path>/<table>/define.json      tags, fields, partition and block_size of the table
+    <path>/<table>/<partition>.tsc  blocks of one time partition (a day by default)
+
+A block holds up to block_size points of one series (one combination of tag values) in time order:
+a header with the series, count, time range and per column stats (count, sum, min, max, first, last),
+then the columns encoded by onetsdb.codec. Queries skip blocks by their header, count() and aggregates
+read the header of the blocks inside the time range instead of decoding them.
+
+    tsdb = connect('columnar://localhost/tmp/tsdb')
+'''
+from __future__ import print_function
+
+import bisect
+import datetime
+import heapq
+import itertools
+import json
+import os
+import shutil
+import struct
+import threading
+
+from .base import TSDBException, TSDBPoint, TSDBBase, seek_range, get_order_by, to_column, to_epoch_us, int_types
+from .codec import encode_dod, decode_dod, encode_column, decode_column
+from .rollup import GROUPS, bucket_time, next_bucket, get_kinds, merge_partial, finalize_partial
+
+TIME_FIELD = '_time'
+MAGIC = b'TSCB'
+# magic, 头部长度, 数据长度
+HEAD = struct.Struct('>4sII')
+EPOCH = datetime.datetime(1970, 1, 1)
+PARTITION_FORMATS = {
+    'hour': '%Y%m%d%H',
+    'day': '%Y%m%d',
+    'month': '%Y%m',
+    'year': '%Y',
+}
+BLOCK_SIZE = 1000
+# 分区的块数超过 2 * 序列数 + COMPACT_BLOCKS 时合并
+COMPACT_BLOCKS = 16
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def to_us(tm):
+    '''
+    naive datetime to microseconds since 1970-01-01, without time zone
+    '''
+    d = tm - EPOCH
+    return (d.days * 86400 + d.seconds) * 1000000 + d.microseconds
+
+
+def from_us(us):
+    return EPOCH + datetime.timedelta(microseconds=us)
+
+
+def column_stats(times, values):
+    '''
+    header stats of a column: count of non None values, first/last values (may be None) and their times, min/max and sum when they apply
+    '''
+    present = [(t, v) for t, v in zip(times, values) if v != None]
+    stats = {'count': len(present)}
+    if times:
+        # first/last 与原始查询一样保留空值
+        stats.update(first=values[0], first_time=times[0], last=values[-1], last_time=times[-1])
+    if present:
+        vs = [v for _, v in present]
+        try:
+            stats.update(min=min(vs), max=max(vs))
+        except TypeError:
+            pass
+        if not [v for v in vs if isinstance(v, bool) or not isinstance(v, (float,) + int_types)]:
+            stats['sum'] = sum(vs)
+    return stats
+
+
+def encode_block(tags, times, columns, seq):
+    '''
+    (header, record) of a block of one series, times ascending
+    '''
+    header = {'tags': tags, 'seq': seq, 'count': len(times), 'min': times[0], 'max': times[-1], 'columns': {}}
+    parts = [encode_dod(times)]
+    header['time'] = len(parts[0])
+    for f in sorted(columns):
+        values = columns[f]
+        encoding, nulls, data = encode_column(values)
+        col = column_stats(times, values)
+        if not col['count']:
+            continue
+        col.update(enc=encoding, nulls=len(nulls), len=len(data))
+        header['columns'][f] = col
+        parts += [nulls, data]
+    body = b''.join(parts)
+    h = json.dumps(header, separators=(',', ':'), default=str).encode('utf-8')
+    return header, HEAD.pack(MAGIC, len(h), len(body)) + h + body
+
+
+def decode_block(header, body):
+    '''
+    (times, {field: values}) of a block
+    '''
+    count = header['count']
+    pos = header['time']
+    times = decode_dod(body[:pos], count)
+    columns = {}
+    for f in sorted(header['columns']):
+        c = header['columns'][f]
+        nulls = body[pos:pos + c['nulls']]
+        pos += c['nulls']
+        columns[f] = decode_column(c['enc'], nulls, body[pos:pos + c['len']], count, c['count'])
+        pos += c['len']
+    return times, columns
+
+
+class _Block(object):
+    '''
+    a block in a partition file, the record starts at offset
+    '''
+    __slots__ = ('offset', 'size', 'body', 'header', 'key', 'min', 'max', 'count', 'seq', 'columns')
+
+    def __init__(self, header, offset, hsize, size, tags):
+        self.header = header
+        self.offset = offset
+        self.size = size
+        self.body = offset + HEAD.size + hsize
+        self.key = tuple(header['tags'].get(t) for t in tags)
+        self.min = header['min']
+        self.max = header['max']
+        self.count = header['count']
+        self.seq = header['seq']
+        self.columns = header['columns']
+
+    def covered(self, lo, hi):
+        return (lo == None or self.min >= lo) and (hi == None or self.max <= hi)
+
+    def may_match(self, flt):
+        # 按头部的统计判断是否可能有满足字段过滤的点
+        for k, v in flt.items():
+            c = self.columns.get(k)
+            if c == None:
+                if v != None:
+                    return False
+            elif v == None:
+                if c['count'] == self.count:
+                    return False
+            elif 'min' in c:
+                try:
+                    if v < c['min'] or v > c['max']:
+                        return False
+                except TypeError:
+                    pass
+        return True
+
+
+class _Partition(object):
+    '''
+    blocks of one partition file, covering start..end (exclusive) microseconds
+    '''
+
+    def __init__(self, name, path, start, end):
+        self.name = name
+        self.path = path
+        self.start = start
+        self.end = end
+        self.blocks = []
+
+
+def _scan(path, tags):
+    # 读取各块的头部, 返回块及有效长度 (最后一个块可能没有写完)
+    blocks = []
+    offset = 0
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        while offset + HEAD.size <= size:
+            magic, hsize, bsize = HEAD.unpack(f.read(HEAD.size))
+            end = offset + HEAD.size + hsize + bsize
+            if magic != MAGIC or end > size:
+                break
+            header = json.loads(f.read(hsize).decode('utf-8'))
+            f.seek(bsize, 1)
+            blocks.append(_Block(header, offset, hsize, end - offset, tags))
+            offset = end
+    return blocks, offset
+
+
+class _Table(object):
+    '''
+    define and block index of a table directory
+    '''
+
+    def __init__(self, path, define):
+        self.path = path
+        self.define = define
+        self.tags = sorted(define.get('tags') or {})
+        self.fields = sorted(define.get('fields') or {})
+        self.partition = define.get('partition') or 'day'
+        self.block_size = define.get('block_size') or BLOCK_SIZE
+        self.partitions = {}
+        self.seq = 0
+        self._range = None
+        for fn in os.listdir(path):
+            if fn.endswith('.tsc'):
+                self._load(fn[:-4])
+
+    def _new_partition(self, name):
+        start = datetime.datetime.strptime(name, PARTITION_FORMATS[self.partition])
+        return _Partition(name, os.path.join(self.path, name + '.tsc'), to_us(start), to_us(next_bucket(start, self.partition)))
+
+    def _load(self, name):
+        part = self._new_partition(name)
+        part.blocks, size = _scan(part.path, self.tags)
+        if size < os.path.getsize(part.path):
+            # 未写完的块
+            with open(part.path, 'r+b') as f:
+                f.truncate(size)
+        if part.blocks:
+            self.seq = max(self.seq, max(b.seq for b in part.blocks) + 1)
+            self.partitions[name] = part
+        else:
+            os.remove(part.path)
+            self.partitions.pop(name, None)
+
+    def partition_of(self, us):
+        '''
+        (start, end, name) of the partition of us
+        '''
+        if self._range == None or not self._range[0] <= us < self._range[1]:
+            start = bucket_time(from_us(us), self.partition)
+            self._range = (to_us(start), to_us(next_bucket(start, self.partition)), start.strftime(PARTITION_FORMATS[self.partition]))
+        return self._range
+
+    def encode(self, key, times, columns):
+        '''
+        records of the blocks of a series, times ascending
+        '''
+        tags = dict(zip(self.tags, key))
+        for i in range(0, len(times), self.block_size):
+            j = i + self.block_size
+            yield encode_block(tags, times[i:j], dict((f, c[i:j]) for f, c in columns.items()), self.seq)
+            self.seq += 1
+
+    def append(self, name, records):
+        part = self.partitions.get(name)
+        if part == None:
+            part = self._new_partition(name)
+        blocks = []
+        with open(part.path, 'ab') as f:
+            f.seek(0, 2)
+            offset = f.tell()
+            for header, record in records:
+                hsize = HEAD.unpack(record[:HEAD.size])[1]
+                blocks.append(_Block(header, offset, hsize, len(record), self.tags))
+                offset += len(record)
+            f.write(b''.join(r for _, r in records))
+        part.blocks = part.blocks + blocks
+        self.partitions[name] = part
+        return part
+
+    def rewrite(self, part, records):
+        '''
+        replace the partition file with the records
+        '''
+        if not records:
+            os.remove(part.path)
+            self.partitions.pop(part.name, None)
+            return
+        tmp = part.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(b''.join(records))
+        _replace(tmp, part.path)
+        part.blocks, _ = _scan(part.path, self.tags)
+
+
+def _read(f, block):
+    f.seek(block.body)
+    return decode_block(block.header, f.read(block.offset + block.size - block.body))
+
+
+def _read_run(f, run):
+    '''
+    (times, columns) of blocks of a series in time order, for the same time the latest written wins
+    '''
+    if len(run) == 1:
+        return _read(f, run[0])
+    rows = []
+    fields = set()
+    for b in run:
+        times, columns = _read(f, b)
+        fields.update(columns)
+        rows.extend((tm, b.seq, i, columns) for i, tm in enumerate(times))
+    rows.sort(key=lambda r: (r[0], r[1]))
+    res = []
+    for r in rows:
+        if res and res[-1][0] == r[0]:
+            res[-1] = r
+        else:
+            res.append(r)
+    return [r[0] for r in res], dict((f, [r[3][f][r[2]] if f in r[3] else None for r in res]) for f in fields)
+
+
+class _Buckets(object):
+    '''
+    start (microseconds) of the time_group bucket of microseconds, the last bucket is cached
+    '''
+
+    def __init__(self, group):
+        if group not in GROUPS:
+            raise TSDBException('Unknown time_group: %s' % group)
+        self.group = group
+        self.start = self.end = None
+
+    def __call__(self, us):
+        if self.start == None or not self.start <= us < self.end:
+            b = bucket_time(from_us(us), self.group)
+            self.start, self.end = to_us(b), to_us(next_bucket(b, self.group))
+        return self.start
+
+
+class _Scan(object):
+    '''
+    time bounds (inclusive microseconds), tag and field filters and direction of a query on a table
+    '''
+
+    def __init__(self, table, query, reverse=False):
+        options = query.options
+        orders = get_order_by(query, TIME_FIELD, reverse=reverse)
+        if len(orders) != 1 or orders[0][0] != TIME_FIELD:
+            raise TSDBException('columnar only supports order by time')
+        self.table = table
+        self.desc = orders[0][1]
+        self.lo = self.hi = None
+        if options.get('time_start'):
+            self.lo = to_us(options['time_start'])
+        if options.get('time_after'):
+            lo = to_us(options['time_after']) + 1
+            self.lo = lo if self.lo == None else max(self.lo, lo)
+        if options.get('time_end'):
+            self.hi = to_us(options['time_end'])
+        if options.get('time_before'):
+            hi = to_us(options['time_before']) - 1
+            self.hi = hi if self.hi == None else min(self.hi, hi)
+        self.tags = []
+        self.flt = {}
+        for k, v in (options.get('filter') or {}).items():
+            if k in table.tags:
+                self.tags.append((table.tags.index(k), v))
+            else:
+                self.flt[k] = v
+
+    def partitions(self):
+        parts = sorted(self.table.partitions.values(), key=lambda p: p.start, reverse=self.desc)
+        return [p for p in parts if (self.lo == None or p.end > self.lo) and (self.hi == None or p.start <= self.hi)]
+
+    def runs(self, part):
+        '''
+        {series key: runs} of the matching series, a run is a list of blocks overlapping in time, in time order
+        '''
+        series = {}
+        for b in part.blocks:
+            if (self.lo != None and b.max < self.lo) or (self.hi != None and b.min > self.hi):
+                continue
+            if [1 for i, v in self.tags if b.key[i] != v]:
+                continue
+            series.setdefault(b.key, []).append(b)
+        res = {}
+        for key, blocks in series.items():
+            blocks.sort(key=lambda b: (b.min, b.seq))
+            runs = []
+            end = None
+            for b in blocks:
+                if runs and b.min <= end:
+                    runs[-1].append(b)
+                    end = max(end, b.max)
+                else:
+                    runs.append([b])
+                    end = b.max
+            res[key] = runs
+        return res
+
+    def skip(self, run):
+        # 无需解码即可排除
+        return bool(self.flt) and len(run) == 1 and not run[0].may_match(self.flt)
+
+    def covered(self, run):
+        # 整个块都满足查询
+        return not self.flt and len(run) == 1 and run[0].covered(self.lo, self.hi)
+
+    def rows(self, times, columns):
+        '''
+        indexes of the rows matching the time bounds and field filter
+        '''
+        i = 0 if self.lo == None else bisect.bisect_left(times, self.lo)
+        j = len(times) if self.hi == None else bisect.bisect_right(times, self.hi)
+        idx = range(i, j)
+        if self.flt:
+            cols = [(columns.get(k), v) for k, v in self.flt.items()]
+            idx = [n for n in idx if not [1 for c, v in cols if (c[n] if c != None else None) != v]]
+        return idx
+
+
+class ColumnarTSDB(TSDBBase):
+    '''
+    Pure Python columnar storage in the directory path
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._tables = {}
+        self._lock = threading.RLock()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _get_table(self, table):
+        with self._lock:
+            t = self._tables.get(table)
+            if t == None:
+                fn = os.path.join(self.path, table, 'define.json')
+                if not os.path.exists(fn):
+                    return None
+                with open(fn) as f:
+                    define = json.load(f)
+                t = self._tables[table] = _Table(os.path.join(self.path, table), define)
+            return t
+
+    def register_table(self, table, options):
+        with self._lock:
+            t = self._get_table(table)
+            define = dict(t.define) if t else {}
+            partition = options.get('partition', define.get('partition')) or 'day'
+            if partition not in PARTITION_FORMATS:
+                raise TSDBException('Unknown partition: %s' % partition)
+            if t and t.partitions and partition != t.partition:
+                raise TSDBException('The partition of %s can not be changed' % table)
+            # 保留已有的 tag/field
+            tags = dict(define.get('tags') or {})
+            tags.update(options.get('tags') or {})
+            fields = dict(define.get('fields') or {})
+            fields.update(options.get('fields') or {})
+            for k in tags:
+                fields.pop(k, None)
+            define.update(tags=tags, fields=fields, partition=partition, block_size=options.get('block_size', define.get('block_size')) or BLOCK_SIZE)
+            path = os.path.join(self.path, table)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            with open(os.path.join(path, 'define.json'), 'w') as f:
+                json.dump(define, f, indent=2, sort_keys=True)
+            self._tables[table] = _Table(path, define)
+
+    def write_points(self, table, points):
+        points = self._before_write(table, points)
+        t = self._get_table(table)
+        if t == None:
+            raise TSDBException('Unknown table: %s' % table)
+        count = 0
+        with self._lock, self._operation('write', table) as op:
+            series = {}
+            for p in points:
+                if p.time == None:
+                    p.time = datetime.datetime.now()
+                us = to_us(p.time)
+                key = (t.partition_of(us)[2], tuple(p.data.get(k) for k in t.tags))
+                rows = series.get(key)
+                if rows == None:
+                    rows = series[key] = []
+                rows.append((us, count, p.data))
+                count += 1
+            parts = {}
+            for (name, key), rows in series.items():
+                rows.sort(key=lambda r: (r[0], r[1]))
+                # 同一时间的点以最后写入的为准
+                rows = [r for i, r in enumerate(rows) if i + 1 == len(rows) or rows[i + 1][0] != r[0]]
+                columns = dict((f, [r[2].get(f) for r in rows]) for f in t.fields)
+                parts.setdefault(name, []).extend(t.encode(key, [r[0] for r in rows], columns))
+            for name, records in parts.items():
+                part = t.append(name, records)
+                if len(part.blocks) >= 2 * len(set(b.key for b in part.blocks)) + COMPACT_BLOCKS:
+                    self._compact(t, part)
+            op.rows_in = count
+        self._after_write(table, points)
+        return count
+
+    def _snapshot(self, scan, part):
+        # 当前的块和打开的文件, 之后的重写不影响读取
+        with self._lock:
+            runs = scan.runs(part)
+            return runs, open(part.path, 'rb') if runs else None
+
+    def _partition_rows(self, scan, part):
+        runs, f = self._snapshot(scan, part)
+        if f == None:
+            return
+        sign = -1 if scan.desc else 1
+        # 所有序列的 run 按时间合并, 轮到 run 的时间下界 (降序时为上界) 时才解码
+        heap = []
+        for key, rs in runs.items():
+            for run in rs:
+                if scan.skip(run):
+                    continue
+                if scan.desc:
+                    bound = max(b.max for b in run)
+                    bound = bound if scan.hi == None else min(bound, scan.hi)
+                else:
+                    bound = run[0].min if scan.lo == None else max(run[0].min, scan.lo)
+                heap.append((sign * bound, len(heap), key, run, None))
+        heapq.heapify(heap)
+        with f:
+            while heap:
+                _, n, key, item, it = heap[0]
+                if it == None:
+                    it = self._run_rows(scan, f, key, item)
+                else:
+                    yield item
+                for r in it:
+                    heapq.heapreplace(heap, (sign * r[0], n, key, r, it))
+                    break
+                else:
+                    heapq.heappop(heap)
+
+    def _run_rows(self, scan, f, key, run):
+        times, columns = _read_run(f, run)
+        idx = scan.rows(times, columns)
+        for i in reversed(idx) if scan.desc else idx:
+            yield times[i], key, columns, i
+
+    def _partition_count(self, scan, part, decode=True):
+        '''
+        points of the query in part, None when it needs decoding and decode is False
+        '''
+        runs, f = self._snapshot(scan, part)
+        total = 0
+        try:
+            for rs in runs.values():
+                for run in rs:
+                    if scan.skip(run):
+                        continue
+                    if scan.covered(run):
+                        total += run[0].count
+                        continue
+                    if not decode:
+                        return None
+                    times, columns = _read_run(f, run)
+                    total += len(scan.rows(times, columns))
+        finally:
+            if f != None:
+                f.close()
+        return total
+
+    def _rows(self, scan, skip=0):
+        '''
+        (microseconds, series key, columns, index) of the matching rows, after skip rows
+        '''
+        with self._lock:
+            parts = scan.partitions()
+        for part in parts:
+            if skip:
+                # 整个分区都可跳过时不解码
+                n = self._partition_count(scan, part, decode=False)
+                if n != None and n <= skip:
+                    skip -= n
+                    continue
+            for r in self._partition_rows(scan, part):
+                if skip:
+                    skip -= 1
+                    continue
+                yield r
+
+    def _point(self, t, row):
+        us, key, columns, i = row
+        data = dict(zip(t.tags, key))
+        for f in t.fields:
+            c = columns.get(f)
+            data[f] = c[i] if c != None else None
+        return TSDBPoint(time=from_us(us), data=data)
+
+    def _block_partial(self, b, tags, kinds):
+        # 块头部的统计作为部分聚合结果, 头部没有所需的统计时返回 None
+        partial = {}
+        for f, ks in kinds.items():
+            # 没有值的列 first/last 为空
+            stats = {'count': 0, 'first': None, 'first_time': b.min, 'last': None, 'last_time': b.max}
+            if f in tags:
+                v = tags[f]
+                if v != None:
+                    stats = {'count': b.count, 'first': v, 'first_time': b.min, 'last': v, 'last_time': b.max, 'min': v, 'max': v}
+                    if isinstance(v, (float,) + int_types) and not isinstance(v, bool):
+                        stats['sum'] = v * b.count
+            elif f in b.columns:
+                stats = b.columns[f]
+            for k in ks:
+                if k in stats:
+                    partial['%s__%s' % (f, k)] = stats[k]
+                elif stats['count']:
+                    return None
+        return partial
+
+    def _aggregate(self, scan, options):
+        values = options['values']
+        group = options.get('time_group')
+        buckets = _Buckets(group) if group else None
+        kinds = {}
+        for ag in values.values():
+            kinds.setdefault(ag.field, set()).update(get_kinds(ag))
+        t = scan.table
+        partials = {}
+
+        def add(bucket, tm, partial):
+            if bucket in partials:
+                merge_partial(partials[bucket][1], partial)
+                partials[bucket][0] = min(partials[bucket][0], tm)
+            else:
+                partials[bucket] = [tm, partial]
+
+        with self._lock:
+            parts = scan.partitions()
+        for part in parts:
+            runs, f = self._snapshot(scan, part)
+            if f == None:
+                continue
+            with f:
+                for key, rs in runs.items():
+                    tags = dict(zip(t.tags, key))
+                    for run in rs:
+                        if scan.skip(run):
+                            continue
+                        b = run[0]
+                        if scan.covered(run) and (not group or buckets(b.min) == buckets(b.max)):
+                            partial = self._block_partial(b, tags, kinds)
+                            if partial != None:
+                                add(buckets(b.min) if group else None, b.min, partial)
+                                continue
+                        times, columns = _read_run(f, run)
+                        idx = scan.rows(times, columns)
+                        for bucket, seg in itertools.groupby(idx, key=lambda i: buckets(times[i]) if group else None):
+                            seg = list(seg)
+                            ts = [times[i] for i in seg]
+                            partial = {}
+                            for fd, ks in kinds.items():
+                                if fd in tags:
+                                    vs = [tags[fd]] * len(seg)
+                                else:
+                                    c = columns.get(fd)
+                                    vs = [c[i] for i in seg] if c != None else [None] * len(seg)
+                                stats = column_stats(ts, vs)
+                                partial.update(('%s__%s' % (fd, k), stats[k]) for k in ks if k in stats)
+                            add(bucket, ts[0], partial)
+        return [TSDBPoint(time=from_us(bucket if group else partials[bucket][0]), data=finalize_partial(partials[bucket][1], values))
+                for bucket in sorted(partials, reverse=scan.desc)]
+
+    def fetch_with_query(self, query):
+        t = self._get_table(query.table)
+        if t == None:
+            return iter([])
+        scan = _Scan(t, query)
+        if query.options.get('values'):
+            return iter(self._aggregate(scan, query.options))
+        return (self._point(t, r) for r in self._rows(scan))
+
+    def count_with_query(self, query):
+        t = self._get_table(query.table)
+        if t == None:
+            return 0
+        scan = _Scan(t, query)
+        if query.options.get('values'):
+            return len(self._aggregate(scan, query.options))
+        with self._lock:
+            parts = scan.partitions()
+        return sum(self._partition_count(scan, p) for p in parts)
+
+    def getitem_with_query(self, query, item):
+        t = self._get_table(query.table)
+        if t == None or query.options.get('values'):
+            pts = list(self.fetch_with_query(query))
+            if type(item) == slice:
+                return iter(pts[item])
+            return pts[item] if -len(pts) <= item < len(pts) else None
+        rg = seek_range(item)
+        if rg == None:
+            count = self.count_with_query(query)
+            rg = seek_range(slice(*item.indices(count)[:2]))
+        reverse, offset, limit = rg
+        rows = self._rows(_Scan(t, query, reverse=reverse), skip=offset)
+        pts = [self._point(t, r) for r in itertools.islice(rows, limit)]
+        rows.close()
+        if type(item) == slice:
+            return reversed(pts) if reverse else iter(pts)
+        return pts[0] if pts else None
+
+    def first_with_query(self, query):
+        return self.getitem_with_query(query, 0)
+
+    def last_with_query(self, query):
+        return self.getitem_with_query(query, -1)
+
+    def pages_with_query(self, query, size):
+        # 同一时间可有多个序列的点, 直接按顺序分页
+        page = []
+        for p in self.fetch_with_query(query):
+            page.append(p)
+            if len(page) >= size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def columns_with_query(self, query, fields=None):
+        t = self._get_table(query.table)
+        if t == None or query.options.get('values'):
+            return TSDBBase.columns_with_query(self, query, fields)
+        fields = list(fields or t.tags + t.fields)
+        types = dict(t.define.get('tags') or {})
+        types.update(t.define.get('fields') or {})
+        times = []
+        cols = [[] for _ in fields]
+        getters = [(t.tags.index(f), None) if f in t.tags else (None, f) for f in fields]
+        offsets = {}
+        for us, key, columns, i in self._rows(_Scan(t, query)):
+            # 时区偏移按小时缓存
+            h = us // 3600000000
+            off = offsets.get(h)
+            if off == None:
+                off = offsets[h] = to_epoch_us(from_us(h * 3600000000)) - h * 3600000000
+            times.append(us + off)
+            for c, (ti, f) in zip(cols, getters):
+                if f == None:
+                    c.append(key[ti])
+                else:
+                    v = columns.get(f)
+                    c.append(v[i] if v != None else None)
+        res = {'time': to_column(times, 'int')}
+        for f, c in zip(fields, cols):
+            res[f] = to_column(c, types.get(f))
+        return res
+
+    def delete_with_query(self, query):
+        t = self._get_table(query.table)
+        if t == None:
+            return
+        scan = _Scan(t, query)
+
+        def drop(times, columns):
+            rows = set(scan.rows(times, columns))
+            keep = [i for i in range(len(times)) if i not in rows]
+            return [times[i] for i in keep], dict((f, [c[i] for i in keep]) for f, c in columns.items())
+
+        with self._lock:
+            for part in scan.partitions():
+                keys = [k for k, rs in scan.runs(part).items() if [r for r in rs if not scan.skip(r)]]
+                if keys:
+                    self._rewrite(t, part, keys, drop)
+
+    def _rewrite(self, t, part, keys, func=None):
+        # 重写分区, keys 的序列合并为完整的块, 其余的块原样复制
+        keys = set(keys)
+        series = {}
+        records = []
+        with open(part.path, 'rb') as f:
+            for b in part.blocks:
+                if b.key in keys:
+                    series.setdefault(b.key, []).append(b)
+                else:
+                    f.seek(b.offset)
+                    records.append(f.read(b.size))
+            for key, blocks in series.items():
+                blocks.sort(key=lambda b: (b.min, b.seq))
+                times, columns = _read_run(f, blocks)
+                if func != None:
+                    times, columns = func(times, columns)
+                if times:
+                    records.extend(r for _, r in t.encode(key, times, columns))
+        t.rewrite(part, records)
+
+    def _compact(self, t, part):
+        series = {}
+        for b in part.blocks:
+            series.setdefault(b.key, []).append(b)
+        keys = [k for k, bs in series.items() if len(bs) > (sum(b.count for b in bs) + t.block_size - 1) // t.block_size]
+        if keys:
+            self._rewrite(t, part, keys)
+
+    def compact(self, table=None):
+        '''
+        merge the blocks of each series in every partition of table (all tables if None) into full blocks
+        '''
+        with self._lock:
+            tables = [table] if table else [d for d in os.listdir(self.path) if os.path.exists(os.path.join(self.path, d, 'define.json'))]
+            for name in tables:
+                t = self._get_table(name)
+                for part in list(t.partitions.values()) if t else []:
+                    self._compact(t, part)
+
+    def disk_usage(self, table):
+        '''
+        bytes of the partition files of table
+        '''
+        t = self._get_table(table)
+        return sum(os.path.getsize(p.path) for p in t.partitions.values()) if t else 0
+
+    def drop_table(self, table):
+        with self._lock:
+            self._tables.pop(table, None)
+            path = os.path.join(self.path, table)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+
+    def close(self):
+        self._close_buffers()
+        self._tables = {}
+
+    def commit(self):
+        pass
@@ -0,0 +1,257 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Hot tier: the last points of each series (a combination of tag values) of a table kept in memory,
+loaded from the table on the first query of the series and then fed by write_points. Queries on one
+series answered by the kept points (last(), the recent points, values(Last(...))...) skip the backend:
+
+    tsdb.set_hot_tier('device', ['devid'], points=10, window=300)
+    tsdb.query('device').filter(devid='A1').last()
+'''
+from __future__ import print_function
+
+import bisect
+import collections
+import datetime
+import threading
+
+from .base import TSDBPoint, TSDBQuery, seek_range, get_order_by, to_column, to_epoch_us
+from .base import Sum, Count, Max, Min, Mean, First, Last
+
+_one = datetime.timedelta(microseconds=1)
+
+
+class _Series(object):
+    '''
+    the points of a series from cover on (all of them when cover is None), in time order
+    '''
+    __slots__ = ('times', 'rows', 'cover')
+
+    def __init__(self, points, cover):
+        self.times = [p.time for p in points]
+        self.rows = [p.data for p in points]
+        self.cover = cover
+
+    def add(self, tm, data):
+        if self.cover != None and tm < self.cover:
+            # 早于保留的范围, 只在表中
+            return
+        i = bisect.bisect_right(self.times, tm)
+        self.times.insert(i, tm)
+        self.rows.insert(i, data)
+
+    def prune(self, points, window, max_rows):
+        n = len(self.times)
+        keep = max(n - points, 0)
+        if window != None and n:
+            keep = min(keep, bisect.bisect_left(self.times, self.times[-1] - window))
+        keep = max(keep, n - max_rows)
+        if keep > 0:
+            # 同一时间的点一起保留
+            cut = self.times[keep]
+            keep = bisect.bisect_left(self.times, cut)
+            if keep > 0:
+                self.cover = cut
+                del self.times[:keep]
+                del self.rows[:keep]
+
+
+class HotTier(object):
+    '''
+    The last points (at least points, and all of the last window) of each series of a table, at most max_series
+    series with the least recently used evicted. Only the writes of this process are seen.
+    '''
+
+    def __init__(self, tsdb, table, tags, points=1, window=None, max_series=10000, max_rows=10000):
+        self.tsdb = tsdb
+        self.table = table
+        self.tags = sorted(tags)
+        self.points = max(points, 1)
+        self.window = datetime.timedelta(seconds=window) if isinstance(window, (int, float)) else window
+        self.max_series = max_series
+        self.max_rows = max(max_rows, self.points)
+        self._series = collections.OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def _load(self, key):
+        # 从表中读取序列最后的点
+        with self._lock:
+            generation = self._generation
+        q = TSDBQuery(self.tsdb, self.table, {'filter': dict(zip(self.tags, key))})
+        backend = q._backend()
+        points = list(backend.getitem_with_query(q, slice(-self.points - 1, None)))
+        cover = None
+        if len(points) > self.points:
+            # 多读的一个点之前可能还有同一时间的点
+            cover = points[0].time + _one
+            points = [p for p in points if p.time >= cover]
+        if self.window != None and points:
+            since = points[-1].time - self.window
+            if cover == None or since < cover:
+                points = list(backend.fetch_with_query(q.time_range(since, None)))
+                cover = since
+        s = _Series(points, cover)
+        s.prune(self.points, self.window, self.max_rows)
+        with self._lock:
+            self.loads += 1
+            if self._generation == generation:
+                self._series[key] = s
+                while len(self._series) > self.max_series:
+                    self._series.popitem(last=False)
+                    self.evictions += 1
+        return s
+
+    def update(self, points):
+        '''
+        add written points to the kept series
+        '''
+        columns = self.tsdb._point_columns(self.table)
+        with self._lock:
+            self._generation += 1
+            touched = []
+            for p in points:
+                s = self._series.get(tuple(p.data.get(t) for t in self.tags))
+                if s == None or p.time == None:
+                    continue
+                s.add(p.time, dict((k, p.data.get(k)) for k in columns) if columns != None else dict(p.data))
+                touched.append(s)
+            for s in touched:
+                s.prune(self.points, self.window, self.max_rows)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._series.clear()
+
+    def _range(self, options):
+        # 包含的起止时间
+        start = options.get('time_start')
+        if options.get('time_after') != None:
+            after = options['time_after'] + _one
+            start = after if start == None else max(start, after)
+        end = options.get('time_end')
+        if options.get('time_before') != None:
+            before = options['time_before'] - _one
+            end = before if end == None else min(end, before)
+        return start, end
+
+    def answer(self, query, op, *args):
+        '''
+        (True, result) of op ('fetch', 'count', 'getitem', 'first', 'last' or 'columns') on query when
+        the kept points answer it, else (False, None)
+        '''
+        options = query.options
+        flt = options.get('filter') or {}
+        if sorted(flt) != self.tags or options.get('parallel') or options.get('row_view'):
+            return False, None
+        orders = get_order_by(query, 'time')
+        if [f for f, _ in orders] != ['time']:
+            return False, None
+        desc = orders[0][1]
+        key = tuple(flt[t] for t in self.tags)
+        with self._lock:
+            s = self._series.get(key)
+            if s != None:
+                self._series.pop(key)
+                self._series[key] = s
+        if s == None:
+            s = self._load(key)
+        start, end = self._range(options)
+        with self._lock:
+            lo = 0 if start == None else bisect.bisect_left(s.times, start)
+            hi = len(s.times) if end == None else bisect.bisect_right(s.times, end)
+            rows = [TSDBPoint(time=s.times[i], data=dict(s.rows[i])) for i in range(lo, hi)]
+            covered = s.cover == None or (start != None and start >= s.cover)
+        values = options.get('values')
+        if values:
+            if not covered:
+                return self._miss()
+            rows = self._aggregate(rows, values, options.get('time_group'))
+            if op == 'count':
+                return self._hit(len(rows))
+        elif op == 'count':
+            return self._hit(len(rows)) if covered else self._miss()
+        if desc:
+            rows.reverse()
+        if op in ('first', 'last', 'getitem'):
+            item = {'first': 0, 'last': -1}.get(op, args[0] if args else None)
+            rg = seek_range(item)
+            # 从最新的一端取足够的点时不需要完整的范围
+            newest = rg != None and rg[0] != desc and rg[2] != None and rg[1] + rg[2] <= len(rows)
+            if not covered and not newest:
+                return self._miss()
+            if type(item) == slice:
+                return self._hit(iter(rows[item]))
+            return self._hit(rows[item] if -len(rows) <= item < len(rows) else None)
+        if not covered:
+            return self._miss()
+        if op == 'columns':
+            return self._hit(self._columns(rows, args[0] if args else None))
+        return self._hit(rows)
+
+    def _hit(self, res):
+        with self._lock:
+            self.hits += 1
+        return True, res
+
+    def _miss(self):
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def _aggregate(self, rows, values, group):
+        from .rollup import bucket_time
+        buckets = collections.OrderedDict()
+        for p in rows:
+            buckets.setdefault(bucket_time(p.time, group) if group else None, []).append(p)
+        res = []
+        for b, pts in buckets.items():
+            data = {}
+            for k, ag in values.items():
+                vs = [p.data.get(ag.field) for p in pts]
+                nn = [v for v in vs if v != None]
+                if isinstance(ag, First):
+                    data[k] = vs[0]
+                elif isinstance(ag, Last):
+                    data[k] = vs[-1]
+                elif isinstance(ag, Count):
+                    data[k] = len(nn)
+                elif not nn:
+                    data[k] = None
+                elif isinstance(ag, Sum):
+                    data[k] = sum(nn)
+                elif isinstance(ag, Max):
+                    data[k] = max(nn)
+                elif isinstance(ag, Min):
+                    data[k] = min(nn)
+                elif isinstance(ag, Mean):
+                    data[k] = sum(nn) / float(len(nn))
+            res.append(TSDBPoint(time=b if group else pts[0].time, data=data))
+        return res
+
+    def _columns(self, rows, fields):
+        fields = list(fields or sorted(set(k for p in rows for k in p.data)))
+        res = {'time': to_column([to_epoch_us(p.time) for p in rows], 'int')}
+        for f in fields:
+            res[f] = to_column([p.data.get(f) for p in rows])
+        return res
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'series': len(self._series),
+                'max_series': self.max_series,
+                'points': sum(len(s.times) for s in self._series.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / float(total) if total else 0.0,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
@@ -4,17 +4,25 @@ Created on 2019-10-22
 '''
 from __future__ import print_function
 import datetime, time
-from .base import TSDBPoint, TSDBBase
+from .base import TSDBException, TSDBPoint, TSDBBase, RowView, seek_range, get_order_by, to_column
 
 TIME_FIELD = 'time'
 TIME_ALTZONE = time.altzone
 
 
 class InfluxDB(object):
-    def __init__(self, dbname, client):
+    def __init__(self, dbname, client, create=True):
         self.client = client
         self.dbname = dbname
-        self.client.create_database(dbname)
+        self._created = not create
+
+    def ensure_database(self):
+        '''
+        create the database on first use instead of on every connect
+        '''
+        if not self._created:
+            self.client.create_database(self.dbname)
+            self._created = True
 
 
 class InfluxTSDB(TSDBBase):
@@ -22,13 +30,17 @@ class InfluxTSDB(TSDBBase):
     Wrapper for InfluxDB
     '''
 
-    def __init__(self, db=None):
+    def __init__(self, db=None, chunk_size=0):
         self.db = db
+        self.chunk_size = chunk_size
         self._table_define = {}
 
     def _get_table_define(self, table):
         return self._table_define.get(table)
 
+    def _memory_define(self, table):
+        return self._get_table_define(table)
+
     def register_table(self, table, options):
         # if options.get('fields'):
         #     countk = list(options['fields'].keys())[0]
@@ -80,74 +92,136 @@ class InfluxTSDB(TSDBBase):
         return data
 
     def write_points(self, table, points):
+        points = self._before_write(table, points)
         pts = []
-        for p in points:
-            if p.time == None:
-                p.time = datetime.datetime.now()
-            pts.append(self._point_to_db_data(p, table))
-        if pts:
-            self.db.client.write_points(pts, database=self.db.dbname)
+        with self._operation('write', table) as op:
+            for p in points:
+                if p.time == None:
+                    p.time = datetime.datetime.now()
+                pts.append(self._point_to_db_data(p, table))
+            if pts:
+                self.db.ensure_database()
+                self._trace('write_points(%d points)' % len(pts))
+                self.db.client.write_points(pts, database=self.db.dbname)
+            op.rows_in = len(pts)
+        self._after_write(table, points)
         return len(pts)
 
     def _get_where_ql_with_query(self, query):
         import six
         td = self._get_table_define(query.table)
-        where = {}
+        where = []
         options = query.options
         if options.get('filter'):
             for k, v in options.get('filter').items():
                 if k in td.get('tags', {}) and not isinstance(v, six.string_types):
                     # tags
                     v = str(v)
-                where[k] = ('=', v)
+                where.append((k, '=', v))
         if options.get('time_start'):
-            where['time'] = ('>=', self._to_db_time(options['time_start']))
+            where.append(('time', '>=', self._to_db_time(options['time_start'])))
+        if options.get('time_after'):
+            where.append(('time', '>', self._to_db_time(options['time_after'])))
+        if options.get('time_before'):
+            where.append(('time', '<', self._to_db_time(options['time_before'])))
         if options.get('time_end'):
-            where['time'] = ('<=', self._to_db_time(options['time_end']))
+            where.append(('time', '<=', self._to_db_time(options['time_end'])))
         if where:
-            wql = ' AND '.join(['"%s" %s %s' % (k, v[0], "'%s'" % v[1] if isinstance(v[1], six.string_types) else v[1]) for k, v in where.items()])
+            wql = ' AND '.join(['"%s" %s %s' % (k, o, "'%s'" % v if isinstance(v, six.string_types) else v) for k, o, v in where])
             return wql
 
-    def _create_influxql_with_query(self, query, fields=None):
+    def _create_influxql_with_query(self, query, fields=None, reverse=False):
         if fields == None:
             fields = '*'
         q = 'SELECT %s FROM "%s"' % (fields, query.table)
         w = self._get_where_ql_with_query(query)
         if w:
             q += ' WHERE %s' % w
+        orders = get_order_by(query, TIME_FIELD, reverse=reverse)
+        if len(orders) != 1 or orders[0][0] != TIME_FIELD:
+            raise TSDBException('InfluxDB only supports order by time')
+        if orders[0][1]:
+            q += ' ORDER BY time DESC'
         # if self.timezone:
         #     q += " tz('%s')" % self.timezone
         return q
 
-    def _exec_influxql(self, ql):
-        # print('--->exec influxql:', ql)
-        return self.db.client.query(ql, database=self.db.dbname)
+    def _exec_influxql(self, ql, chunk_size=0, **kwargs):
+        self._trace(ql)
+        if chunk_size:
+            # 分块响应, 返回逐块解析的 ResultSet 生成器
+            return self.db.client.query(ql, database=self.db.dbname, chunked=True, chunk_size=chunk_size, **kwargs)
+        return self.db.client.query(ql, database=self.db.dbname, **kwargs)
+
+    def _get_chunk_size(self, query):
+        return query.options.get('chunk_size') or self.chunk_size
 
     def _db_data_to_point(self, data, define):
-        pdata = {}
-        fieldmap = define['_field_map']
-        for k, v in data.items():
-            if k == TIME_FIELD or k == define['_count_field']:
+        # get_points 每行已是新的 dict, 原地转换
+        tm = data.pop(TIME_FIELD, None)
+        data.pop(define['_count_field'], None)
+        for k, t in define['_field_map'].items():
+            v = data.get(k)
+            if v == None:
                 continue
-            t = fieldmap.get(k)
-            if t:
-                if t == 'int':
-                    v = int(v)
-                elif t == 'float':
-                    v = float(v)
-                elif t == 'string':
-                    v = str(v)
-            pdata[k] = v
-        pt = TSDBPoint(time=self._to_point_time(data.get(TIME_FIELD)), data=pdata)
-        return pt
+            if t == 'int':
+                data[k] = int(v)
+            elif t == 'float':
+                data[k] = float(v)
+            elif t == 'string':
+                data[k] = str(v)
+        return TSDBPoint(time=self._to_point_time(tm), data=data)
 
     def _fetch_with_resultset(self, resultset, query):
         td = self._get_table_define(query.table)
-        for d in resultset.get_points():
-            yield self._db_data_to_point(d, td)
+        if hasattr(resultset, 'get_points'):
+            resultset = [resultset]
+        if query.options.get('row_view'):
+            # 直接包装原始结果行, 值保持驱动返回的类型
+            for rs in resultset:
+                for serie in rs.raw.get('series', []):
+                    names = serie['columns']
+                    ti = names.index(TIME_FIELD)
+                    index = {k: i for i, k in enumerate(names) if i != ti and k != td['_count_field']}
+                    for r in serie.get('values') or []:
+                        yield TSDBPoint(time=self._to_point_time(r[ti]), data=RowView(index, r))
+            return
+        for rs in resultset:
+            for d in rs.get_points():
+                yield self._db_data_to_point(d, td)
 
     def fetch_with_query(self, query):
-        return self._fetch_with_resultset(self._exec_influxql(self._create_influxql_with_query(query, fields='*')), query)
+        return self._fetch_with_resultset(self._exec_influxql(self._create_influxql_with_query(query, fields='*'), self._get_chunk_size(query)), query)
+
+    def columns_with_query(self, query, fields=None):
+        if query.options.get('values'):
+            return TSDBBase.columns_with_query(self, query, fields)
+        td = self._get_table_define(query.table)
+        ql = self._create_influxql_with_query(query, fields=','.join(['"%s"' % f for f in fields]) if fields else '*')
+        # epoch='u' 直接返回微秒时间戳, 按列读取原始结果
+        resultset = self._exec_influxql(ql, self._get_chunk_size(query), epoch='u')
+        if hasattr(resultset, 'raw'):
+            resultset = [resultset]
+        cols = {}
+        n = 0
+        for rs in resultset:
+            for serie in rs.raw.get('series', []):
+                names = serie['columns']
+                values = serie.get('values') or []
+                for k, vs in zip(names, zip(*values)):
+                    if k == td['_count_field']:
+                        continue
+                    if k not in cols:
+                        cols[k] = [None] * n
+                    cols[k].extend(vs)
+                n += len(values)
+                for c in cols.values():
+                    if len(c) < n:
+                        c.extend([None] * (n - len(c)))
+        res = {'time': to_column(cols.pop(TIME_FIELD, []), 'int')}
+        for k in fields or cols:
+            res[k] = to_column(cols.get(k, [None] * n), td['_field_map'].get(k))
+        return res
 
     def count_with_query(self, query):
         key = self._get_table_define(query.table)['_count_field']
@@ -172,26 +246,30 @@ class InfluxTSDB(TSDBBase):
         return self.getitem_with_query(query, -1)
 
     def getitem_with_query(self, query, item):
-        q = self._create_influxql_with_query(query, fields='*')
+        rg = seek_range(item)
+        if rg == None:
+            count = self.count_with_query(query)
+            rg = seek_range(slice(*item.indices(count)[:2]))
+        reverse, offset, limit = rg
+        if limit == 0:
+            # LIMIT 0 在 InfluxQL 中表示不限制
+            return iter([]) if type(item) == slice else None
+        q = self._create_influxql_with_query(query, fields='*', reverse=reverse)
+        if limit != None:
+            q += ' LIMIT %d' % limit
+        if offset:
+            q += ' OFFSET %d' % offset
+        pts = self._fetch_with_resultset(self._exec_influxql(q, self._get_chunk_size(query)), query)
         if type(item) == slice:
-            if item.start < 0:
-                count = self.count_with_query(query)
-                item = slice(max(0, item.start + count), count)
-            q += ' LIMIT %d OFFSET %d' % (item.stop - item.start, item.start)
-            return self._fetch_with_resultset(self._exec_influxql(q), query)
-        else:
-            if item < 0:
-                count = self.count_with_query(query)
-                item = max(0, item + count)
-            q += ' LIMIT %d OFFSET %d' % (1, item)
-            for pt in self._fetch_with_resultset(self._exec_influxql(q), query):
-                return pt
+            return reversed(list(pts)) if reverse else pts
+        for pt in pts:
+            return pt
 
     def drop_table(self, table):
         self._exec_influxql('DROP MEASUREMENT "%s"' % table)
 
     def close(self):
-        pass
+        self._close_buffers()
 
     def commit(self):
         pass
@@ -0,0 +1,208 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Instrumentation of backend operations. Every write/query operation emits an event to the hooks:
+
+    {
+        'op': 'write' | 'fetch' | 'aggregate' | 'count' | 'getitem' | 'first' | 'last' | 'columns' | 'delete' | 'statement',
+        'backend': 'SqliteTSDB', 'table': 'device', 'options': query options,
+        'statements': compiled SQL/InfluxQL/MongoDB calls, 'seconds': time spent in the backend,
+        'rows_in': points written, 'rows_out': points returned, 'bytes': result size when known, 'error': repr or None,
+    }
+
+    tsdb.add_hook(print)
+    tsdb.set_slow_log(0.5)
+    stats = tsdb.enable_stats()
+    stats.top(10)
+'''
+from __future__ import print_function
+
+import logging
+import re
+import threading
+import time
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class Operation(object):
+    '''
+    One operation, entered (possibly several times for iterations) while the backend works on it
+    '''
+
+    def __init__(self, instrument, tsdb, op, table=None, query=None, auto=True):
+        self.instrument = instrument
+        self.auto = auto
+        self.statements = []
+        self.seconds = 0.0
+        self.rows_in = None
+        self.rows_out = None
+        self.bytes = None
+        self.error = None
+        self._start = None
+        self.event = {
+            'op': op,
+            'backend': tsdb.__class__.__name__,
+            'table': table,
+            'options': dict(query.options) if query != None else None,
+        }
+
+    def __enter__(self):
+        self.instrument._stack().append(self)
+        self._start = timer()
+        return self
+
+    def __exit__(self, et, ev, tb):
+        self.seconds += timer() - self._start
+        stack = self.instrument._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if ev != None and et not in (StopIteration, GeneratorExit):
+            self.error = repr(ev)
+        if self.auto:
+            self.finish()
+
+    def finish(self):
+        self.event.update({
+            'statements': self.statements,
+            'seconds': self.seconds,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'bytes': self.bytes,
+            'error': self.error,
+        })
+        self.instrument.emit(self.event)
+
+
+class Instrument(object):
+    '''
+    hooks of a tsdb, with the operations in progress per thread
+    '''
+
+    def __init__(self):
+        self.hooks = []
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack == None:
+            stack = self._local.stack = []
+        return stack
+
+    def emit(self, event):
+        for hook in list(self.hooks):
+            hook(event)
+
+    def operation(self, tsdb, op, table=None, query=None):
+        return Operation(self, tsdb, op, table, query)
+
+    def statement(self, tsdb, statement):
+        stack = self._stack()
+        if stack:
+            stack[-1].statements.append(statement)
+        else:
+            # 不属于任何操作, 如建表
+            self.emit({'op': 'statement', 'backend': tsdb.__class__.__name__, 'table': None, 'options': None,
+                       'statements': [statement], 'seconds': None, 'rows_in': None, 'rows_out': None, 'bytes': None, 'error': None})
+
+    def iterate(self, tsdb, op, query, factory):
+        '''
+        iterate factory(), the time spent inside the backend is the time of the operation
+        '''
+        o = Operation(self, tsdb, op, query.table, query, auto=False)
+        rows = 0
+        try:
+            with o:
+                it = iter(factory())
+            while True:
+                with o:
+                    try:
+                        p = next(it)
+                    except StopIteration:
+                        break
+                rows += 1
+                yield p
+        finally:
+            o.rows_out = rows
+            o.finish()
+
+
+# 字符串和数字常量, 字典的键 ('key': ...) 保留
+_literals = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")(\s*:)?|\b\d+(?:\.\d+)?\b")
+
+
+def normalize(statement):
+    '''
+    statement with its literals replaced by ?, the shape of a query
+    '''
+    return _literals.sub(lambda m: m.group(0) if m.group(2) else '?', str(statement))
+
+
+def unique(statements):
+    # 分批写入时同一语句重复多次
+    res = []
+    for s in statements:
+        if s not in res:
+            res.append(s)
+    return res
+
+
+class StatsCollector(object):
+    '''
+    In-memory stats per (op, table, statement shape): count, errors, total/max seconds, rows
+    '''
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        shape = ' ; '.join(unique([normalize(s) for s in event['statements']]))
+        key = (event['op'], event['table'], shape)
+        seconds = event['seconds'] or 0.0
+        with self._lock:
+            s = self._stats.get(key)
+            if s == None:
+                s = self._stats[key] = {
+                    'op': event['op'], 'table': event['table'], 'shape': shape,
+                    'count': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows_in': 0, 'rows_out': 0,
+                }
+            s['count'] += 1
+            s['errors'] += 1 if event['error'] else 0
+            s['seconds'] += seconds
+            s['max_seconds'] = max(s['max_seconds'], seconds)
+            s['rows_in'] += event['rows_in'] or 0
+            s['rows_out'] += event['rows_out'] or 0
+
+    def stats(self):
+        with self._lock:
+            res = [dict(s) for s in self._stats.values()]
+        for s in res:
+            s['mean_seconds'] = s['seconds'] / s['count']
+        return res
+
+    def top(self, n=10, key='seconds'):
+        '''
+        the n shapes with most key (seconds, max_seconds, count, rows_out...)
+        '''
+        return sorted(self.stats(), key=lambda s: s[key], reverse=True)[:n]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class SlowLog(object):
+    '''
+    log the operations taking threshold seconds or more
+    '''
+
+    def __init__(self, threshold=1.0, logger=None):
+        self.threshold = threshold
+        self.logger = logger or logging.getLogger('onetsdb.slow')
+
+    def __call__(self, event):
+        if event['seconds'] != None and event['seconds'] >= self.threshold:
+            self.logger.warning('slow %s on %s %.3fs rows_in=%s rows_out=%s: %s', event['op'], event['table'], event['seconds'],
+                                event['rows_in'], event['rows_out'], ' ; '.join(unique([str(s) for s in event['statements']])))
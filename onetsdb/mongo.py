@@ -4,8 +4,8 @@ Created on 2019-10-22
 '''
 from __future__ import print_function
 import datetime
-from .base import str_types, try_parset_datetime_str
-from .base import TSDBException, TSDBPoint, TSDBBase
+from .base import str_types, try_parset_datetime_str, TIME_GROUP_FORMATS
+from .base import TSDBException, TSDBPoint, TSDBBase, seek_range, get_order_by, to_epoch_us, to_column
 from .base import Max, Min, Mean, Sum, Count, First, Last
 
 TIME_FIELD = '_time'
@@ -17,8 +17,10 @@ class MongoTSDB(TSDBBase):
     Wrapper for mongodb
     '''
 
-    def __init__(self, db=None):
+    def __init__(self, db=None, batch_size=1000, default_time=True):
         self.db = db
+        self.batch_size = batch_size
+        self.default_time = default_time
 
     def _get_collection(self, name):
         return self.db.get_collection(name)
@@ -42,23 +44,40 @@ class MongoTSDB(TSDBBase):
         return data
 
     def _db_data_to_point(self, data):
-        pt = TSDBPoint(time=self._to_point_time(data.get(TIME_FIELD)))
-        pt.data = {
-            k: v for k, v in data.items() if k not in [TIME_FIELD, MONGOID_FIELD]
-        }
-        return pt
+        # 驱动返回的文档直接作为 data, 不再复制
+        tm = data.pop(TIME_FIELD, None)
+        data.pop(MONGOID_FIELD, None)
+        return TSDBPoint(time=self._to_point_time(tm), data=data)
+
+    def _insert_docs(self, col, docs):
+        self._trace('%s.insert_many(%d docs)' % (col.name, len(docs)))
+        col.insert_many(docs, ordered=False)
+        return len(docs)
 
-    def write_points(self, table, points):
+    def write_points(self, table, points, batch_size=None):
         '''
-        write points
+        write points with unordered insert_many in chunks of batch_size
         '''
+        part = self._get_partitioned(table)
+        if part:
+            return part.write(points)
         col = self._get_collection(table)
+        batch_size = batch_size or self.batch_size
+        points = self._before_write(table, points)
         count = 0
-        for p in points:
-            if p.time == None:
-                p.time = datetime.datetime.now()
-            col.save(self._point_to_db_data(p))
-            count += 1
+        docs = []
+        with self._operation('write', table) as op:
+            for p in points:
+                if self.default_time and p.time == None:
+                    p.time = datetime.datetime.now()
+                docs.append(self._point_to_db_data(p))
+                if len(docs) >= batch_size:
+                    count += self._insert_docs(col, docs)
+                    docs = []
+            if docs:
+                count += self._insert_docs(col, docs)
+            op.rows_in = count
+        self._after_write(table, points)
         return count
 
     def _get_filter(self, query):
@@ -69,6 +88,10 @@ class MongoTSDB(TSDBBase):
         tmft = {}
         if options.get('time_start'):
             tmft['$gte'] = self._to_db_time(options['time_start'])
+        if options.get('time_after'):
+            tmft['$gt'] = self._to_db_time(options['time_after'])
+        if options.get('time_before'):
+            tmft['$lt'] = self._to_db_time(options['time_before'])
         if options.get('time_end'):
             tmft['$lte'] = self._to_db_time(options['time_end'])
         if tmft:
@@ -79,7 +102,8 @@ class MongoTSDB(TSDBBase):
         if isinstance(ag, Sum):
             return {'$sum': '$%s' % ag.field}
         elif isinstance(ag, Count):
-            return {'$sum': 1}
+            # 与其他后端一样只计非空值, 缺少的字段小于 null
+            return {'$sum': {'$cond': [{'$gt': ['$%s' % ag.field, None]}, 1, 0]}}
         elif isinstance(ag, Max):
             return {'$max': '$%s' % ag.field}
         elif isinstance(ag, Min):
@@ -100,14 +124,8 @@ class MongoTSDB(TSDBBase):
         tg = options.get('time_group')
         if options.get('values'):
             vd = {v.field: 1 for k, v in options['values'].items() if v.field and isinstance(v.field, str_types)}
-            tgf = {
-                'year': "%Y-01-01",
-                'month': "%Y-%m-01",
-                'day': "%Y-%m-%d",
-                'hour': "%Y-%m-%d %H:00:00",
-                'minute': "%Y-%m-%d %H:%M:00",
-            }[tg]
             if tg:
+                tgf = TIME_GROUP_FORMATS[tg]
                 vd[TIME_FIELD] = {'$dateToString': {'format': tgf, 'date': "$" + TIME_FIELD}}
             ps.append({'$project': vd})
         if tg:
@@ -121,21 +139,39 @@ class MongoTSDB(TSDBBase):
             ps.append({'$group': gd})
         return ps
 
-    def _get_cursor_with_query(self, query):
-        from pymongo import ASCENDING
+    def _get_cursor_with_query(self, query, reverse=False, skip=0, limit=None, projection=None):
+        from pymongo import ASCENDING, DESCENDING
+        from bson.son import SON
+        sort = [(f, DESCENDING if desc else ASCENDING) for f, desc in get_order_by(query, TIME_FIELD, reverse=reverse)]
+        options = query.options
         col = self._get_collection(query.table)
         ft = self._get_filter(query)
         vs = self._get_value_pipes(query)
         if not vs:
-            cursor = col.find(ft)
-            cursor = cursor.sort(TIME_FIELD, ASCENDING)
+            if sort[-1][0] == TIME_FIELD:
+                # 同一时间的点按 _id 排序, 每次读取的顺序一致
+                sort.append((MONGOID_FIELD, sort[-1][1]))
+            self._trace('%s.find(%r, %r).sort(%r).skip(%r).limit(%r)' % (col.name, ft, projection or {MONGOID_FIELD: 0}, sort, skip, limit))
+            cursor = col.find(ft, projection or {MONGOID_FIELD: 0})
+            cursor = cursor.sort(sort)
+            if options.get('chunk_size'):
+                cursor = cursor.batch_size(options['chunk_size'])
+            if skip:
+                cursor = cursor.skip(skip)
+            if limit:
+                cursor = cursor.limit(limit)
         else:
             ps = []
             if ft:
                 ps.append({'$match': ft})
             ps += vs
-            ps.append({'$sort': {TIME_FIELD: ASCENDING}})
-            cursor = col.aggregate(ps)
+            ps.append({'$sort': SON(sort)})
+            if skip:
+                ps.append({'$skip': skip})
+            if limit:
+                ps.append({'$limit': limit})
+            self._trace('%s.aggregate(%r)' % (col.name, ps))
+            cursor = col.aggregate(ps, batchSize=options['chunk_size']) if options.get('chunk_size') else col.aggregate(ps)
         return cursor
 
     def _fetch_with_cursor(self, cursor):
@@ -146,55 +182,137 @@ class MongoTSDB(TSDBBase):
         cursor = self._get_cursor_with_query(query)
         return self._fetch_with_cursor(cursor)
 
+    def columns_with_query(self, query, fields=None):
+        if query.options.get('values'):
+            return TSDBBase.columns_with_query(self, query, fields)
+        projection = dict([(TIME_FIELD, 1)] + [(f, 1) for f in fields]) if fields else None
+        cursor = self._get_cursor_with_query(query, projection=projection)
+        times = []
+        cols = {f: [] for f in fields} if fields else {}
+        n = 0
+        for d in cursor:
+            times.append(to_epoch_us(d[TIME_FIELD]))
+            if not fields:
+                for k in d:
+                    if k not in cols and k != TIME_FIELD and k != MONGOID_FIELD:
+                        cols[k] = [None] * n
+            for k, c in cols.items():
+                c.append(d.get(k))
+            n += 1
+        res = {'time': to_column(times, 'int')}
+        for k, c in cols.items():
+            res[k] = to_column(c)
+        return res
+
     def first_with_query(self, query):
-        cursor = self._get_cursor_with_query(query)
-        try:
-            return self._db_data_to_point(cursor[0])
-        except IndexError:
-            return None
+        return self.getitem_with_query(query, 0)
 
     def last_with_query(self, query):
-        cursor = self._get_cursor_with_query(query)
-        try:
-            count = cursor.count()
-            return self._db_data_to_point(cursor[count - 1]) if count else None
-        except IndexError:
-            return None
+        return self.getitem_with_query(query, -1)
 
     def delete_with_query(self, query):
         col = self._get_collection(query.table)
         ft = self._get_filter(query)
+        self._trace('%s.delete_many(%r)' % (col.name, ft))
         col.delete_many(ft)
 
     def count_with_query(self, query):
         col = self._get_collection(query.table)
         ft = self._get_filter(query)
+        self._trace('%s.count_documents(%r)' % (col.name, ft))
+        if hasattr(col, 'count_documents'):
+            return col.count_documents(ft)
         return col.find(ft).count()
 
+    def _merge_rollup(self, rollup, partials):
+        '''
+        merge partials with upserts per bucket and tag values: $inc, $max and $min, first/last replaced by
+        a conditional update when earlier (later) than the stored one
+        '''
+        col = self._get_collection(rollup.name)
+        tags = sorted(rollup.tags)
+        self._trace('%s.update_one(upsert) x %d buckets' % (col.name, len(partials)))
+        for key, partial in partials.items():
+            ft = dict(zip(tags, key[1:]))
+            ft[TIME_FIELD] = key[0]
+            update = {}
+            for k, v in partial.items():
+                f, kind = k.rsplit('__', 1)
+                if v == None or kind in ('first', 'last', 'first_time', 'last_time'):
+                    continue
+                op = {'sum': '$inc', 'count': '$inc', 'max': '$max', 'min': '$min'}[kind]
+                update.setdefault(op, {})[k] = v
+            col.update_one(ft, update or {'$setOnInsert': ft}, upsert=True)
+            for k, v in partial.items():
+                f, kind = k.rsplit('__', 1)
+                if kind in ('first_time', 'last_time') and v != None:
+                    cmp = '$gt' if kind == 'first_time' else '$lte'
+                    cond = dict(ft)
+                    cond['$or'] = [{k: None}, {k: {cmp: v}}]
+                    col.update_one(cond, {'$set': {k: v, f + '__' + kind[:-5]: partial.get(f + '__' + kind[:-5])}})
+
+    def _list_tables(self):
+        return self.db.list_collection_names()
+
     def register_table(self, table, options):
+        if options.get('partition'):
+            return self._register_partitioned(table, options)
         col = self._get_collection(table)
         col.create_index(TIME_FIELD)
         for k in options.get('tags', {}).keys():
             col.create_index(k)
 
     def getitem_with_query(self, query, item):
-        cursor = self._get_cursor_with_query(query)
-        if type(item) == slice:
-            if item.start < 0:
-                count = cursor.count()
-                item = slice(max(0, item.start + count), count)
-            return self._fetch_with_cursor(cursor[item])
+        rg = seek_range(item)
+        if rg == None:
+            count = self.count_with_query(query)
+            rg = seek_range(slice(*item.indices(count)[:2]))
+        reverse, offset, limit = rg
+        if limit == 0:
+            pts = iter([])
         else:
-            if item < 0:
-                count = cursor.count()
-                item = max(0, item + count)
-            return self._db_data_to_point(cursor[item])
+            pts = self._fetch_with_cursor(self._get_cursor_with_query(query, reverse=reverse, skip=offset, limit=limit))
+        if type(item) == slice:
+            return reversed(list(pts)) if reverse else pts
+        for pt in pts:
+            return pt
+
+    def pages_with_query(self, query, size):
+        orders = get_order_by(query, TIME_FIELD)
+        if query.options.get('values') or [f for f, _ in orders] != [TIME_FIELD]:
+            return TSDBBase.pages_with_query(self, query, size)
+        return self._id_pages(query, size, orders[0][1])
+
+    def _id_pages(self, query, size, desc):
+        # 同一时间可能有多个点, 按 (_time, _id) 翻页
+        from pymongo import ASCENDING, DESCENDING
+        col = self._get_collection(query.table)
+        ft = self._get_filter(query)
+        direction = DESCENDING if desc else ASCENDING
+        op = '$lt' if desc else '$gt'
+        key = None
+        while True:
+            f = dict(ft)
+            if key:
+                f['$or'] = [{TIME_FIELD: {op: key[0]}}, {TIME_FIELD: key[0], MONGOID_FIELD: {op: key[1]}}]
+            self._trace('%s.find(%r).sort(_time, _id).limit(%d)' % (col.name, f, size))
+            docs = list(col.find(f).sort([(TIME_FIELD, direction), (MONGOID_FIELD, direction)]).limit(size))
+            if docs:
+                key = (docs[-1][TIME_FIELD], docs[-1][MONGOID_FIELD])
+                yield [self._db_data_to_point(d) for d in docs]
+            if len(docs) < size:
+                break
 
     def drop_table(self, table):
+        part = self._get_partitioned(table)
+        if part:
+            part.drop()
+            self._partitions.pop(table, None)
+            return
         self._get_collection(table).drop()
 
     def close(self):
-        pass
+        self._close_buffers()
 
     def commit(self):
         pass
@@ -0,0 +1,226 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Parallel queries: the time range is split into shards, each shard runs on its own connection
+in a thread (or process) pool and the results are merged in time order:
+
+    points = tsdb.query('device').time_range(start, end).parallel(8).all()
+'''
+from __future__ import print_function
+
+import array
+import copy
+
+from .base import TSDBException, TSDBPoint, TSDBQuery, connect, is_time_descending
+from .base import Sum, Count, Max, Min, Mean, First, Last
+
+
+def _open(spec):
+    # uri 则新建连接, 否则共用 tsdb
+    if hasattr(spec, 'query'):
+        return spec, False
+    elif callable(spec):
+        return spec(), True
+    return connect(spec), True
+
+
+def run_shard(spec, table, options, op, args=(), define=None):
+    '''
+    run op ('fetch', 'count' or 'columns') of the query table/options on the tsdb of spec,
+    a new connection registers define first
+    '''
+    tsdb, own = _open(spec)
+    try:
+        if own and define != None:
+            tsdb.register_table(table, copy.deepcopy(define))
+        q = TSDBQuery(tsdb, table, options)
+        if op == 'fetch':
+            return list(q)
+        elif op == 'count':
+            return q.count()
+        elif op == 'columns':
+            return q.columns(*args)
+        raise TSDBException('Unknown op: %s' % op)
+    finally:
+        if own:
+            tsdb.close()
+
+
+def get_spec(query, processes=False, factory=None):
+    '''
+    how a shard gets its tsdb: the factory, the tsdb itself when it is thread safe, or the uri of connect()
+    '''
+    tsdb = query.tsdb
+    uri = getattr(tsdb, 'uri', None)
+    if processes:
+        if not uri or ':memory:' in uri:
+            raise TSDBException('parallel processes need a tsdb made by connect(uri)')
+        return uri
+    if factory != None:
+        return factory
+    if tsdb._thread_safe:
+        return tsdb
+    if uri and ':memory:' not in uri:
+        return uri
+
+
+def _bucket(tm, group):
+    from .rollup import bucket_time
+    return bucket_time(tm, group) if group else tm
+
+
+def shard_options(query, shards):
+    '''
+    options of the queries of each shard, in ascending time order
+    '''
+    options = dict(query.options)
+    options.pop('parallel', None)
+    base = TSDBQuery(query.tsdb, query.table, dict(options, order_by=None, values=None, time_group=None))
+    start = options.get('time_start') or options.get('time_after')
+    end = options.get('time_end') or options.get('time_before')
+    if start == None or end == None:
+        first, last = base.first(), base.last()
+        if first == None:
+            return []
+        start = start or first.time
+        end = end or last.time
+    step = (end - start) // shards
+    bounds = []
+    if step:
+        group = options.get('time_group')
+        for i in range(1, shards):
+            # 按 time_group 的桶对齐, 每个桶只在一个分片中
+            b = _bucket(start + step * i, group)
+            if b > start and (not bounds or b > bounds[-1]):
+                bounds.append(b)
+    res = []
+    for i in range(len(bounds) + 1):
+        o = dict(options)
+        if i > 0:
+            o['time_start'] = bounds[i - 1]
+            o['time_after'] = None
+        if i < len(bounds):
+            o['time_before'] = bounds[i]
+            o['time_end'] = None
+        res.append(o)
+    return res
+
+
+def _partial_values(values):
+    # Mean 拆为 Sum/Count 以便合并
+    res = {}
+    for k, ag in values.items():
+        if isinstance(ag, Mean):
+            res[k + '__sum'] = Sum(ag.field)
+            res[k + '__count'] = Count(ag.field)
+        else:
+            res[k] = ag
+    return res
+
+
+def _merge_values(values, points):
+    # points 为各分片的聚合结果, 按时间升序
+    points = [p for p in points if p != None]
+    if not points:
+        return []
+    data = {}
+    for k, ag in values.items():
+        if isinstance(ag, Mean):
+            s = sum(p.data[k + '__sum'] or 0 for p in points)
+            c = sum(p.data[k + '__count'] or 0 for p in points)
+            data[k] = s / float(c) if c else None
+            continue
+        vs = [p.data.get(k) for p in points if p.data.get(k) != None]
+        if isinstance(ag, First):
+            # 第一个点的值, 可能为 None
+            data[k] = points[0].data.get(k)
+        elif isinstance(ag, Last):
+            data[k] = points[-1].data.get(k)
+        elif isinstance(ag, Count):
+            data[k] = sum(vs)
+        elif not vs:
+            data[k] = None
+        elif isinstance(ag, Sum):
+            data[k] = sum(vs)
+        elif isinstance(ag, Max):
+            data[k] = max(vs)
+        elif isinstance(ag, Min):
+            data[k] = min(vs)
+        else:
+            raise TSDBException('Unknown Aggregate: %s' % ag)
+    return [TSDBPoint(time=min(p.time for p in points), data=data)]
+
+
+def _concat_columns(results):
+    res = {}
+    for cols in results:
+        for k, c in cols.items():
+            if isinstance(c, memoryview):
+                # 没有 NumPy 时的文件视图
+                c = array.array(c.format, c)
+            if k not in res:
+                res[k] = c
+            elif isinstance(c, array.array) or isinstance(c, list):
+                res[k] = res[k] + c
+            else:
+                import numpy
+                res[k] = numpy.concatenate([res[k], c])
+    return res
+
+
+def _map(query, op, shards, args=()):
+    # 按分片顺序返回各分片的结果
+    conf = query.options['parallel']
+    spec = get_spec(query, conf.get('processes'), conf.get('factory'))
+    # 只在内存中的表定义需交给新的连接
+    define = query.tsdb._memory_define(query.table)
+    if spec == None or len(shards) <= 1:
+        # 无法并行时在当前线程依次执行
+        for o in shards:
+            yield run_shard(query.tsdb, query.table, o, op, args)
+        return
+    from concurrent import futures
+    pool = futures.ProcessPoolExecutor if conf.get('processes') else futures.ThreadPoolExecutor
+    with pool(max_workers=conf.get('workers') or 4) as executor:
+        fs = [executor.submit(run_shard, spec, query.table, o, op, args, define) for o in shards]
+        for f in fs:
+            yield f.result()
+
+
+def _shards(query):
+    conf = query.options['parallel']
+    return shard_options(query, conf.get('shards') or conf.get('workers') or 4)
+
+
+def fetch_parallel(query):
+    shards = _shards(query)
+    values = query.options.get('values')
+    if values and not query.options.get('time_group'):
+        for o in shards:
+            o['values'] = _partial_values(values)
+        points = [(pts or [None])[0] for pts in _map(query, 'fetch', shards)]
+        for p in _merge_values(values, points):
+            yield p
+        return
+    if is_time_descending(query):
+        shards.reverse()
+    for pts in _map(query, 'fetch', shards):
+        for p in pts:
+            yield p
+
+
+def count_parallel(query):
+    if query.options.get('values'):
+        return len(list(fetch_parallel(query)))
+    return sum(_map(query, 'count', _shards(query)))
+
+
+def columns_parallel(query, fields):
+    shards = _shards(query)
+    if is_time_descending(query):
+        shards.reverse()
+    results = list(_map(query, 'columns', shards, fields))
+    if not results:
+        return TSDBQuery(query.tsdb, query.table, dict(query.options, parallel=None)).columns(*fields)
+    return _concat_columns(results)
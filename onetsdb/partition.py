@@ -0,0 +1,297 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Time partitioned tables: the points of a table are stored in one table (or collection) per day, week
+or month named <table>__p<d|w|m><YYYYMMDD>, queries read the partitions overlapping their time range
+and retention drops whole partitions instead of deleting rows:
+
+    tsdb.register_table('device', {'tags': {...}, 'fields': {...}, 'partition': 'day', 'retention': 30})
+    tsdb.expire('device')  # also done by register_table and when a write opens a new partition
+'''
+from __future__ import print_function
+
+import copy
+import datetime
+import re
+
+from .base import TSDBException, TSDBQuery, TSDBBase, seek_range, get_order_by, is_time_descending
+
+PARTITIONS = {
+    'day': 'd',
+    'week': 'w',
+    'month': 'm',
+}
+_units = dict((v, k) for k, v in PARTITIONS.items())
+
+
+def partition_start(tm, unit):
+    '''
+    start of the partition tm falls in, weeks start on monday
+    '''
+    day = tm.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == 'day':
+        return day
+    elif unit == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    elif unit == 'month':
+        return day.replace(day=1)
+    raise TSDBException('Unknown partition: %s' % unit)
+
+
+def partition_end(start, unit):
+    '''
+    start of the partition after the one starting at start
+    '''
+    if unit == 'day':
+        return start + datetime.timedelta(days=1)
+    elif unit == 'week':
+        return start + datetime.timedelta(days=7)
+    elif unit == 'month':
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    raise TSDBException('Unknown partition: %s' % unit)
+
+
+def partition_name(table, start, unit):
+    return '%s__p%s%s' % (table, PARTITIONS[unit], start.strftime('%Y%m%d'))
+
+
+def to_retention(retention):
+    # 天数或 timedelta
+    if retention == None or isinstance(retention, datetime.timedelta):
+        return retention
+    return datetime.timedelta(days=retention)
+
+
+def find_partitions(tables, table):
+    '''
+    {start: name} and the unit of the partitions of table among the names of tables
+    '''
+    pattern = re.compile(r'^%s__p([dwm])(\d{8})$' % re.escape(table))
+    res = {}
+    unit = None
+    for name in tables:
+        m = pattern.match(name)
+        if m:
+            unit = _units[m.group(1)]
+            res[datetime.datetime.strptime(m.group(2), '%Y%m%d')] = name
+    return res, unit
+
+
+class Partitioned(object):
+    '''
+    A time partitioned table, with the *_with_query interface of a tsdb for the queries of the table
+    '''
+
+    def __init__(self, tsdb, table, unit, options=None, retention=None):
+        if unit not in PARTITIONS:
+            raise TSDBException('Unknown partition: %s' % unit)
+        self.tsdb = tsdb
+        self.table = table
+        self.unit = unit
+        # 分区的表定义, 未在本进程注册时为 None
+        self.options = options
+        self.retention = to_retention(retention)
+        self._known = set()
+
+    def partitions(self):
+        '''
+        [(start, end, name)] of the existing partitions in time order
+        '''
+        parts, unit = find_partitions(self.tsdb._list_tables(), self.table)
+        return [(start, partition_end(start, self.unit), parts[start]) for start in sorted(parts)
+                if parts[start].startswith('%s__p%s' % (self.table, PARTITIONS[self.unit]))]
+
+    def register(self):
+        for _, _, name in self.partitions():
+            self.tsdb.register_table(name, copy.deepcopy(self.options))
+            self._known.add(name)
+        self.expire()
+
+    def expire(self, now=None):
+        '''
+        drop the partitions entirely older than the retention, returns their names
+        '''
+        if self.retention == None:
+            return []
+        cutoff = (now or datetime.datetime.now()) - self.retention
+        dropped = []
+        for _, end, name in self.partitions():
+            if end <= cutoff:
+                self.tsdb.drop_table(name)
+                self._known.discard(name)
+                dropped.append(name)
+        return dropped
+
+    def write(self, points):
+        if self.options == None:
+            raise TSDBException('Partitioned table %s must be registered before writing' % self.table)
+        points = self.tsdb._before_write(self.table, points)
+        now = datetime.datetime.now()
+        parts = {}
+        for p in points:
+            if p.time == None:
+                p.time = now
+            start = partition_start(p.time, self.unit)
+            pts = parts.get(start)
+            if pts == None:
+                pts = parts[start] = []
+            pts.append(p)
+        count = 0
+        opened = False
+        for start in sorted(parts):
+            name = partition_name(self.table, start, self.unit)
+            if name not in self._known:
+                # 新的分区
+                self.tsdb.register_table(name, copy.deepcopy(self.options))
+                self._known.add(name)
+                opened = True
+            count += self.tsdb.write_points(name, parts[start])
+        if opened:
+            self.expire()
+        self.tsdb._after_write(self.table, points)
+        return count
+
+    def drop(self):
+        for _, _, name in self.partitions():
+            self.tsdb.drop_table(name)
+        self._known = set()
+
+    def _range(self, options):
+        start = end = None
+        for k in ('time_start', 'time_after'):
+            if options.get(k) != None:
+                start = options[k] if start == None else max(start, options[k])
+        for k in ('time_end', 'time_before'):
+            if options.get(k) != None:
+                end = options[k] if end == None else min(end, options[k])
+        return start, end
+
+    def shards(self, query, reverse=False):
+        '''
+        the queries of the partitions overlapping the time range of query, in the order of its results
+        '''
+        options = dict(query.options)
+        options.pop('parallel', None)
+        start, end = self._range(options)
+        res = [TSDBQuery(self.tsdb, name, dict(options)) for s, e, name in self.partitions()
+               if (start == None or e > start) and (end == None or s <= end)]
+        if is_time_descending(query) != reverse:
+            res.reverse()
+        return res
+
+    def _time_ordered(self, query):
+        return [f for f, _ in get_order_by(query, 'time')] == ['time']
+
+    def fetch_with_query(self, query):
+        values = query.options.get('values')
+        if values:
+            return iter(self._aggregate(query, values))
+        if not self._time_ordered(query):
+            # 按其他字段排序时合并后排序
+            return iter(self._sorted(query))
+        return (p for q in self.shards(query) for p in self.tsdb.fetch_with_query(q))
+
+    def _sorted(self, query):
+        pts = [p for q in self.shards(query) for p in self.tsdb.fetch_with_query(q)]
+        for f, desc in reversed(get_order_by(query, 'time')):
+            pts.sort(key=lambda p: p.time if f == 'time' else p.data.get(f), reverse=desc)
+        return pts
+
+    def _aggregate(self, query, values):
+        # 桶可能跨分区, 各分区的部分结果按桶合并
+        from .parallel import _partial_values, _merge_values
+        partial = _partial_values(values)
+        group = query.options.get('time_group')
+        buckets = {}
+        for q in self.shards(query, reverse=is_time_descending(query)):
+            q.options['values'] = partial
+            q.options['order_by'] = None
+            for p in self.tsdb.fetch_with_query(q):
+                buckets.setdefault(p.time if group else None, []).append(p)
+        res = []
+        for k in sorted(buckets, key=lambda k: k or 0):
+            res.extend(_merge_values(values, sorted(buckets[k], key=lambda p: p.time)))
+        if is_time_descending(query):
+            res.reverse()
+        return res
+
+    def count_with_query(self, query):
+        if query.options.get('values'):
+            return len(self._aggregate(query, query.options['values']))
+        return sum(self.tsdb.count_with_query(q) for q in self.shards(query))
+
+    def getitem_with_query(self, query, item):
+        if query.options.get('values') or not self._time_ordered(query):
+            pts = list(self.fetch_with_query(query))
+            if type(item) == slice:
+                return iter(pts[item])
+            return pts[item] if -len(pts) <= item < len(pts) else None
+        rg = seek_range(item)
+        if rg == None:
+            count = self.count_with_query(query)
+            rg = seek_range(slice(*item.indices(count)[:2]))
+        reverse, offset, limit = rg
+        pts = []
+        # 从需要的一端逐个分区读取, 倒序时在分区中从末尾查找; 只有需跳过 offset 个点时才计数
+        for q in self.shards(query, reverse=reverse):
+            if limit != None and len(pts) >= limit:
+                break
+            if offset:
+                c = self.tsdb.count_with_query(q)
+                if offset >= c:
+                    offset -= c
+                    continue
+            need = None if limit == None else limit - len(pts)
+            if reverse:
+                pts.extend(reversed(list(self.tsdb.getitem_with_query(q, slice(-(offset + need), -offset or None)))))
+            else:
+                pts.extend(self.tsdb.getitem_with_query(q, slice(offset, None if need == None else offset + need)))
+            offset = 0
+        if type(item) == slice:
+            return reversed(pts) if reverse else iter(pts)
+        return pts[0] if pts else None
+
+    def first_with_query(self, query):
+        return self.getitem_with_query(query, 0)
+
+    def last_with_query(self, query):
+        return self.getitem_with_query(query, -1)
+
+    def pages_with_query(self, query, size):
+        if query.options.get('values') or not self._time_ordered(query):
+            return TSDBBase.pages_with_query(self.tsdb, query, size)
+        return self._pages(query, size)
+
+    def _pages(self, query, size):
+        # 各分区的页首尾相接, 再按 size 切分
+        page = []
+        for q in self.shards(query):
+            for pts in self.tsdb.pages_with_query(q, size):
+                page.extend(pts)
+                while len(page) >= size:
+                    yield page[:size]
+                    page = page[size:]
+        if page:
+            yield page
+
+    def columns_with_query(self, query, fields=None):
+        from .parallel import _concat_columns
+        shards = self.shards(query)
+        if query.options.get('values') or not self._time_ordered(query) or not shards:
+            return TSDBBase.columns_with_query(self.tsdb, query, fields)
+        return _concat_columns([self.tsdb.columns_with_query(q, fields) for q in shards])
+
+    def delete_with_query(self, query):
+        options = query.options
+        start, end = self._range(options)
+        for s, e, name in self.partitions():
+            if (start != None and e <= start) or (end != None and s > end):
+                continue
+            inside = (start == None or start <= s) and (end == None or end >= e) and not options.get('time_after') and not options.get('time_before')
+            if inside and not options.get('filter'):
+                # 整个分区都被删除
+                self.tsdb.drop_table(name)
+                self._known.discard(name)
+            else:
+                self.tsdb.delete_with_query(TSDBQuery(self.tsdb, name, dict(options)))
@@ -0,0 +1,325 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Rollups: partial aggregates per time bucket (and per tag values) kept in a companion table,
+updated as points are written, so matching time_group queries read buckets instead of raw points:
+
+    tsdb.register_rollup('device', 'hour', values={'x': Mean('x'), 'mx': Max('x')}, tags={'devid': 'str'})
+    tsdb.query('device').filter(devid='A1').time_group('day').values(x=Mean('x')).all()
+'''
+from __future__ import print_function
+
+import datetime
+import threading
+
+from .base import TSDBException, TSDBPoint, to_epoch_us, get_order_by, is_time_descending
+from .base import Aggregate, Sum, Count, Max, Min, Mean, First, Last
+
+# 由细到粗, 细粒度的桶完整地落在粗粒度的桶内
+GROUPS = ['minute', 'hour', 'day', 'month', 'year']
+
+# 每种聚合需要保存的部分结果
+KINDS = [
+    (Mean, ('sum', 'count')),
+    (Sum, ('sum',)),
+    (Count, ('count',)),
+    (Max, ('max',)),
+    (Min, ('min',)),
+    (First, ('first', 'first_time')),
+    (Last, ('last', 'last_time')),
+]
+
+KIND_TYPES = {
+    'count': 'int',
+    'first_time': 'int',
+    'last_time': 'int',
+}
+
+
+def get_kinds(ag):
+    for cls, kinds in KINDS:
+        if isinstance(ag, cls):
+            return kinds
+    raise TSDBException('Unknown Aggregate: %s' % ag)
+
+
+def bucket_time(tm, group):
+    '''
+    start of the group bucket tm falls in
+    '''
+    if group == 'minute':
+        return tm.replace(second=0, microsecond=0)
+    elif group == 'hour':
+        return tm.replace(minute=0, second=0, microsecond=0)
+    elif group == 'day':
+        return tm.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif group == 'month':
+        return tm.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif group == 'year':
+        return tm.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    raise TSDBException('Unknown time_group: %s' % group)
+
+
+def next_bucket(tm, group):
+    '''
+    start of the bucket after the one starting at tm
+    '''
+    if group == 'minute':
+        return tm + datetime.timedelta(minutes=1)
+    elif group == 'hour':
+        return tm + datetime.timedelta(hours=1)
+    elif group == 'day':
+        return tm + datetime.timedelta(days=1)
+    elif group == 'month':
+        return tm.replace(year=tm.year + tm.month // 12, month=tm.month % 12 + 1)
+    elif group == 'year':
+        return tm.replace(year=tm.year + 1)
+    raise TSDBException('Unknown time_group: %s' % group)
+
+
+def merge_partial(a, b):
+    '''
+    merge partial aggregates b into a, both {'<field>__<kind>': value}, first and last values may be None
+    '''
+    for k, v in b.items():
+        f, kind = k.rsplit('__', 1)
+        if kind in ('first', 'last') or v == None:
+            # first/last 随 first_time/last_time 合并
+            continue
+        o = a.get(k)
+        if kind == 'first_time':
+            if o == None or v < o:
+                a[k] = v
+                a[f + '__first'] = b.get(f + '__first')
+        elif kind == 'last_time':
+            if o == None or v >= o:
+                a[k] = v
+                a[f + '__last'] = b.get(f + '__last')
+        elif o == None:
+            a[k] = v
+        elif kind in ('sum', 'count'):
+            a[k] = o + v
+        elif kind == 'max':
+            a[k] = max(o, v)
+        elif kind == 'min':
+            a[k] = min(o, v)
+    return a
+
+
+def finalize_partial(partial, values):
+    '''
+    values {name: Aggregate} computed from a partial
+    '''
+    data = {}
+    for k, ag in values.items():
+        f = ag.field
+        if isinstance(ag, Mean):
+            count = partial.get(f + '__count')
+            data[k] = partial.get(f + '__sum') / float(count) if count else None
+        elif isinstance(ag, Count):
+            data[k] = partial.get(f + '__count') or 0
+        else:
+            data[k] = partial.get('%s__%s' % (f, get_kinds(ag)[0]))
+    return data
+
+
+class Rollup(object):
+    '''
+    One rollup of a table, partial aggregates of fields per group bucket and tag values
+    stored in the table <table>__<group>
+    '''
+
+    def __init__(self, tsdb, table, group, values, tags=None):
+        if group not in GROUPS:
+            raise TSDBException('Unknown time_group: %s' % group)
+        self.tsdb = tsdb
+        self.table = table
+        self.group = group
+        self.name = '%s__%s' % (table, group)
+        if isinstance(tags, dict):
+            self.tags = dict(tags)
+        else:
+            self.tags = {t: 'str' for t in tags or ()}
+        self.kinds = {}
+        for ag in values.values():
+            if not isinstance(ag, Aggregate):
+                raise TSDBException('Unknown Aggregate: %s' % ag)
+            self.kinds.setdefault(ag.field, set()).update(get_kinds(ag))
+        self._lock = threading.RLock()
+
+    def columns(self):
+        '''
+        names of the partial columns
+        '''
+        return sorted('%s__%s' % (f, kind) for f, kinds in self.kinds.items() for kind in kinds)
+
+    def register(self):
+        # 部分结果与原字段同类型, 结果与原始查询一致
+        types = self.tsdb._point_columns(self.table) or {}
+        fields = {}
+        for f, kinds in self.kinds.items():
+            for kind in kinds:
+                fields['%s__%s' % (f, kind)] = KIND_TYPES.get(kind) or types.get(f) or 'float'
+        options = {'tags': dict(self.tags), 'fields': fields}
+        options.update(self.tsdb._rollup_table_options)
+        self.tsdb.register_table(self.name, options)
+        if self.tsdb.query(self.name).first() == None:
+            self.rebuild()
+
+    def fold(self, points, partials=None):
+        '''
+        fold points into {(bucket, tag values): partial}
+        '''
+        partials = {} if partials == None else partials
+        tags = sorted(self.tags)
+        for p in points:
+            if p.time == None:
+                continue
+            key = (bucket_time(p.time, self.group),) + tuple(p.data.get(t) for t in tags)
+            partial = partials.get(key)
+            if partial == None:
+                partial = partials[key] = {}
+            us = None
+            for f, kinds in self.kinds.items():
+                v = p.data.get(f)
+                b = {}
+                if 'first' in kinds or 'last' in kinds:
+                    # first/last 与原始查询一样保留空值
+                    us = to_epoch_us(p.time) if us == None else us
+                    for k in ('first', 'last'):
+                        if k in kinds:
+                            b['%s__%s' % (f, k)] = v
+                            b['%s__%s_time' % (f, k)] = us
+                if v != None:
+                    for k in kinds:
+                        if k == 'count':
+                            b['%s__count' % f] = 1
+                        elif k in ('sum', 'max', 'min'):
+                            b['%s__%s' % (f, k)] = v
+                merge_partial(partial, b)
+        return partials
+
+    def update(self, points):
+        '''
+        merge written points into the stored buckets
+        '''
+        partials = self.fold(points)
+        if partials:
+            self.tsdb._merge_rollup(self, partials)
+
+    def rewrite(self, partials):
+        '''
+        merge partials by reading, deleting and writing again the touched buckets, for backends without upserts
+        '''
+        with self._lock:
+            buckets = [k[0] for k in partials]
+            start, end = min(buckets), max(buckets)
+            q = self.tsdb.query(self.name).time_range(start, end)
+            tags = sorted(self.tags)
+            for p in q:
+                key = (p.time,) + tuple(p.data.get(t) for t in tags)
+                if key in partials:
+                    partials[key] = merge_partial(dict((k, v) for k, v in p.data.items() if k not in self.tags), partials[key])
+                else:
+                    partials[key] = dict((k, v) for k, v in p.data.items() if k not in self.tags)
+            q.delete()
+            self._write(partials)
+
+    def _write(self, partials):
+        tags = sorted(self.tags)
+        points = []
+        for key, partial in sorted(partials.items(), key=lambda kv: kv[0][0]):
+            data = dict(zip(tags, key[1:]))
+            data.update(partial)
+            points.append(TSDBPoint(time=key[0], data=data))
+        if points:
+            self.tsdb.write_points(self.name, points)
+
+    def rebuild(self, start=None, end=None, chunk=10000):
+        '''
+        recompute the buckets from start to end (all if None) from the raw table
+        '''
+        with self._lock:
+            if start != None:
+                start = bucket_time(start, self.group)
+            if end != None:
+                end = next_bucket(bucket_time(end, self.group), self.group) - datetime.timedelta(microseconds=1)
+            self.tsdb.query(self.name).time_range(start, end).delete()
+            partials = {}
+            last = None
+            for p in self.tsdb.query(self.table).time_range(start, end):
+                b = bucket_time(p.time, self.group)
+                if last != None and b != last and len(partials) >= chunk:
+                    # 按桶写出, 限制内存
+                    self._write(partials)
+                    partials = {}
+                last = b
+                self.fold([p], partials)
+            self._write(partials)
+
+    def match(self, query):
+        '''
+        True when the query can be answered from this rollup
+        '''
+        options = query.options
+        values = options.get('values')
+        group = options.get('time_group')
+        if not values or group not in GROUPS or GROUPS.index(group) < GROUPS.index(self.group):
+            return False
+        if options.get('time_after') or options.get('time_before') or options.get('row_view'):
+            return False
+        if [f for f, _ in get_order_by(query, 'time')] != ['time']:
+            return False
+        for k in (options.get('filter') or {}):
+            if k not in self.tags:
+                return False
+        for ag in values.values():
+            if not isinstance(ag, Aggregate) or not set(get_kinds(ag)) <= self.kinds.get(ag.field, set()):
+                return False
+        start, end = self._full_range(options.get('time_start'), options.get('time_end'))
+        return start == None or end == None or start < end
+
+    def _full_range(self, start, end):
+        # [start, end) 由完整的桶组成
+        if start != None:
+            b = bucket_time(start, self.group)
+            start = b if b == start else next_bucket(b, self.group)
+        if end != None:
+            b = bucket_time(end, self.group)
+            nb = next_bucket(b, self.group)
+            end = nb if nb - datetime.timedelta(microseconds=1) == end else b
+        return start, end
+
+    def fetch(self, query):
+        '''
+        grouped points of the query, whole buckets from the rollup and the partial ones at the edges from the raw table
+        '''
+        options = query.options
+        group = options['time_group']
+        flt = options.get('filter') or {}
+        start, end = self._full_range(options.get('time_start'), options.get('time_end'))
+        one = datetime.timedelta(microseconds=1)
+        partials = {}
+
+        def add(tm, partial):
+            b = bucket_time(tm, group)
+            if b in partials:
+                merge_partial(partials[b], partial)
+            else:
+                partials[b] = partial
+
+        q = self.tsdb.query(self.name).filter(**flt).time_range(start, end - one if end != None else None)
+        for p in q:
+            add(p.time, dict((k, v) for k, v in p.data.items() if k not in self.tags))
+        raw = self.tsdb.query(self.table).filter(**flt)
+        edges = []
+        if start != None and options.get('time_start') and options['time_start'] < start:
+            edges.append(raw.time_range(options['time_start'], start - one))
+        if end != None and end <= options['time_end']:
+            edges.append(raw.time_range(end, options.get('time_end')))
+        for e in edges:
+            for key, partial in self.fold(e).items():
+                add(key[0], partial)
+        for b in sorted(partials, reverse=is_time_descending(query)):
+            yield TSDBPoint(time=b, data=finalize_partial(partials[b], options['values']))
@@ -0,0 +1,796 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Memory mapped segment storage for local deployments, a directory per database:
+
+    <path>/<table>/define.json
+    <path>/<table>/<series>/series.json  tag values of the series
+    <path>/<table>/<series>/active.seg   the segment receiving appends
+    <path>/<table>/<series>/<n>.seg      sealed segments, replaced as a whole and never modified in place
+
+A segment is a header followed by fixed width little-endian columns of capacity rows: the time in epoch
+microseconds (int64), then one int64 or float64 column per field. Reads mmap the files and slice views
+over them (NumPy arrays when NumPy is installed, else memoryviews): columns() of a range inside one
+segment returns views over the file without copying, and processes reading the same files share the
+page cache. None is stored as NaN in float columns and as -2**63 in int columns.
+Only one process may write a table, any number of processes may read it.
+
+    tsdb = connect('segment://localhost/tmp/tsdb')
+'''
+from __future__ import print_function
+
+import array
+import bisect
+import datetime
+import hashlib
+import heapq
+import itertools
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import threading
+
+from .base import TSDBException, TSDBPoint, TSDBBase, seek_range, get_order_by, to_column, to_epoch_us
+from .columnar import column_stats
+from .rollup import GROUPS, bucket_time, next_bucket, get_kinds, merge_partial, finalize_partial
+
+TIME_FIELD = '_time'
+MAGIC = b'TSSG'
+VERSION = 1
+# magic, 版本, 容量, 行数, 列数
+HEADER = struct.Struct('<4sIQQI4x')
+COUNT_OFFSET = 16
+# 列名, 类型
+COLUMN = struct.Struct('<32sc7x')
+INT_NULL = -2 ** 63
+FIELD_TYPES = {
+    'int': 'q',
+    'integer': 'q',
+    'float': 'd',
+    'double': 'd',
+}
+SEGMENT_SIZE = 65536
+# 遍历时每次取出的行数
+CHUNK_SIZE = 4096
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _get_numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def from_epoch_us(us):
+    return datetime.datetime.fromtimestamp(us // 1000000) + datetime.timedelta(microseconds=us % 1000000)
+
+
+def _view(buf, offset, count, code):
+    # buf 中 offset 开始的 count 个 int64/float64, 不复制
+    numpy = _get_numpy()
+    if numpy != None:
+        if not count:
+            return numpy.zeros(0, dtype='<i8' if code == 'q' else '<f8')
+        return numpy.frombuffer(buf, dtype='<i8' if code == 'q' else '<f8', count=count, offset=offset)
+    if sys.byteorder == 'little' and hasattr(memoryview, 'cast'):
+        return memoryview(buf)[offset:offset + count * 8].cast(code)
+    a = array.array(code, buf[offset:offset + count * 8])
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a
+
+
+def _pack(code, values):
+    a = array.array(code, values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a.tobytes() if hasattr(a, 'tobytes') else a.tostring()
+
+
+def _to_db(code, v):
+    if v == None:
+        return float('nan') if code == 'd' else INT_NULL
+    return float(v) if code == 'd' else int(v)
+
+
+def _from_db(code, v):
+    if code == 'd':
+        return None if v != v else v
+    return None if v == INT_NULL else v
+
+
+def _search(times, us, right=False):
+    if hasattr(times, 'searchsorted'):
+        return int(times.searchsorted(us, 'right' if right else 'left'))
+    return bisect.bisect_right(times, us) if right else bisect.bisect_left(times, us)
+
+
+def write_segment(path, names, codes, times, columns, capacity=None):
+    '''
+    write a segment of capacity rows (default the rows given) with times and {field: values}, replacing path
+    '''
+    capacity = max(capacity or 0, len(times))
+    head = HEADER.pack(MAGIC, VERSION, capacity, len(times), len(names))
+    head += b''.join(COLUMN.pack(n.encode('utf-8'), codes[n].encode('ascii')) for n in names)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(head)
+        for i, (code, values) in enumerate([('q', times)] + [(codes[n], [_to_db(codes[n], v) for v in columns.get(n) or [None] * len(times)]) for n in names]):
+            f.seek(len(head) + i * capacity * 8)
+            f.write(_pack(code, values))
+        f.truncate(len(head) + (len(names) + 1) * capacity * 8)
+    _replace(tmp, path)
+
+
+class Segment(object):
+    '''
+    a segment file mapped read only
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.stat = (st.st_ino, st.st_size)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.capacity, _, n = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise TSDBException('Unknown segment: %s' % path)
+        self.names = []
+        self.codes = {}
+        for i in range(n):
+            name, code = COLUMN.unpack_from(self._mm, HEADER.size + i * COLUMN.size)
+            name = name.rstrip(b'\0').decode('utf-8')
+            self.names.append(name)
+            self.codes[name] = code.decode('ascii')
+        self.data = HEADER.size + n * COLUMN.size
+
+    @property
+    def count(self):
+        # 活动段的行数随写入增长
+        return struct.unpack_from('<Q', self._mm, COUNT_OFFSET)[0]
+
+    def column(self, name, start=0, stop=None):
+        '''
+        view of the rows start..stop of the column name (_time for the times), None when the segment has no such column
+        '''
+        if name == TIME_FIELD:
+            i, code = 0, 'q'
+        elif name in self.codes:
+            i, code = self.names.index(name) + 1, self.codes[name]
+        else:
+            return None
+        stop = self.count if stop == None else stop
+        return _view(self._mm, self.data + (i * self.capacity + start) * 8, stop - start, code)
+
+    def read(self, start=0, stop=None):
+        '''
+        (times, {field: values}) of the rows start..stop as lists, None for nulls
+        '''
+        stop = self.count if stop == None else stop
+        columns = {}
+        for n in self.names:
+            code = self.codes[n]
+            columns[n] = [_from_db(code, v) for v in self.column(n, start, stop).tolist()]
+        return self.column(TIME_FIELD, start, stop).tolist(), columns
+
+
+class _Series(object):
+    '''
+    directory of the segments of one combination of tag values
+    '''
+
+    def __init__(self, path, tags):
+        self.path = path
+        self.tags = tags
+
+    def segments(self):
+        '''
+        paths of the segments in time order, the active one last
+        '''
+        names = [fn for fn in os.listdir(self.path) if fn.endswith('.seg') and fn != 'active.seg']
+        paths = [os.path.join(self.path, fn) for fn in sorted(names, key=lambda fn: int(fn[:-4]))]
+        active = os.path.join(self.path, 'active.seg')
+        if os.path.exists(active):
+            paths.append(active)
+        return paths
+
+    def next_path(self):
+        names = [int(fn[:-4]) for fn in os.listdir(self.path) if fn.endswith('.seg') and fn != 'active.seg']
+        return os.path.join(self.path, '%08d.seg' % (max(names) + 1 if names else 0))
+
+
+class _Table(object):
+    def __init__(self, path, define):
+        self.path = path
+        self.define = define
+        self.tags = sorted(define.get('tags') or {})
+        self.fields = sorted(define.get('fields') or {})
+        self.codes = dict((f, FIELD_TYPES[t]) for f, t in (define.get('fields') or {}).items())
+        self.segment_size = define.get('segment_size') or SEGMENT_SIZE
+        self._series = {}
+
+    def series(self):
+        '''
+        all the series, including the ones written by other processes
+        '''
+        for d in os.listdir(self.path):
+            if d not in self._series and os.path.exists(os.path.join(self.path, d, 'series.json')):
+                with open(os.path.join(self.path, d, 'series.json')) as f:
+                    tags = json.load(f)
+                self._series[d] = _Series(os.path.join(self.path, d), tags)
+        return list(self._series.values())
+
+    def get_series(self, key):
+        tags = dict(zip(self.tags, key))
+        d = hashlib.sha1(json.dumps(list(key)).encode('utf-8')).hexdigest()[:16]
+        s = self._series.get(d)
+        if s == None:
+            path = os.path.join(self.path, d)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+                with open(os.path.join(path, 'series.json'), 'w') as f:
+                    json.dump(tags, f)
+            s = self._series[d] = _Series(path, tags)
+        return s
+
+
+class _Scan(object):
+    '''
+    time bounds (inclusive epoch microseconds), tag and field filters and direction of a query on a table
+    '''
+
+    def __init__(self, table, query, reverse=False):
+        options = query.options
+        orders = get_order_by(query, TIME_FIELD, reverse=reverse)
+        if len(orders) != 1 or orders[0][0] != TIME_FIELD:
+            raise TSDBException('segment only supports order by time')
+        self.table = table
+        self.desc = orders[0][1]
+        self.lo = self.hi = None
+        if options.get('time_start'):
+            self.lo = to_epoch_us(options['time_start'])
+        if options.get('time_after'):
+            lo = to_epoch_us(options['time_after']) + 1
+            self.lo = lo if self.lo == None else max(self.lo, lo)
+        if options.get('time_end'):
+            self.hi = to_epoch_us(options['time_end'])
+        if options.get('time_before'):
+            hi = to_epoch_us(options['time_before']) - 1
+            self.hi = hi if self.hi == None else min(self.hi, hi)
+        self.tags = {}
+        self.flt = {}
+        for k, v in (options.get('filter') or {}).items():
+            if k in table.tags:
+                self.tags[k] = v
+            else:
+                self.flt[k] = v
+
+    def series(self):
+        return [s for s in self.table.series() if not [1 for k, v in self.tags.items() if s.tags.get(k) != v]]
+
+    def match(self, s, columns, k):
+        for f, v in self.flt.items():
+            c = columns.get(f)
+            if (c[k] if c != None else None) != v:
+                return False
+        return True
+
+
+class _Buckets(object):
+    '''
+    start of the time_group bucket of epoch microseconds, the last bucket is cached
+    '''
+
+    def __init__(self, group):
+        if group not in GROUPS:
+            raise TSDBException('Unknown time_group: %s' % group)
+        self.group = group
+        self.start = self.end = None
+
+    def __call__(self, us):
+        if self.start == None or not self.start <= us < self.end:
+            b = bucket_time(from_epoch_us(us), self.group)
+            self.start, self.end = to_epoch_us(b), to_epoch_us(next_bucket(b, self.group))
+        return self.start
+
+
+class SegmentTSDB(TSDBBase):
+    '''
+    Memory mapped segment files in the directory path
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._tables = {}
+        self._segments = {}
+        self._lock = threading.RLock()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _get_table(self, table):
+        with self._lock:
+            t = self._tables.get(table)
+            if t == None:
+                fn = os.path.join(self.path, table, 'define.json')
+                if not os.path.exists(fn):
+                    return None
+                with open(fn) as f:
+                    define = json.load(f)
+                t = self._tables[table] = _Table(os.path.join(self.path, table), define)
+            return t
+
+    def _open(self, path):
+        # 按 inode 缓存映射, 重写后的文件重新映射
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            seg = self._segments.get(path)
+            if seg == None or seg.stat != (st.st_ino, st.st_size):
+                seg = self._segments[path] = Segment(path)
+            return seg
+
+    def register_table(self, table, options):
+        with self._lock:
+            t = self._get_table(table)
+            define = dict(t.define) if t else {}
+            tags = dict(define.get('tags') or {})
+            tags.update(options.get('tags') or {})
+            fields = dict(define.get('fields') or {})
+            fields.update(options.get('fields') or {})
+            for k in tags:
+                fields.pop(k, None)
+            for k, tp in fields.items():
+                if tp not in FIELD_TYPES:
+                    raise TSDBException('segment fields are int or float, %s is %s' % (k, tp))
+            define.update(tags=tags, fields=fields, segment_size=options.get('segment_size', define.get('segment_size')) or SEGMENT_SIZE)
+            path = os.path.join(self.path, table)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            with open(os.path.join(path, 'define.json'), 'w') as f:
+                json.dump(define, f, indent=2, sort_keys=True)
+            self._tables[table] = _Table(path, define)
+
+    def write_points(self, table, points):
+        points = self._before_write(table, points)
+        t = self._get_table(table)
+        if t == None:
+            raise TSDBException('Unknown table: %s' % table)
+        count = 0
+        with self._lock, self._operation('write', table) as op:
+            series = {}
+            for p in points:
+                if p.time == None:
+                    p.time = datetime.datetime.now()
+                key = tuple(p.data.get(k) for k in t.tags)
+                rows = series.get(key)
+                if rows == None:
+                    rows = series[key] = []
+                rows.append((to_epoch_us(p.time), count, p.data))
+                count += 1
+            for key, rows in series.items():
+                rows.sort(key=lambda r: (r[0], r[1]))
+                # 同一时间的点以最后写入的为准
+                rows = [(r[0], r[2]) for i, r in enumerate(rows) if i + 1 == len(rows) or rows[i + 1][0] != r[0]]
+                self._write_series(t, t.get_series(key), rows)
+            op.rows_in = count
+        self._after_write(table, points)
+        return count
+
+    def _write_series(self, t, s, rows):
+        segs = [self._open(p) for p in s.segments()]
+        segs = [seg for seg in segs if seg != None and seg.count]
+        last = segs[-1].column(TIME_FIELD, segs[-1].count - 1)[0] if segs else None
+        if last != None and rows[0][0] <= last:
+            # 早于已有时间的点合并进所在的段, 写时复制
+            old = [r for r in rows if r[0] <= last]
+            rows = rows[len(old):]
+            firsts = [seg.column(TIME_FIELD, 0, 1)[0] for seg in segs]
+            targets = {}
+            for r in old:
+                i = max(bisect.bisect_right(firsts, r[0]) - 1, 0)
+                targets.setdefault(i, []).append(r)
+            for i, rs in targets.items():
+                self._merge(t, segs[i], rs)
+        if rows:
+            self._append(t, s, rows)
+
+    def _merge(self, t, seg, rows):
+        times, columns = seg.read()
+        merged = dict((tm, dict((n, c[i]) for n, c in columns.items())) for i, tm in enumerate(times))
+        for tm, data in rows:
+            merged[tm] = data
+        times = sorted(merged)
+        columns = dict((f, [merged[tm].get(f) for tm in times]) for f in t.fields)
+        active = os.path.basename(seg.path) == 'active.seg'
+        write_segment(seg.path, t.fields, t.codes, times, columns, t.segment_size if active else None)
+
+    def _append(self, t, s, rows):
+        path = os.path.join(s.path, 'active.seg')
+        while rows:
+            seg = self._open(path)
+            if seg == None or seg.names != t.fields or seg.codes != t.codes or seg.count >= seg.capacity:
+                if seg != None:
+                    self._seal(t, s, seg)
+                write_segment(path, t.fields, t.codes, [], {}, t.segment_size)
+                seg = self._open(path)
+            start = seg.count
+            n = min(len(rows), seg.capacity - start)
+            chunk, rows = rows[:n], rows[n:]
+            with open(path, 'r+b') as f:
+                for i, name in enumerate([TIME_FIELD] + seg.names):
+                    f.seek(seg.data + (i * seg.capacity + start) * 8)
+                    if name == TIME_FIELD:
+                        f.write(_pack('q', [r[0] for r in chunk]))
+                    else:
+                        code = seg.codes[name]
+                        f.write(_pack(code, [_to_db(code, r[1].get(name)) for r in chunk]))
+                # 数据写完后再更新行数, 读取方只看到完整的行
+                f.flush()
+                f.seek(COUNT_OFFSET)
+                f.write(struct.pack('<Q', start + n))
+
+    def _seal(self, t, s, seg):
+        path = s.next_path()
+        if not seg.count:
+            os.remove(seg.path)
+        elif seg.count == seg.capacity:
+            _replace(seg.path, path)
+        else:
+            times, columns = seg.read()
+            write_segment(path, seg.names, seg.codes, times, columns)
+            os.remove(seg.path)
+
+    def seal(self, table):
+        '''
+        seal the active segments of table, they become immutable
+        '''
+        t = self._get_table(table)
+        with self._lock:
+            for s in t.series() if t else []:
+                seg = self._open(os.path.join(s.path, 'active.seg'))
+                if seg != None:
+                    self._seal(t, s, seg)
+
+    def _ranges(self, scan, s):
+        '''
+        (segment, start, stop) of the rows of series s within the time bounds, in the scan order
+        '''
+        res = []
+        for p in s.segments():
+            seg = self._open(p)
+            n = seg.count if seg != None else 0
+            if not n:
+                continue
+            times = seg.column(TIME_FIELD, 0, n)
+            i = 0 if scan.lo == None else _search(times, scan.lo)
+            j = n if scan.hi == None else _search(times, scan.hi, right=True)
+            if i < j:
+                res.append((seg, i, j))
+        return res[::-1] if scan.desc else res
+
+    def _chunk_rows(self, scan, s, seg, i, j):
+        # 读取的行数逐次增大, first() 等只取少量行
+        n = 16
+        while i < j:
+            a, b = (max(i, j - n), j) if scan.desc else (i, min(j, i + n))
+            times, columns = seg.read(a, b)
+            idx = range(len(times))
+            for k in reversed(idx) if scan.desc else idx:
+                if not scan.flt or scan.match(s, columns, k):
+                    yield times[k], s, columns, k
+            if scan.desc:
+                j = a
+            else:
+                i = b
+            n = min(n * 4, CHUNK_SIZE)
+
+    def _seek(self, scan, ranges, skip):
+        '''
+        cut the (series, segment, start, stop) ranges at the time of the row skip, found by a binary
+        search counting the rows before a time on the time columns. Returns the ranges and the rows
+        still to skip, which share the time of the cut.
+        '''
+        ranges = [(s, seg, i, j, seg.column(TIME_FIELD, i, j)) for s, seg, i, j in ranges]
+
+        def before(us):
+            # 按查询顺序排在 us 之前的行数
+            if scan.desc:
+                return sum(len(times) - _search(times, us, right=True) for _, _, _, _, times in ranges)
+            return sum(_search(times, us) for _, _, _, _, times in ranges)
+
+        lo = min(int(times[0]) for _, _, _, _, times in ranges)
+        hi = max(int(times[-1]) for _, _, _, _, times in ranges)
+        if scan.desc:
+            # 最小的 cut 使 before(cut) <= skip
+            lo -= 1
+            while lo + 1 < hi:
+                mid = (lo + hi) // 2
+                if before(mid) <= skip:
+                    hi = mid
+                else:
+                    lo = mid
+            cut = hi
+            res = [(s, seg, i, i + _search(times, cut, right=True)) for s, seg, i, j, times in ranges]
+        else:
+            # 最大的 cut 使 before(cut) <= skip
+            hi += 1
+            while lo + 1 < hi:
+                mid = (lo + hi) // 2
+                if before(mid) <= skip:
+                    lo = mid
+                else:
+                    hi = mid
+            cut = lo
+            res = [(s, seg, i + _search(times, cut), j) for s, seg, i, j, times in ranges]
+        return [r for r in res if r[2] < r[3]], skip - before(cut)
+
+    def _rows(self, scan, skip=0):
+        '''
+        (epoch microseconds, series, columns, index) of the matching rows, after skip rows
+        '''
+        sign = -1 if scan.desc else 1
+        ranges = [(s, seg, i, j) for s in scan.series() for seg, i, j in self._ranges(scan, s)]
+        if skip and ranges and not scan.flt:
+            ranges, skip = self._seek(scan, ranges, skip)
+        # 每个范围为一个来源, 以其第一行的时间排序
+        heap = []
+        for s, seg, i, j in ranges:
+            tm = seg.column(TIME_FIELD, j - 1, j)[0] if scan.desc else seg.column(TIME_FIELD, i, i + 1)[0]
+            heap.append((sign * int(tm), len(heap), s, (seg, i, j), None))
+        heapq.heapify(heap)
+        while heap:
+            _, n, s, item, it = heap[0]
+            if it == None:
+                it = self._chunk_rows(scan, s, *item)
+            elif skip:
+                skip -= 1
+            else:
+                yield item
+            for r in it:
+                heapq.heapreplace(heap, (sign * r[0], n, s, r, it))
+                break
+            else:
+                heapq.heappop(heap)
+
+    def _point(self, t, row):
+        us, s, columns, k = row
+        data = dict((tg, s.tags.get(tg)) for tg in t.tags)
+        for f in t.fields:
+            c = columns.get(f)
+            data[f] = c[k] if c != None else None
+        return TSDBPoint(time=from_epoch_us(us), data=data)
+
+    def fetch_with_query(self, query):
+        t = self._get_table(query.table)
+        if t == None:
+            return iter([])
+        scan = _Scan(t, query)
+        if query.options.get('values'):
+            return iter(self._aggregate(scan, query.options))
+        return (self._point(t, r) for r in self._rows(scan))
+
+    def count_with_query(self, query):
+        t = self._get_table(query.table)
+        if t == None:
+            return 0
+        scan = _Scan(t, query)
+        if query.options.get('values'):
+            return len(self._aggregate(scan, query.options))
+        if scan.flt:
+            return sum(1 for _ in self._rows(scan))
+        return sum(j - i for s in scan.series() for _, i, j in self._ranges(scan, s))
+
+    def getitem_with_query(self, query, item):
+        t = self._get_table(query.table)
+        if t == None or query.options.get('values'):
+            pts = list(self.fetch_with_query(query))
+            if type(item) == slice:
+                return iter(pts[item])
+            return pts[item] if -len(pts) <= item < len(pts) else None
+        rg = seek_range(item)
+        if rg == None:
+            count = self.count_with_query(query)
+            rg = seek_range(slice(*item.indices(count)[:2]))
+        reverse, offset, limit = rg
+        rows = self._rows(_Scan(t, query, reverse=reverse), skip=offset)
+        pts = [self._point(t, r) for r in itertools.islice(rows, limit)]
+        rows.close()
+        if type(item) == slice:
+            return reversed(pts) if reverse else iter(pts)
+        return pts[0] if pts else None
+
+    def first_with_query(self, query):
+        return self.getitem_with_query(query, 0)
+
+    def last_with_query(self, query):
+        return self.getitem_with_query(query, -1)
+
+    def pages_with_query(self, query, size):
+        # 同一时间可有多个序列的点, 直接按顺序分页
+        page = []
+        for p in self.fetch_with_query(query):
+            page.append(p)
+            if len(page) >= size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def _stats(self, seg, name, i, j, times):
+        # 段中 i..j 行的一列的统计, 有 NumPy 时不复制数据, first/last 保留空值
+        col = seg.column(name, i, j)
+        if col is None or not hasattr(col, 'searchsorted'):
+            ts = times[i:j] if times != None else seg.column(TIME_FIELD, i, j).tolist()
+            return column_stats(ts, [None] * len(ts) if col is None else [_from_db(seg.codes[name], v) for v in col.tolist()])
+        numpy = _get_numpy()
+        code = seg.codes[name]
+        valid = ~numpy.isnan(col) if code == 'd' else col != INT_NULL
+        idx = numpy.flatnonzero(valid)
+        stats = {'count': len(idx)}
+        if len(col):
+            stats.update(first=_from_db(code, col[0].item()), first_time=int(seg.column(TIME_FIELD, i, i + 1)[0]),
+                         last=_from_db(code, col[-1].item()), last_time=int(seg.column(TIME_FIELD, j - 1, j)[0]))
+        if len(idx):
+            vs = col[valid] if len(idx) < len(col) else col
+            stats.update(min=vs.min().item(), max=vs.max().item(), sum=vs.sum().item())
+        return stats
+
+    def _aggregate(self, scan, options):
+        values = options['values']
+        group = options.get('time_group')
+        buckets = _Buckets(group) if group else None
+        kinds = {}
+        for ag in values.values():
+            kinds.setdefault(ag.field, set()).update(get_kinds(ag))
+        t = scan.table
+        partials = {}
+
+        def add(bucket, tm, partial):
+            if bucket in partials:
+                merge_partial(partials[bucket][1], partial)
+                partials[bucket][0] = min(partials[bucket][0], tm)
+            else:
+                partials[bucket] = [tm, partial]
+
+        for s in scan.series():
+            for seg, i, j in self._ranges(scan, s):
+                if scan.flt:
+                    # 有字段过滤时逐行计算
+                    times, columns = seg.read(i, j)
+                    idx = [k for k in range(len(times)) if scan.match(s, columns, k)]
+                    for bucket, rows in itertools.groupby(idx, key=lambda k: buckets(times[k]) if group else None):
+                        rows = list(rows)
+                        ts = [times[k] for k in rows]
+                        partial = {}
+                        for f, ks in kinds.items():
+                            vs = [s.tags.get(f)] * len(rows) if f in t.tags else [columns[f][k] for k in rows] if f in columns else [None] * len(rows)
+                            stats = column_stats(ts, vs)
+                            partial.update(('%s__%s' % (f, k), stats[k]) for k in ks if k in stats)
+                        add(bucket, ts[0], partial)
+                    continue
+                times = seg.column(TIME_FIELD, 0, j)
+                while i < j:
+                    # 按桶切分行区间
+                    first = int(times[i])
+                    k = j
+                    if group:
+                        buckets(first)
+                        k = min(j, _search(times, buckets.end))
+                    partial = {}
+                    for f, ks in kinds.items():
+                        if f in t.tags:
+                            v = s.tags.get(f)
+                            stats = column_stats([first, int(times[k - 1])], [v, v])
+                            if v != None:
+                                stats['count'] = k - i
+                                if 'sum' in stats:
+                                    stats['sum'] = v * (k - i)
+                        else:
+                            stats = self._stats(seg, f, i, k, None)
+                        partial.update(('%s__%s' % (f, kk), stats[kk]) for kk in ks if kk in stats)
+                    add(buckets(first) if group else None, first, partial)
+                    i = k
+        return [TSDBPoint(time=from_epoch_us(bucket if group else partials[bucket][0]), data=finalize_partial(partials[bucket][1], values))
+                for bucket in sorted(partials, reverse=scan.desc)]
+
+    def columns_with_query(self, query, fields=None):
+        t = self._get_table(query.table)
+        numpy = _get_numpy()
+        if t == None or query.options.get('values'):
+            return TSDBBase.columns_with_query(self, query, fields)
+        scan = _Scan(t, query)
+        series = scan.series()
+        pieces = [(s, r) for s in series for r in self._ranges(scan, s)]
+        if scan.flt or (numpy == None and len(series) > 1) or (numpy == None and len(pieces) > 1 and scan.desc):
+            return TSDBBase.columns_with_query(self, query, fields)
+        if scan.desc:
+            pieces.reverse()
+        fields = list(fields or t.tags + t.fields)
+        types = dict(t.define.get('tags') or {})
+        types.update(t.define.get('fields') or {})
+        res = {'time': [], }
+        cols = dict((f, []) for f in fields)
+        for s, (seg, i, j) in pieces:
+            res['time'].append(seg.column(TIME_FIELD, i, j))
+            for f in fields:
+                c = seg.column(f, i, j) if f in t.codes else None
+                if c is not None and seg.codes[f] == 'q' and INT_NULL in c:
+                    # 整数列的空值为 nan
+                    c = to_column([_from_db('q', v) for v in c.tolist()], 'float')
+                elif c is None:
+                    c = to_column([s.tags.get(f) if f in t.tags else None] * (j - i), types.get(f))
+                cols[f].append(c)
+        res.update(cols)
+        for k, cs in res.items():
+            if not cs:
+                res[k] = to_column([], 'int' if k == 'time' else types.get(k))
+            elif len(cs) == 1:
+                # 单个段的范围, 直接是文件上的视图
+                res[k] = cs[0]
+            elif numpy != None:
+                res[k] = numpy.concatenate(cs)
+            else:
+                res[k] = to_column([v for c in cs for v in c.tolist()], 'int' if k == 'time' else types.get(k))
+        if len(series) > 1 and len(pieces) > 1:
+            # 多个序列按时间合并
+            order = numpy.argsort(res['time'], kind='stable')
+            res = dict((k, c[order]) for k, c in res.items())
+        if scan.desc:
+            res = dict((k, c[::-1]) for k, c in res.items())
+        return res
+
+    def delete_with_query(self, query):
+        t = self._get_table(query.table)
+        if t == None:
+            return
+        scan = _Scan(t, query)
+        with self._lock:
+            for s in scan.series():
+                for seg, i, j in self._ranges(scan, s):
+                    times, columns = seg.read()
+                    drop = set(k for k in range(i, j) if not scan.flt or scan.match(s, columns, k))
+                    if not drop:
+                        continue
+                    keep = [k for k in range(len(times)) if k not in drop]
+                    if not keep:
+                        os.remove(seg.path)
+                        continue
+                    active = os.path.basename(seg.path) == 'active.seg'
+                    write_segment(seg.path, seg.names, seg.codes, [times[k] for k in keep], dict((n, [c[k] for k in keep]) for n, c in columns.items()),
+                                  t.segment_size if active else None)
+
+    def disk_usage(self, table):
+        '''
+        bytes of the segment files of table
+        '''
+        t = self._get_table(table)
+        return sum(os.path.getsize(p) for s in t.series() for p in s.segments()) if t else 0
+
+    def drop_table(self, table):
+        with self._lock:
+            self._tables.pop(table, None)
+            path = os.path.join(self.path, table)
+            for p in list(self._segments):
+                if p.startswith(path + os.sep):
+                    del self._segments[p]
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+
+    def close(self):
+        self._close_buffers()
+        # 映射在其上的视图释放后关闭
+        self._segments = {}
+        self._tables = {}
+
+    def commit(self):
+        pass
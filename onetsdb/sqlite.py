@@ -4,28 +4,218 @@ Created on 2019-12-16
 '''
 from __future__ import print_function
 
+import contextlib
 import datetime
 import sqlite3
+import threading
+import time
 
-from .base import TSDBPoint, TSDBBase
+from .base import TSDBException, TSDBPoint, TSDBBase, RowView, try_parset_datetime_str, seek_range, get_order_by, to_column, to_epoch_us, int_types, TIME_GROUP_FORMATS
+from .base import Max, Min, Mean, Sum, Count, First, Last
+from .rollup import merge_partial
 
 TIME_FIELD = '_time'
+# _time 的存储方式: None 为时间字符串, us/ns 为整数时间戳(微秒/纳秒)
+TIME_TYPES = {
+    None: 'DATETIME',
+    'us': 'INT_US',
+    'ns': 'INT_NS',
+}
+# 表结构: time 以 _time 为主键; series 为 rowid 表, 同一时间可有多个点 (不同设备)
+LAYOUTS = ('time', 'series')
+JOURNAL_MODES = ('delete', 'truncate', 'persist', 'memory', 'wal', 'off')
+SYNCHRONOUS = ('off', 'normal', 'full', 'extra')
+# write: 每次写入提交; group: 等待与其他写入共同的提交; async: 不等待提交
+DURABILITIES = {
+    'write': None,
+    'group': 0.0,
+    'async': 0.1,
+}
+
+
+def configure(con, journal_mode=None, synchronous=None):
+    '''
+    set the journal_mode (wal...) and synchronous (normal...) pragmas of a connection
+    '''
+    if journal_mode:
+        if journal_mode.lower() not in JOURNAL_MODES:
+            raise TSDBException('Unknown journal_mode: %s' % journal_mode)
+        con.execute('PRAGMA journal_mode=%s' % journal_mode)
+    if synchronous:
+        if synchronous.lower() not in SYNCHRONOUS:
+            raise TSDBException('Unknown synchronous: %s' % synchronous)
+        con.execute('PRAGMA synchronous=%s' % synchronous)
+    return con
+
+
+class _Rows(object):
+    '''
+    rows already fetched, with the cursor's description
+    '''
 
+    def __init__(self, description, rows):
+        self.description = description
+        self.rows = rows
 
-class SqliteTSDB(TSDBBase):
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class _Committer(object):
     '''
-    Wrapper for sqlite3
+    Commit the writes of a connection from a background thread: one transaction (and one fsync) for
+    every write made since the last commit. The writes are made with the tsdb lock held, which is
+    also the lock of the condition.
     '''
 
-    def __init__(self, con=sqlite3.Connection):
+    def __init__(self, tsdb, con, interval=0.0, wait=True):
         self.con = con
+        self.interval = interval
+        self.wait = wait
+        self._written = 0
+        self._committed = 0
+        self._error = None
+        self._closed = False
+        self._cond = threading.Condition(tsdb._lock)
+        self._thread = threading.Thread(target=self._run, name='onetsdb-sqlite-commit')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def begin(self):
+        # 出错时只回滚本次写入, 不影响其他等待提交的写入
+        if not self.wait:
+            self._raise_error()
+        if not self.con.in_transaction:
+            self.con.execute('BEGIN')
+        self.con.execute('SAVEPOINT onetsdb_write')
+
+    def rollback(self):
+        self.con.execute('ROLLBACK TO onetsdb_write')
+        self.con.execute('RELEASE onetsdb_write')
+
+    def written(self):
+        '''
+        the write is done, wait for its commit unless async
+        '''
+        self.con.execute('RELEASE onetsdb_write')
+        self._written += 1
+        seq = self._written
+        self._cond.notify_all()
+        if self.wait:
+            self.sync(seq)
+
+    def sync(self, seq=None):
+        '''
+        wait for the commit of the write seq (default every write so far)
+        '''
+        with self._cond:
+            seq = self._written if seq == None else seq
+            self._cond.notify_all()
+            while self._committed < seq and self._thread.is_alive():
+                self._cond.wait()
+            if self._error != None and self._error[0] < seq <= self._error[1]:
+                raise self._error[2]
+
+    def _raise_error(self):
+        if self._error != None:
+            e, self._error = self._error[2], None
+            raise e
+
+    def _run(self):
+        with self._cond:
+            while True:
+                while self._committed == self._written and not self._closed:
+                    self._cond.wait()
+                if self._committed == self._written:
+                    return
+                end = time.time() + self.interval
+                while not self._closed and time.time() < end:
+                    # 等待更多写入加入这次提交
+                    self._cond.wait(end - time.time())
+                seq = self._written
+                try:
+                    self.con.commit()
+                except Exception as e:
+                    self.con.rollback()
+                    self._error = (self._committed, seq, e)
+                self._committed = seq
+                self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._raise_error()
+
+
+class SqliteTSDB(TSDBBase):
+    '''
+    Wrapper for sqlite3
+    '''
+    # 同一时间有多组 tag 的桶
+    _rollup_table_options = {'layout': 'series'}
+
+    def __init__(self, con=sqlite3.Connection, batch_size=1000, factory=None):
+        self._con = con
+        self._factory = factory
+        self._local = threading.local()
+        self._cons = []
+        self.batch_size = batch_size
         self._table_define = {}
+        self._lock = threading.RLock()
+        self._committer = None
+        self._writer = None
+
+    @property
+    def con(self):
+        if self._factory == None:
+            return self._con
+        con = getattr(self._local, 'con', None)
+        if con == None:
+            # 当前线程的连接
+            con = self._local.con = self._factory()
+            with self._lock:
+                self._cons.append(con)
+        return con
+
+    @property
+    def _thread_safe(self):
+        # 只有每个线程各自连接时
+        return self._factory != None
 
     def _execute(self, sql, *args):
-        # nsql = sql % args
-        # print('sql', sql, args if args else '')
+        self._trace(sql)
         return self.con.execute(sql, args)
 
+    def _executemany(self, sql, rows, con=None):
+        self._trace(sql)
+        return (con or self.con).executemany(sql, rows)
+
+    def set_durability(self, durability='write', interval=None):
+        '''
+        How write_points commits:
+            write: one commit per call before returning (default)
+            group: a background thread commits every write pending in one transaction, write_points waits for it,
+                   interval seconds are waited to gather more writes in the commit
+            async: write_points returns before the commit, done every interval seconds (default 0.1),
+                   the writes of the last interval are lost on a crash and errors are raised by the next write
+        With per-thread connections the writes of every thread share one connection.
+        '''
+        if durability not in DURABILITIES:
+            raise TSDBException('Unknown durability: %s' % durability)
+        with self._lock:
+            if self._committer:
+                c, self._committer = self._committer, None
+                c.close()
+            if durability == 'write':
+                return
+            if self._factory != None and self._writer == None:
+                self._writer = self._factory()
+                self._cons.append(self._writer)
+            con = self._writer or self._con
+            self._committer = _Committer(self, con, DURABILITIES[durability] if interval == None else interval, wait=durability == 'group')
+
     def _get_table_define(self, table):
         if table not in self._table_define:
             self._table_define[table] = self._get_table_define_from_db(table)
@@ -63,16 +253,24 @@ class SqliteTSDB(TSDBBase):
             # 存在表
             tags = {}
             fields = {}
+            time_unit = None
+            layout = 'time'
             for r in self._execute('SELECT * FROM sqlite_master WHERE type = "index" AND tbl_name = ?', table):
                 if not r[4]:
                     continue
                 tk = r[1]
                 k = tk.replace('%s_' % table, '', 1)
+                if k == TIME_FIELD:
+                    # series 表的时间索引
+                    continue
                 tags[k] = None
             for r in self._execute('PRAGMA table_info(`%s`)' % table):
                 k = r[1]
                 t = r[2]
                 if k == TIME_FIELD:
+                    time_unit = {v: u for u, v in TIME_TYPES.items()}.get(t.upper())
+                    if not r[5]:
+                        layout = 'series'
                     continue
                 if k in tags:
                     tags[k] = self._from_db_field_type(t)
@@ -80,7 +278,9 @@ class SqliteTSDB(TSDBBase):
                     fields[k] = self._from_db_field_type(t)
             return {
                 'tags': tags,
-                'fields': fields
+                'fields': fields,
+                'time_unit': time_unit,
+                'layout': layout,
             }
         else:
             # 创建表
@@ -95,15 +295,88 @@ class SqliteTSDB(TSDBBase):
         })
         return newdef
 
+    def _create_table(self, table, time_unit=None, columns=(), layout='time'):
+        sql = 'CREATE TABLE `%s` (`%s` %s%s NOT NULL%s);' % (table, TIME_FIELD, TIME_TYPES[time_unit], ' PRIMARY KEY' if layout == 'time' else '',
+                                                            ''.join([', `%s` %s' % c for c in columns]))
+        self._execute(sql)
+        if layout == 'series':
+            self._execute('CREATE INDEX `%s_%s` on `%s`(`%s`);' % (table, TIME_FIELD, table, TIME_FIELD))
+
+    def _create_tag_index(self, table, k):
+        # (tag, _time) 复合索引, 按设备查询时间范围时只扫描返回的行
+        self._execute('CREATE INDEX `%s_%s` on `%s`(`%s`, `%s`);' % (table, k, table, k, TIME_FIELD))
+
+    def _upgrade_tag_indexes(self, table, tags):
+        '''
+        replace single column tag indexes of older tables with (tag, _time) ones
+        '''
+        for k in tags:
+            name = '%s_%s' % (table, k)
+            if len(self._execute('PRAGMA index_info(`%s`)' % name).fetchall()) == 1:
+                self._execute('DROP INDEX `%s`;' % name)
+                self._create_tag_index(table, k)
+
+    def _rebuild_table(self, table, old, new, layout='time'):
+        '''
+        rewrite the table in place with _time stored as new unit, in the given layout
+        '''
+        columns = [(r[1], r[2]) for r in self._execute('PRAGMA table_info(`%s`)' % table) if r[1] != TIME_FIELD]
+        indexes = [r[1] for r in self._execute('SELECT name, sql FROM sqlite_master WHERE type = "index" AND tbl_name = ? AND sql IS NOT NULL', table)
+                   if r[0] != '%s_%s' % (table, TIME_FIELD)]
+        tmp = '%s__migrate' % table
+        names = ''.join([',`%s`' % c[0] for c in columns])
+        if self.con.in_transaction:
+            self.con.commit()
+        self._execute('BEGIN')
+        try:
+            self._execute('ALTER TABLE `%s` RENAME TO `%s`' % (table, tmp))
+            # 改名后的表仍占用 _time 索引的名字
+            self._execute('DROP INDEX IF EXISTS `%s_%s`' % (table, TIME_FIELD))
+            self._create_table(table, new, columns, layout)
+            self._execute('INSERT INTO `%s` (`%s`%s) SELECT %s%s FROM `%s`' % (table, TIME_FIELD, names, self._from_epoch_sql(self._get_epoch_sql(old), new), names, tmp))
+            self._execute('DROP TABLE `%s`' % tmp)
+            for sql in indexes:
+                self._execute(sql)
+        except:
+            self.con.rollback()
+            raise
+        self.con.commit()
+
+    def _point_columns(self, table):
+        # 读出的点包含表的所有列
+        part = self._get_partitioned(table)
+        td = part.options if part else self._get_table_define(table)
+        if td:
+            columns = dict(td.get('tags') or {})
+            columns.update(td.get('fields') or {})
+            return columns
+
+    def _list_tables(self):
+        return [r[0] for r in self._execute('SELECT name FROM sqlite_master WHERE type = "table"')]
+
     def register_table(self, table, options):
+        if options.get('partition'):
+            return self._register_partitioned(table, options)
         define = self._get_table_define(table)
         options.setdefault('tags', {})
         options.setdefault('fields', {})
+        time_unit = options.get('time_unit', define.get('time_unit') if define else None)
+        if time_unit not in TIME_TYPES:
+            raise TSDBException('Unknown time_unit: %s' % time_unit)
+        layout = options.get('layout', define.get('layout') if define else None) or 'time'
+        if layout not in LAYOUTS:
+            raise TSDBException('Unknown layout: %s' % layout)
         if not define:
             # 需创建表
-            sql = 'CREATE TABLE %s (`%s` DATETIME PRIMARY KEY NOT NULL);' % (table, TIME_FIELD)
-            self._execute(sql)
-            define = {'tags': {}, 'fields': {}}
+            self._create_table(table, time_unit, layout=layout)
+            define = {'tags': {}, 'fields': {}, 'time_unit': time_unit, 'layout': layout}
+        elif time_unit != define.get('time_unit') or layout != define.get('layout', 'time'):
+            # 迁移时间存储方式/表结构
+            self._rebuild_table(table, define.get('time_unit'), time_unit, layout)
+            define['time_unit'] = time_unit
+            define['layout'] = layout
+        if define['tags']:
+            self._upgrade_tag_indexes(table, define['tags'])
         # 无需创建
         rawdef = self._define_to_dict(define).copy()
         newdef = self._define_to_dict(options)
@@ -125,7 +398,7 @@ class SqliteTSDB(TSDBBase):
                     self._execute('DROP INDEX `%s_%s`;' % (table, k))
                 else:
                     # 创建索引
-                    self._execute('CREATE INDEX `%s_%s` on `%s`(`%s`);' % (table, k, table, k))
+                    self._create_tag_index(table, k)
         for k, d in rawdef.items():
             # 删除
             # 暂无法删除
@@ -138,77 +411,307 @@ class SqliteTSDB(TSDBBase):
         self._set_table_define(table, define)
         self.commit()
 
-    def _to_db_time(self, tm):
+    def _get_time_unit(self, table):
+        td = self._get_table_define(table)
+        return td.get('time_unit') if td else None
+
+    def _get_layout(self, table):
+        td = self._get_table_define(table)
+        return td.get('layout') or 'time' if td else 'time'
+
+    def _to_db_time(self, tm, unit=None):
         if isinstance(tm, datetime.datetime):
+            if unit == 'us':
+                return to_epoch_us(tm)
+            elif unit == 'ns':
+                return to_epoch_us(tm) * 1000
             tm = tm.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
         return tm
 
-    def _to_point_time(self, tm):
+    def _to_point_time(self, tm, unit=None):
+        if isinstance(tm, int_types):
+            if unit == 'ns':
+                tm //= 1000
+            return datetime.datetime.fromtimestamp(tm // 1000000).replace(microsecond=tm % 1000000)
         if not isinstance(tm, datetime.datetime):
             tm = datetime.datetime.strptime(tm, '%Y-%m-%dT%H:%M:%S.%fZ')
         return tm
 
-    def write_points(self, table, points):
+    def _get_time_value_sql(self, unit):
+        # strftime 等日期函数的时间参数
+        if unit == 'us':
+            return "`%s` / 1000000, 'unixepoch', 'localtime'" % TIME_FIELD
+        elif unit == 'ns':
+            return "`%s` / 1000000000, 'unixepoch', 'localtime'" % TIME_FIELD
+        return '`%s`' % TIME_FIELD
+
+    def _get_epoch_sql(self, unit=None):
+        # _time -> 微秒时间戳
+        if unit == 'us':
+            return '`%s`' % TIME_FIELD
+        elif unit == 'ns':
+            return '`%s` / 1000' % TIME_FIELD
+        return "CAST(strftime('%%s', substr(`%s`, 1, 19), 'utc') AS INTEGER) * 1000000 + CAST(substr(`%s`, 21, 6) AS INTEGER)" % (TIME_FIELD, TIME_FIELD)
+
+    def _from_epoch_sql(self, epoch, unit=None):
+        # 微秒时间戳 -> _time
+        if unit == 'us':
+            return epoch
+        elif unit == 'ns':
+            return '(%s) * 1000' % epoch
+        return "strftime('%%Y-%%m-%%dT%%H:%%M:%%S', (%s) / 1000000, 'unixepoch', 'localtime') || printf('.%%06dZ', (%s) %% 1000000)" % (epoch, epoch)
+
+    def _insert_rows(self, table, fields, rows, con=None):
+        sql = 'INSERT INTO `%s` (%s) VALUES (%s);' % (table, ','.join(['`%s`' % f for f in fields]), ','.join('?' * len(fields)))
+        self._executemany(sql, rows, con)
+
+    def write_points(self, table, points, batch_size=None):
+        '''
+        write points, grouped by their column set and inserted with executemany in one transaction
+        '''
+        part = self._get_partitioned(table)
+        if part:
+            return part.write(points)
+        points = self._before_write(table, points)
         td = self._get_table_define(table)
         tmd = self._define_to_dict(td)
-        for p in points:
-            if p.time == None:
-                p.time = datetime.datetime.now()
-            # pts.append(self._point_to_db_data(p, table))
-            vals = [(TIME_FIELD, self._to_db_time(p.time))]
-            for k, v in p.data.items():
-                if k not in tmd:
-                    continue
-                vals.append((k, v), )
-            self._execute('INSERT INTO `%s` (%s) VALUES (%s);' % (table,
-                                                                  ','.join(['`%s`' % r[0] for r in vals]),
-                                                                  ','.join('?' * len(vals))), *[r[1] for r in vals])
-        if points:
-            self.con.commit()
-        return len(points)
+        unit = td.get('time_unit')
+        batch_size = batch_size or self.batch_size
+        columns = {}  # 原始字段 -> 有效字段
+        batches = {}
+        count = 0
+        with self._lock, self._operation('write', table) as op, self._transaction() as con:
+            for p in points:
+                if p.time == None:
+                    p.time = datetime.datetime.now()
+                keys = tuple(p.data)
+                fields = columns.get(keys)
+                if fields == None:
+                    fields = columns[keys] = tuple(k for k in keys if k in tmd)
+                rows = batches.get(fields)
+                if rows == None:
+                    rows = batches[fields] = []
+                rows.append([self._to_db_time(p.time, unit)] + [p.data[k] for k in fields])
+                if len(rows) >= batch_size:
+                    self._insert_rows(table, (TIME_FIELD,) + fields, rows, con)
+                    batches[fields] = []
+                count += 1
+            for fields, rows in batches.items():
+                if rows:
+                    self._insert_rows(table, (TIME_FIELD,) + fields, rows, con)
+            for r in self._get_rollups(table):
+                # 与原始数据在同一事务中提交
+                partials = r.fold(points)
+                if partials:
+                    self._merge_rollup(r, partials, con)
+            op.rows_in = count
+        self._after_write(table, points, rollups=False)
+        return count
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        '''
+        the connection to write with, committed (or handed to the committer) at the end and rolled back on errors
+        '''
+        with self._lock:
+            committer = self._committer
+            con = committer.con if committer else self.con
+            if committer:
+                committer.begin()
+            try:
+                yield con
+            except:
+                if committer:
+                    committer.rollback()
+                else:
+                    con.rollback()
+                raise
+            if committer:
+                committer.written()
+            elif con.in_transaction:
+                con.commit()
+
+    def _merge_rollup(self, rollup, partials, con=None):
+        '''
+        merge partials into the rows of the rollup table, one update (or insert) per bucket and tag values,
+        in the transaction of con when given
+        '''
+        if con == None:
+            with self._transaction() as con:
+                return self._merge_rollup(rollup, partials, con)
+        unit = self._get_time_unit(rollup.name)
+        tags = sorted(rollup.tags)
+        columns = rollup.columns()
+        where = ' AND '.join(['`%s` = ?' % TIME_FIELD] + ['`%s` IS ?' % t for t in tags])
+        select = 'SELECT rowid,%s FROM `%s` WHERE %s' % (','.join(['`%s`' % c for c in columns]), rollup.name, where)
+        update = 'UPDATE `%s` SET %s WHERE rowid = ?' % (rollup.name, ','.join(['`%s` = ?' % c for c in columns]))
+        insert = 'INSERT INTO `%s` (%s) VALUES (%s)' % (rollup.name, ','.join(['`%s`' % c for c in [TIME_FIELD] + tags + columns]),
+                                                       ','.join('?' * (1 + len(tags) + len(columns))))
+        self._trace('%s (%d buckets)' % (select, len(partials)))
+        for key, partial in partials.items():
+            args = [self._to_db_time(key[0], unit)] + list(key[1:])
+            row = con.execute(select, args).fetchone()
+            if row == None:
+                con.execute(insert, args + [partial.get(c) for c in columns])
+            else:
+                merged = merge_partial(dict(zip(columns, row[1:])), partial)
+                con.execute(update, [merged.get(c) for c in columns] + [row[0]])
 
     def _get_where_sql_with_query(self, query):
-        where = {}
+        where = []
         options = query.options
+        unit = self._get_time_unit(query.table)
         if options.get('filter'):
             for k, v in options.get('filter').items():
-                where[k] = ('=', v)
+                where.append((k, 'IS' if v == None else '=', v))
         if options.get('time_start'):
-            where[TIME_FIELD] = ('>=', self._to_db_time(options['time_start']))
+            where.append((TIME_FIELD, '>=', self._to_db_time(options['time_start'], unit)))
+        if options.get('time_after'):
+            where.append((TIME_FIELD, '>', self._to_db_time(options['time_after'], unit)))
+        if options.get('time_before'):
+            where.append((TIME_FIELD, '<', self._to_db_time(options['time_before'], unit)))
         if options.get('time_end'):
-            where[TIME_FIELD] = ('<=', self._to_db_time(options['time_end']))
+            where.append((TIME_FIELD, '<=', self._to_db_time(options['time_end'], unit)))
         if where:
-            import six
-            wql = ' AND '.join(['"%s" %s %s' % (k, v[0], "'%s'" % v[1] if isinstance(v[1], six.string_types) else v[1]) for k, v in where.items()])
-            return wql
+            # tag 的等值条件在前, _time 范围在后, 对应 (tag, _time) 索引
+            return ' AND '.join(['`%s` %s %s' % (k, o, self._to_sql_literal(v)) for k, o, v in where])
+
+    def _to_sql_literal(self, v):
+        import six
+        if isinstance(v, six.string_types):
+            return "'%s'" % v.replace("'", "''")
+        elif v == None:
+            return 'NULL'
+        return v
+
+    def _get_time_group_sql(self, group, unit=None):
+        tgf = TIME_GROUP_FORMATS.get(group)
+        if not tgf:
+            raise TSDBException('Unknown time_group: %s' % group)
+        return "strftime('%s', %s)" % (tgf, self._get_time_value_sql(unit))
+
+    def _get_aggregate_sql(self, ag):
+        if isinstance(ag, Sum):
+            return 'SUM(`%s`)' % ag.field
+        elif isinstance(ag, Count):
+            return 'COUNT(`%s`)' % ag.field
+        elif isinstance(ag, Max):
+            return 'MAX(`%s`)' % ag.field
+        elif isinstance(ag, Min):
+            return 'MIN(`%s`)' % ag.field
+        elif isinstance(ag, Mean):
+            return 'AVG(`%s`)' % ag.field
+        elif isinstance(ag, First):
+            return 'MIN(`__first_%s`)' % ag.field
+        elif isinstance(ag, Last):
+            return 'MIN(`__last_%s`)' % ag.field
+        raise TSDBException('Unknown Aggregate: %s' % ag)
+
+    def _create_aggregate_sql_with_query(self, query, reverse=False):
+        options = query.options
+        tg = options.get('time_group')
+        values = options['values']
+        if tg:
+            tm = self._get_time_group_sql(tg, self._get_time_unit(query.table))
+            partition = 'PARTITION BY %s ' % tm
+        else:
+            tm = 'MIN(`%s`)' % TIME_FIELD
+            partition = ''
+        q = 'SELECT %s AS `%s`,%s FROM ' % (tm, TIME_FIELD, ','.join(['%s AS `%s`' % (self._get_aggregate_sql(v), k) for k, v in values.items()]))
+        # first/last 借助窗口函数在分组内取值
+        windows = []
+        for v in values.values():
+            if isinstance(v, First):
+                windows.append('FIRST_VALUE(`%s`) OVER (%sORDER BY `%s`) AS `__first_%s`' % (v.field, partition, TIME_FIELD, v.field))
+            elif isinstance(v, Last):
+                windows.append('LAST_VALUE(`%s`) OVER (%sORDER BY `%s` ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS `__last_%s`' % (v.field, partition, TIME_FIELD, v.field))
+        if windows:
+            q += '(SELECT *,%s FROM %s' % (','.join(windows), query.table)
+        else:
+            q += query.table
+        w = self._get_where_sql_with_query(query)
+        if w:
+            q += ' WHERE %s' % w
+        if windows:
+            q += ')'
+        if tg:
+            q += ' GROUP BY 1'
+            q += self._get_order_sql_with_query(query, reverse=reverse)
+        return q
 
-    def _create_sql_with_query(self, query, fields=None):
+    def _get_order_sql_with_query(self, query, reverse=False, rowid=False):
+        orders = get_order_by(query, TIME_FIELD, reverse=reverse)
+        if rowid:
+            # 同一时间的点按写入顺序
+            orders.append(('rowid', orders[-1][1]))
+        return ' ORDER BY %s' % ','.join(['`%s`%s' % (f, ' DESC' if desc else '') for f, desc in orders])
+
+    def _create_sql_with_query(self, query, fields=None, ordered=True, reverse=False):
+        if query.options.get('values'):
+            q = self._create_aggregate_sql_with_query(query, reverse=reverse)
+            if fields and fields != '*':
+                q = 'SELECT %s FROM (%s)' % (fields, q)
+            return q
         if not fields or fields == '*':
             fields = ','.join(['`%s`' % f for f in self._get_table_fields(query.table)])
         q = 'SELECT %s FROM %s' % (fields, query.table)
         w = self._get_where_sql_with_query(query)
         if w:
             q += ' WHERE %s' % w
+        if ordered:
+            # 批量写入不保证插入顺序, 默认按时间排序
+            q += self._get_order_sql_with_query(query, reverse=reverse, rowid=self._get_layout(query.table) == 'series')
         return q
 
-    def _db_data_to_point(self, data):
-        pt = TSDBPoint(time=self._to_point_time(data.get(TIME_FIELD)))
-        pt.data = {
-            k: v for k, v in data.items() if k != TIME_FIELD
-        }
-        return pt
+    def _db_data_to_point(self, data, unit=None):
+        return TSDBPoint(time=self._to_point_time(data.pop(TIME_FIELD, None), unit), data=data)
 
     def _fetch_with_queryset(self, query, resultset):
-        fields = self._get_table_fields(query.table)
+        unit = self._get_time_unit(query.table)
+        fields = [d[0] for d in resultset.description]
+        grouped = bool(query.options.get('values') and query.options.get('time_group'))
+        if query.options.get('row_view') and not grouped:
+            # 索引跳过时间列, 直接包装驱动返回的行
+            ti = fields.index(TIME_FIELD)
+            index = {f: i for i, f in enumerate(fields) if i != ti}
+            for r in resultset:
+                if r[ti] != None:
+                    yield TSDBPoint(time=self._to_point_time(r[ti], unit), data=RowView(index, r))
+            return
         for r in resultset:
             d = dict(zip(fields, r))
-            yield self._db_data_to_point(d)
+            if grouped:
+                d[TIME_FIELD] = try_parset_datetime_str(d[TIME_FIELD])
+            elif d[TIME_FIELD] == None:
+                # 空集合上的聚合
+                continue
+            yield self._db_data_to_point(d, unit)
 
     def fetch_with_query(self, query):
         return self._fetch_with_queryset(query, self._execute(self._create_sql_with_query(query)))
 
+    def columns_with_query(self, query, fields=None):
+        if query.options.get('values'):
+            return TSDBBase.columns_with_query(self, query, fields)
+        td = self._get_table_define(query.table)
+        types = dict(td.get('tags', {}), **td.get('fields', {}))
+        fields = list(fields or [f for f in self._get_table_fields(query.table) if f != TIME_FIELD])
+        q = self._create_sql_with_query(query, fields=','.join([self._get_epoch_sql(td.get('time_unit'))] + ['`%s`' % f for f in fields]))
+        cursor = self._execute(q)
+        cols = [[] for _ in range(len(fields) + 1)]
+        while True:
+            rows = cursor.fetchmany(query.options.get('chunk_size') or self.batch_size)
+            if not rows:
+                break
+            for c, vs in zip(cols, zip(*rows)):
+                c.extend(vs)
+        res = {'time': to_column(cols[0], 'int')}
+        for f, c in zip(fields, cols[1:]):
+            res[f] = to_column(c, types.get(f))
+        return res
+
     def count_with_query(self, query):
-        rs = self._execute(self._create_sql_with_query(query, fields='COUNT(`%s`)' % (TIME_FIELD))).fetchmany(1)
+        rs = self._execute(self._create_sql_with_query(query, fields='COUNT(`%s`)' % (TIME_FIELD), ordered=False)).fetchmany(1)
         count = rs[0][0]
         return count
 
@@ -217,7 +720,10 @@ class SqliteTSDB(TSDBBase):
         w = self._get_where_sql_with_query(query)
         if w:
             q += ' WHERE %s' % w
-        self._execute(q)
+        # 与写入一样在锁和事务中, 不混入其他写入的 savepoint
+        with self._lock, self._transaction() as con:
+            self._trace(q)
+            con.execute(q)
 
     def first_with_query(self, query):
         return self.getitem_with_query(query, 0)
@@ -226,22 +732,52 @@ class SqliteTSDB(TSDBBase):
         return self.getitem_with_query(query, -1)
 
     def getitem_with_query(self, query, item):
-        q = self._create_sql_with_query(query)
+        rg = seek_range(item)
+        if rg == None:
+            count = self.count_with_query(query)
+            rg = seek_range(slice(*item.indices(count)[:2]))
+        reverse, offset, limit = rg
+        q = self._create_sql_with_query(query, reverse=reverse)
+        q += ' LIMIT %d OFFSET %d' % (-1 if limit == None else limit, offset)
+        pts = self._fetch_with_queryset(query, self._execute(q))
         if type(item) == slice:
-            if item.start < 0:
-                count = self.count_with_query(query)
-                item = slice(max(0, item.start + count), count)
-            q += ' LIMIT %d OFFSET %d' % (item.stop - item.start, item.start)
-            return self._fetch_with_queryset(query, self._execute(q))
-        else:
-            if item < 0:
-                count = self.count_with_query(query)
-                item = max(0, item + count)
-            q += ' LIMIT %d OFFSET %d' % (1, item)
-            for pt in self._fetch_with_queryset(query, self._execute(q)):
-                return pt
+            return reversed(list(pts)) if reverse else pts
+        for pt in pts:
+            return pt
+
+    def pages_with_query(self, query, size):
+        orders = get_order_by(query, TIME_FIELD)
+        if self._get_layout(query.table) != 'series' or query.options.get('values') or [f for f, _ in orders] != [TIME_FIELD]:
+            return TSDBBase.pages_with_query(self, query, size)
+        return self._series_pages(query, size, orders[0][1])
+
+    def _series_pages(self, query, size, desc):
+        # 同一时间可能有多个点, 按 (_time, rowid) 翻页
+        fields = self._get_table_fields(query.table)
+        ti = fields.index(TIME_FIELD)
+        q = 'SELECT %s,rowid FROM %s' % (','.join(['`%s`' % f for f in fields]), query.table)
+        order = ' ORDER BY `%s`%s,rowid%s LIMIT %d' % (TIME_FIELD, ' DESC' if desc else '', ' DESC' if desc else '', size)
+        w = self._get_where_sql_with_query(query)
+        key = None
+        while True:
+            where = [w] if w else []
+            if key:
+                where.append('(`%s`,rowid) %s (%s,%d)' % (TIME_FIELD, '<' if desc else '>', self._to_sql_literal(key[0]), key[1]))
+            cursor = self._execute(q + (' WHERE %s' % ' AND '.join(where) if where else '') + order)
+            rows = cursor.fetchall()
+            if rows:
+                key = (rows[-1][ti], rows[-1][-1])
+                yield list(self._fetch_with_queryset(query, _Rows(cursor.description[:-1], [r[:-1] for r in rows])))
+            if len(rows) < size:
+                break
 
     def drop_table(self, table):
+        part = self._get_partitioned(table)
+        if part:
+            part.drop()
+            self._partitions.pop(table, None)
+            return
+        self._table_define.pop(table, None)
         try:
             self._execute('DROP TABLE `%s`' % table)
         except:
@@ -249,7 +785,26 @@ class SqliteTSDB(TSDBBase):
         self.commit()
 
     def close(self):
-        self.con.close()
+        self._close_buffers()
+        if self._committer:
+            c, self._committer = self._committer, None
+            c.close()
+        if self._factory == None:
+            self._con.close()
+        else:
+            with self._lock:
+                for con in self._cons:
+                    con.close()
+                self._cons = []
+                self._writer = None
+            self._local = threading.local()
+
+    def flush(self):
+        TSDBBase.flush(self)
+        if self._committer:
+            self._committer.sync()
 
     def commit(self):
+        if self._committer:
+            self._committer.sync()
         self.con.commit()
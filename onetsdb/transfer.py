@@ -0,0 +1,243 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Streaming copy of tables between backends. Points are read in time-ordered pages by a reader
+thread and written by the caller's thread, at most queue_size pages are in memory at once.
+The copy resumes from the last time already in the destination:
+
+    from onetsdb.transfer import copy_table
+    copy_table('sqlite3://localhost/tmp/tsdb.sqlite3', 'influxdb://localhost/tsdb', 'device',
+               options={'tags': {'devid': 'string'}, 'fields': {'temp': 'float'}})
+
+    python -m onetsdb.transfer sqlite3://localhost/tmp/tsdb.sqlite3 influxdb://localhost/tsdb device \
+        --define '{"tags": {"devid": "string"}, "fields": {"temp": "float"}}'
+'''
+from __future__ import print_function
+
+import copy
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .base import TSDBException, connect, try_parset_datetime_str
+
+timer = getattr(time, 'perf_counter', time.time)
+
+_END = object()
+
+
+def _open(tsdb):
+    # uri 则新建连接
+    if hasattr(tsdb, 'query'):
+        return tsdb, False
+    return connect(tsdb), True
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _read(query, size, q, stop):
+    # 读取线程: 按页放入队列, 队列满时等待写入
+    try:
+        for page in query.pages(size):
+            if not _put(q, page, stop):
+                return
+        _put(q, _END, stop)
+    except Exception as e:
+        _put(q, e, stop)
+
+
+def resume_time(dst, table, start=None, end=None, filter=None):
+    '''
+    the last time of table in dst within start..end, None when there is none
+    '''
+    q = dst.query(table).time_range(start, end)
+    if filter:
+        q = q.filter(**filter)
+    p = q.last()
+    return p.time if p != None else None
+
+
+def _key(point):
+    # 比较点的数据, 空值与缺少的字段相同
+    return tuple(sorted((k, v) for k, v in point.data.items() if v != None))
+
+
+def copied_at(dst, table, tm, filter=None):
+    '''
+    {data key: count} of the points of table in dst at time tm
+    '''
+    q = dst.query(table).time_range(tm, tm)
+    if filter:
+        q = q.filter(**filter)
+    res = {}
+    for p in q:
+        k = _key(p)
+        res[k] = res.get(k, 0) + 1
+    return res
+
+
+def copy_table(src, dst, table, dst_table=None, options=None, start=None, end=None, filter=None,
+               chunk_size=10000, queue_size=4, resume=True, progress=None):
+    '''
+    Copy the points of table in src (a tsdb or a connect() uri) to dst_table (default table) in dst.
+    options is the table define, registered in both when given. With resume, the copy starts at the
+    last time already in dst, so an interrupted copy can be run again: the points at that time already
+    in dst are skipped, the others (other series of the same time) copied. progress(stats) is called
+    after each written page. Returns the stats: points, pages, skipped, first_time, last_time,
+    resumed_from, seconds.
+    '''
+    dst_table = dst_table or table
+    src, own_src = _open(src)
+    dst, own_dst = _open(dst)
+    try:
+        if options != None:
+            # register_table 会修改 options
+            src.register_table(table, copy.deepcopy(options))
+            dst.register_table(dst_table, copy.deepcopy(options))
+        query = src.query(table).time_range(start, end)
+        if filter:
+            query = query.filter(**filter)
+        stats = {
+            'table': table,
+            'dst_table': dst_table,
+            'points': 0,
+            'pages': 0,
+            'skipped': 0,
+            'first_time': None,
+            'last_time': None,
+            'resumed_from': resume_time(dst, dst_table, start, end, filter) if resume else None,
+            'seconds': 0.0,
+        }
+        seen = None
+        if stats['resumed_from'] != None:
+            # 再次读取最后的时间, 跳过其中已复制的点
+            query = query.time_range(max(stats['resumed_from'], start) if start != None else stats['resumed_from'], end)
+            seen = copied_at(dst, dst_table, stats['resumed_from'], filter)
+        begin = timer()
+        q = queue.Queue(max(queue_size, 1))
+        stop = threading.Event()
+        reader = threading.Thread(target=_read, args=(query, chunk_size, q, stop), name='onetsdb-transfer-reader')
+        reader.daemon = True
+        reader.start()
+        try:
+            while True:
+                page = q.get()
+                if page is _END:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                if seen != None:
+                    page, seen = _skip_copied(page, seen, stats)
+                    if not page:
+                        continue
+                dst.write_points(dst_table, page)
+                stats['points'] += len(page)
+                stats['pages'] += 1
+                if stats['first_time'] == None:
+                    stats['first_time'] = page[0].time
+                stats['last_time'] = page[-1].time
+                stats['seconds'] = timer() - begin
+                if progress:
+                    progress(dict(stats))
+            dst.flush()
+        finally:
+            stop.set()
+            reader.join()
+        stats['seconds'] = timer() - begin
+        return stats
+    finally:
+        if own_src:
+            src.close()
+        if own_dst:
+            dst.close()
+
+
+def _skip_copied(page, seen, stats):
+    # 续传时间的点中已在目标表的, 之后的页不再检查
+    res = []
+    for p in page:
+        k = _key(p)
+        if seen and seen.get(k):
+            seen[k] -= 1
+            stats['skipped'] += 1
+        else:
+            res.append(p)
+    return res, seen if page[-1].time == stats['resumed_from'] else None
+
+
+def _parse_time(s):
+    if s == None:
+        return None
+    tm = try_parset_datetime_str(s)
+    if tm == None:
+        raise TSDBException('Unknown time: %s' % s)
+    return tm
+
+
+def _load_define(s):
+    import json
+    if s == None:
+        return None
+    if s.startswith('@'):
+        with open(s[1:]) as f:
+            return json.load(f)
+    return json.loads(s)
+
+
+def main(argv=None):
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(prog='python -m onetsdb.transfer', description='stream tables from one connect() uri to another')
+    parser.add_argument('src', help='source uri')
+    parser.add_argument('dst', help='destination uri')
+    parser.add_argument('tables', nargs='+')
+    parser.add_argument('--to', help='destination table, default the source table (one table only)')
+    parser.add_argument('--define', help='table define as JSON (or @file.json), {"tags": ..., "fields": ...} or {table: define}')
+    parser.add_argument('--start', help='copy points from this time')
+    parser.add_argument('--end', help='copy points until this time')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='points per page')
+    parser.add_argument('--queue-size', type=int, default=4, help='pages read ahead of the writes')
+    parser.add_argument('--no-resume', action='store_true', help='copy everything, not only after the last time in the destination')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+    if args.to and len(args.tables) > 1:
+        parser.error('--to needs a single table')
+    define = _load_define(args.define)
+    start, end = _parse_time(args.start), _parse_time(args.end)
+
+    def progress(stats):
+        if not args.quiet:
+            print('%s: %d points, last %s, %.1f points/s' % (stats['table'], stats['points'], stats['last_time'],
+                                                             stats['points'] / stats['seconds'] if stats['seconds'] else 0), file=sys.stderr)
+
+    src, dst = connect(args.src), connect(args.dst)
+    try:
+        for table in args.tables:
+            options = define
+            if define != None and 'tags' not in define and 'fields' not in define:
+                options = define.get(table)
+            stats = copy_table(src, dst, table, dst_table=args.to, options=options, start=start, end=end,
+                               chunk_size=args.chunk_size, queue_size=args.queue_size, resume=not args.no_resume, progress=progress)
+            print(json.dumps(stats, default=str, sort_keys=True))
+    finally:
+        src.close()
+        dst.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,7 +4,7 @@ Created on 2019-10-22
 '''
 from __future__ import print_function
 import datetime, time
-from .base import TSDBPoint, TSDBBase
+from .base import TSDBException, TSDBPoint, TSDBBase, seek_range, get_order_by, to_column
 
 TIME_FIELD = 'time'
 TIME_ALTZONE = time.altzone
@@ -14,6 +14,7 @@ class TsliteTSDB(TSDBBase):
     '''
     Wrapper for tslite
     '''
+    _thread_safe = False
 
     def __init__(self, db=None):
         self.db = db
@@ -34,6 +35,10 @@ class TsliteTSDB(TSDBBase):
             'fields': fields
         })
 
+    def register_rollup(self, table, group, values, tags=None):
+        # rollup 需要删除并重写桶, tslite 不支持删除
+        raise TSDBException('tslite does not support rollups')
+
     def _to_db_time(self, tm):
         if isinstance(tm, datetime.datetime):
             tm = time.mktime(tm.timetuple()) + tm.microsecond / 1000000.0
@@ -53,35 +58,77 @@ class TsliteTSDB(TSDBBase):
 
     def _db_data_to_point(self, data):
         if data != None:
-            pdata = {}
-            for k, v in data.items():
-                if k == TIME_FIELD:
-                    continue
-                pdata[k] = v
-            pt = TSDBPoint(time=self._to_point_time(data.get(TIME_FIELD)), data=pdata)
-            return pt
+            tm = data.pop(TIME_FIELD, None)
+            return TSDBPoint(time=self._to_point_time(tm), data=data)
 
     def write_points(self, table, points):
+        points = self._before_write(table, points)
         pts = []
-        for p in points:
-            if p.time == None:
-                p.time = datetime.datetime.now()
-            pts.append(self._point_to_db_data(p))
-        if pts:
-            self.db.get_table(table).write_datas(pts)
+        with self._operation('write', table) as op:
+            for p in points:
+                if p.time == None:
+                    p.time = datetime.datetime.now()
+                pts.append(self._point_to_db_data(p))
+            if pts:
+                self.db.get_table(table).write_datas(pts)
+            op.rows_in = len(pts)
+        self._after_write(table, points)
         return len(pts)
 
     def _get_cursor_with_query(self, query):
         tab = self.db.get_table(query.table)
-        return tab.query(start=self._to_db_time(query.options['time_start']) if query.options.get('time_start') else None,
-                         end=self._to_db_time(query.options['time_end']) if query.options.get('time_end') else None,
-                         eqs=query.options.get('filter'))
+        start = self._to_db_time(query.options['time_start']) if query.options.get('time_start') else None
+        end = self._to_db_time(query.options['time_end']) if query.options.get('time_end') else None
+        eqs = query.options.get('filter')
+        if query.options.get('time_after') or query.options.get('time_before'):
+            # tslite 的 start/end 只能精确匹配边界, time_after/time_before 通过过滤实现
+            from tslite import Cursor
+            after = self._to_db_time(query.options['time_after']) + 0.0000005 if query.options.get('time_after') else None
+            before = self._to_db_time(query.options['time_before']) - 0.0000005 if query.options.get('time_before') else None
+
+            def ft(d):
+                if after != None and d[TIME_FIELD] <= after:
+                    return False
+                if before != None and d[TIME_FIELD] >= before:
+                    return False
+                for k, v in (eqs or {}).items():
+                    if d[k] != v:
+                        return False
+                return True
+
+            return Cursor(table=tab, start=start, end=end, filter_func=ft)
+        return tab.query(start=start, end=end, eqs=eqs)
+
+    def _is_descending(self, query):
+        orders = get_order_by(query, TIME_FIELD)
+        if len(orders) != 1 or orders[0][0] != TIME_FIELD:
+            raise TSDBException('tslite only supports order by time')
+        return orders[0][1]
 
     def fetch_with_query(self, query):
         cursor = self._get_cursor_with_query(query)
-        for r in cursor:
+        for r in cursor.get_iter(reverse=self._is_descending(query)):
             yield self._db_data_to_point(r)
 
+    def columns_with_query(self, query, fields=None):
+        cursor = self._get_cursor_with_query(query)
+        times = []
+        cols = {f: [] for f in fields} if fields else {}
+        n = 0
+        for d in cursor.get_iter(reverse=self._is_descending(query)):
+            times.append(int(round(d[TIME_FIELD] * 1000000)))
+            if not fields:
+                for k in d:
+                    if k not in cols and k != TIME_FIELD:
+                        cols[k] = [None] * n
+            for k, c in cols.items():
+                c.append(d.get(k))
+            n += 1
+        res = {'time': to_column(times, 'int')}
+        for k, c in cols.items():
+            res[k] = to_column(c)
+        return res
+
     def count_with_query(self, query):
         return self._get_cursor_with_query(query).count()
 
@@ -89,27 +136,33 @@ class TsliteTSDB(TSDBBase):
         raise NotImplemented
 
     def first_with_query(self, query):
-        return self._db_data_to_point(self._get_cursor_with_query(query).first())
+        cursor = self._get_cursor_with_query(query)
+        return self._db_data_to_point(cursor.last() if self._is_descending(query) else cursor.first())
 
     def last_with_query(self, query):
-        return self._db_data_to_point(self._get_cursor_with_query(query).last())
+        cursor = self._get_cursor_with_query(query)
+        return self._db_data_to_point(cursor.first() if self._is_descending(query) else cursor.last())
 
     def getitem_with_query(self, query, item):
         cursor = self._get_cursor_with_query(query)
+        desc = self._is_descending(query)
         if type(item) == slice:
-            def f():
-                if type(item) == slice:
-                    for d in cursor[item]:
-                        yield self._db_data_to_point(d)
-
-            return f()
+            import itertools
+            rg = seek_range(item)
+            if rg == None:
+                rg = seek_range(slice(*item.indices(cursor.count())[:2]))
+            reverse, offset, limit = rg
+            it = itertools.islice(cursor.get_iter(reverse=reverse != desc), offset, None if limit == None else offset + limit)
+            pts = [self._db_data_to_point(d) for d in it]
+            return reversed(pts) if reverse else iter(pts)
         else:
-            return self._db_data_to_point(cursor[item])
+            return self._db_data_to_point(cursor[-item - 1 if desc else item])
 
     def drop_table(self, table):
         self.db.drop_table(table)
 
     def close(self):
+        self._close_buffers()
         self.db.close()
 
     def commit(self):
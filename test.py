@@ -9,31 +9,11 @@ import datetime
 
 
 def do_test(con, table='test', count=100):
-    import random, time
+    import random
 
     tsdb = connect(con)
 
-    class SpeedIt(object):
-        _start = 0
-
-        def start(self):
-            self._last = self._start = time.time()
-            self._counter = 0
-
-        def feed(self):
-            self._counter += 1
-            if (time.time() - self._last) > 10:
-                self.display()
-
-        def display(self):
-            off = time.time() - self._start
-            print('time cost', off, 'count', self._counter, 'speed', self._counter / off, '/ s')
-            self._last = time.time()
-
-        def stop(self):
-            self.display()
-
-    print('test table=%s with uri=%s' % (table, uri))
+    print('test table=%s with uri=%s' % (table, con))
 
     tsdb.drop_table(table)
     # tsdb.register_table(table, {
@@ -61,9 +41,7 @@ def do_test(con, table='test', count=100):
     tmgap = 5
     st = datetime.datetime(year=2019, month=1, day=1, hour=0, minute=0, second=0)
     # tsdb.query(table).delete()
-    sp = SpeedIt()
     print('insert...')
-    sp.start()
     for i in range(0, count):
         tm = st + datetime.timedelta(seconds=i * tmgap)
         data = {
@@ -73,11 +51,9 @@ def do_test(con, table='test', count=100):
             'group': i,
             'x': i,
         }
-        sp.feed()
         pt = TSDBPoint(time=tm, data=data)
         tsdb.write_point(table, pt)
         # break
-    sp.display()
     print('query...')
     query = tsdb.query(table).filter().time_group('year').values(
         count=Count('x'),
@@ -105,6 +81,11 @@ def do_test(con, table='test', count=100):
     assert tsdb.query(table).filter(x=7).first().data['x'] == 7
     assert tsdb.query(table).filter(name='a').first().data['name'] == 'a'
     assert len(list(tsdb.query(table)[0:3])) == 3
+    assert [p.data['x'] for p in tsdb.query(table)[-3:]] == [count - 3, count - 2, count - 1]
+    assert sum(len(pg) for pg in tsdb.query(table).pages(7)) == count
+    assert tsdb.query(table).order_by('-_time').first().data['x'] == count - 1
+    assert [p.data['x'] for p in tsdb.query(table).order_by('-_time')[0:2]] == [count - 1, count - 2]
+    assert sum(len(pg) for pg in tsdb.query(table).order_by('-_time').pages(7)) == count
 
     assert tsdb.query(table).filter().time_range(st, st + datetime.timedelta(seconds=5 * tmgap)).count() == 6
     assert tsdb.query(table).filter().time_range(st, st).first().time == st
@@ -119,7 +100,6 @@ def do_test(con, table='test', count=100):
 
     tsdb.drop_table(table)
     tsdb.close()
-    sp.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,73 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+import asyncio
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from onetsdb.aio import AsyncTSDB
+from onetsdb.base import Sum, Last
+from tests.util import START, define, make_points, copy_points, rows, sqlite, mongo, mongomock
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class AsyncTest(unittest.TestCase):
+    def check(self, tsdb, ref):
+        '''
+        the async facade of tsdb answers like the plain ref
+        '''
+        pts = make_points(1000, step=10)
+        atsdb = AsyncTSDB(tsdb, max_workers=3)
+
+        async def main():
+            await atsdb.register_table('t', define(layout='series'))
+            for i in range(0, 1000, 100):
+                await atsdb.write_points('t', copy_points(pts[i:i + 100]))
+            await atsdb.flush()
+            ref.write_points('t', copy_points(pts))
+            a, b = START + datetime.timedelta(seconds=500), START + datetime.timedelta(seconds=2500)
+            for dev in ('d0', 'd2'):
+                q, r = atsdb.query('t', dev=dev).time_range(a, b), ref.query('t', dev=dev).time_range(a, b)
+                self.assertEqual(rows([p async for p in q]), rows(r))
+                self.assertEqual(rows([p async for p in q.chunk(7).order_by('-time')]), rows(r.order_by('-time')))
+                self.assertEqual(rows(await q.all()), rows(r))
+                count, first, last, item, items = await asyncio.gather(q.count(), q.first(), q.last(), q[3], q[-5:])
+                self.assertEqual(count, r.count())
+                self.assertEqual(rows([first, last, item]), rows([r.first(), r.last(), r[3]]))
+                self.assertEqual(rows(items), rows(r[-5:]))
+                g = q.time_group('hour').values(s=Sum('v'), l=Last('f'))
+                self.assertEqual(rows([p async for p in g]), rows(r.time_group('hour').values(s=Sum('v'), l=Last('f'))))
+                self.assertEqual(list((await q.columns('v'))['v']), list(r.columns('v')['v']))
+            await atsdb.query('t', dev='d1').time_range(a, b).delete()
+            ref.query('t', dev='d1').time_range(a, b).delete()
+            self.assertEqual(rows([p async for p in atsdb.query('t')]), rows(ref.query('t')))
+            await atsdb.close()
+
+        run(main())
+
+    def test_sqlite(self):
+        path = tempfile.mkdtemp()
+        try:
+            self.check(sqlite(uri='sqlite3://localhost%s' % os.path.join(path, 'tsdb.sqlite3')), sqlite('t'))
+        finally:
+            shutil.rmtree(path)
+
+    @unittest.skipIf(mongomock == None, 'mongomock is not installed')
+    def test_mongo(self):
+        # mongodb 的 First/Last 按写入顺序, 与顺序写入的 mongodb 比较
+        self.check(mongo(), mongo('t', define()))
+
+
+if __name__ == '__main__':
+    unittest.main()
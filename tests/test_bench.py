@@ -0,0 +1,44 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import unittest
+
+from onetsdb import bench
+from tests.util import rows
+
+
+class BenchTest(unittest.TestCase):
+    def data(self, seed):
+        b = bench.Bench('sqlite3://:memory:', size=200, single=20, batch=50, repeat=2, cases=['scan'], seed=seed)
+        b.setup()
+        b.case_write_batch()
+        b.case_write_single()
+        res = rows(b.query())
+        b.teardown()
+        return res
+
+    def test_reproducible(self):
+        self.assertEqual(self.data(1), self.data(1))
+        self.assertNotEqual(self.data(1), self.data(2))
+
+    def test_run(self):
+        res = bench.Bench('sqlite3://:memory:', size=300, single=30, batch=100, repeat=3).run()
+        self.assertEqual(sorted(res['cases']), sorted(bench.CASES))
+        self.assertEqual(res['cases']['write_batch']['points'], 300)
+        self.assertEqual(res['cases']['write_single']['ops'], 30)
+        self.assertEqual(res['cases']['scan']['points'], 3 * 330)
+        slower = bench.compare({'results': [res]}, {'results': [res]})
+        self.assertEqual(slower, [])
+
+    def test_empty(self):
+        res = bench.Bench('sqlite3://:memory:', size=0, repeat=2).run()
+        self.assertEqual(res['cases']['write_batch']['ops'], 0)
+        self.assertEqual(res['cases']['write_batch']['latency_ms'], None)
+        self.assertEqual(res['cases']['scan']['points'], 0)
+        self.assertEqual(bench.summarize([], 0)['ops_per_sec'], None)
+
+
+if __name__ == '__main__':
+    unittest.main()
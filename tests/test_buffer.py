@@ -0,0 +1,95 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import time
+import unittest
+
+from onetsdb.buffer import WriteBufferError
+from onetsdb import TSDBPoint
+from tests.util import make_points, copy_points, rows, sorted_rows, sqlite
+
+
+class WriteBufferTest(unittest.TestCase):
+    def test_same_as_direct(self):
+        pts = make_points(500)
+        ref = sqlite('t', points=pts)
+        tsdb = sqlite('t')
+        tsdb.set_write_buffer(size=64, age=0.05)
+        for p in copy_points(pts):
+            tsdb.write_point('t', p)
+        tsdb.flush()
+        self.assertEqual(sorted_rows(tsdb.query('t')), sorted_rows(ref.query('t')))
+        tsdb.close()
+
+    def test_failed_batches(self):
+        pts = make_points(40)
+        tsdb = sqlite('t')
+        tsdb.set_write_buffer(size=1000, age=60)
+        write_points = tsdb.write_points
+        calls = []
+
+        def failing(table, points):
+            calls.append(len(points))
+            if len(calls) <= 2:
+                raise IOError('down %d' % len(calls))
+            return write_points(table, points)
+
+        tsdb.write_points = failing
+        # 两次后台写入失败
+        wb = tsdb._write_buffer
+        wb._write({'t': copy_points(pts[:10])})
+        wb._write({'t': copy_points(pts[10:20])})
+        with self.assertRaises(WriteBufferError) as ctx:
+            tsdb.flush()
+        failed = ctx.exception.failed
+        # 每个失败的批次及其错误都交还
+        self.assertEqual([str(e) for _, _, e in failed], ['down 1', 'down 2'])
+        self.assertEqual(sum(len(p) for _, p, _ in failed), 20)
+        tsdb.flush()
+        for table, points, _ in failed:
+            tsdb.write_points(table, points)
+        for p in copy_points(pts[20:]):
+            tsdb.write_point('t', p)
+        tsdb.flush()
+        self.assertEqual(sorted_rows(tsdb.query('t')), sorted_rows(pts))
+
+    def test_error_on_next_write(self):
+        tsdb = sqlite('t')
+        tsdb.set_write_buffer(size=1000, age=60)
+
+        def failing(table, points):
+            raise IOError('down')
+
+        tsdb.write_points = failing
+        tsdb.write_point('t', make_points(1)[0])
+        self.assertRaises(WriteBufferError, tsdb.flush)
+        tsdb.write_point('t', make_points(1)[0])
+        wb = tsdb._write_buffer
+        with wb._cond:
+            batch = wb._take()
+        wb._write(batch)
+        self.assertRaises(WriteBufferError, tsdb.write_point, 't', make_points(1)[0])
+        tsdb.flush()
+
+    def test_time_of_the_call(self):
+        # 没有时间的点在加入缓冲时取当前时间
+        tsdb = sqlite('t')
+        tsdb.set_write_buffer(size=1000, age=60)
+        times = []
+        for i in range(3):
+            before = datetime.datetime.now()
+            tsdb.write_point('t', TSDBPoint(time=None, data={'dev': 'd0', 'v': i, 'f': None}))
+            times.append((before, datetime.datetime.now()))
+            time.sleep(0.05)
+        tsdb.flush()
+        stored = rows(tsdb.query('t'))
+        self.assertEqual([d['v'] for _, d in stored], [0, 1, 2])
+        for (tm, _), (before, after) in zip(stored, times):
+            self.assertTrue(before <= tm <= after, (before, tm, after))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import random
+import unittest
+
+from onetsdb.base import Sum, Last
+from tests.util import START, make_points, copy_points, rows, sqlite
+
+
+class QueryCacheTest(unittest.TestCase):
+    def test_same_as_uncached(self):
+        rnd = random.Random(0)
+        pts = make_points(2000, step=10)
+        tsdb, ref = sqlite('t'), sqlite('t')
+        tsdb.set_query_cache(size=50)
+        for i in range(0, 2000, 200):
+            for db in (tsdb, ref):
+                db.write_points('t', copy_points(pts[i:i + 200]))
+            for _ in range(30):
+                a = START + datetime.timedelta(seconds=rnd.randint(0, 7000))
+                b = a + datetime.timedelta(seconds=rnd.randint(0, 3000))
+                dev = rnd.choice(['d0', 'd1'])
+                q, r = [db.query('t', dev=dev).time_range(a, b) for db in (tsdb, ref)]
+                for _ in range(2):
+                    self.assertEqual(rows(q), rows(r))
+                    self.assertEqual(q.count(), r.count())
+                    self.assertEqual(rows(q[-3:]), rows(r[-3:]))
+                    self.assertEqual(rows(q.time_group('hour').values(s=Sum('v'), l=Last('f'))),
+                                     rows(r.time_group('hour').values(s=Sum('v'), l=Last('f'))))
+            q = tsdb.query('t').time_range(START, None)
+            self.assertEqual(q.count(), ref.query('t').count())
+        self.assertTrue(tsdb.cache_stats()['hits'] > 0)
+
+    def test_results_are_copies(self):
+        tsdb = sqlite('t', points=make_points(30))
+        tsdb.set_query_cache(size=50)
+        q = tsdb.query('t', dev='d1')
+        expected = rows(q)
+        for _ in range(2):
+            p = q.first()
+            p.data['v'] = 999
+            p.time = None
+            for p in q:
+                p.data['v'] = 999
+            pts = list(q[0:3])
+            pts[0].data['v'] = 999
+            pts.append(None)
+            cols = q.columns('v')
+            cols['v'][0] = 999
+            cols['x'] = []
+        self.assertEqual(rows([q.first()]), expected[:1])
+        self.assertEqual(rows(q), expected)
+        self.assertEqual(rows(q[0:3]), expected[:3])
+        self.assertEqual(list(q.columns('v')['v']), [r[1]['v'] for r in expected])
+        self.assertEqual(sorted(q.columns('v')), ['time', 'v'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import random
+import shutil
+import tempfile
+import unittest
+
+from onetsdb import connect, TSDBPoint
+from onetsdb.base import Sum, Mean, Max, Min, Count, First, Last
+from onetsdb.codec import encode_column, decode_column
+from tests.util import START, define, make_points, copy_points, rows, sqlite
+
+EXTREMES = [
+    [2 ** 62 - 1, -(2 ** 62 - 1), 2 ** 62 - 1],
+    [2 ** 61 - 1, -(2 ** 61 - 1)] * 3,
+    [-(2 ** 63), 2 ** 64, None, 0],
+    [1, 2.5, None, 3],
+    [1.5, None, 2],
+    [True, False, None, 1],
+    [float('inf'), 1.5, -0.0],
+    ['a', None, 'b'],
+    [None, None],
+]
+
+
+def roundtrip(values):
+    encoding, nulls, data = encode_column(values)
+    present = len([v for v in values if v != None])
+    return encoding, decode_column(encoding, nulls, data, len(values), present)
+
+
+def typed(values):
+    return [(type(v), v) for v in values]
+
+
+class CodecTest(unittest.TestCase):
+    def test_extremes(self):
+        for values in EXTREMES:
+            encoding, res = roundtrip(values)
+            self.assertEqual(typed(res), typed(values), (encoding, values))
+
+    def test_random(self):
+        rnd = random.Random(0)
+        for _ in range(300):
+            bits = rnd.choice([3, 20, 40, 61, 62, 63, 70])
+            kind = rnd.choice(['int', 'float', 'mixed'])
+            values = []
+            for _ in range(rnd.randint(1, 60)):
+                if rnd.random() < .2:
+                    values.append(None)
+                elif kind == 'int' or (kind == 'mixed' and rnd.random() < .5):
+                    values.append(rnd.randint(-(1 << bits), 1 << bits))
+                else:
+                    values.append(rnd.uniform(-1e6, 1e6))
+            encoding, res = roundtrip(values)
+            self.assertEqual(typed(res), typed(values), (encoding, values))
+
+    def test_encodings(self):
+        self.assertEqual(roundtrip([1, None, 3])[0], 'dod')
+        self.assertEqual(roundtrip([1.0, 3.5])[0], 'gorilla')
+        self.assertEqual(roundtrip([1, 3.5])[0], 'json')
+        self.assertEqual(roundtrip([2 ** 62 - 1, 0])[0], 'json')
+
+
+class ColumnarTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, True)
+
+    def connect(self, table, options):
+        tsdb = connect('columnar://localhost%s' % self.path)
+        tsdb.register_table(table, options)
+        return tsdb
+
+    def test_extremes(self):
+        tsdb = self.connect('t', {'tags': {'dev': 'string'}, 'fields': {'v': 'int', 'f': 'float', 's': 'string'}})
+        expected = []
+        for i, values in enumerate(EXTREMES):
+            pts = [TSDBPoint(time=START + datetime.timedelta(hours=i, seconds=j), data={'dev': 'd', 'v': v, 'f': None, 's': None})
+                   for j, v in enumerate(values)]
+            tsdb.write_points('t', copy_points(pts))
+            expected += rows(pts)
+        self.assertEqual([(tm, typed([d['v']])) for tm, d in rows(tsdb.query('t'))],
+                         [(tm, typed([d['v']])) for tm, d in expected])
+
+    def assertClose(self, a, b):
+        self.assertEqual(len(a), len(b))
+        for (t1, d1), (t2, d2) in zip(a, b):
+            self.assertEqual(t1, t2)
+            self.assertEqual(sorted(d1), sorted(d2))
+            for k, v in d1.items():
+                if isinstance(v, float) and d2[k] != None:
+                    self.assertAlmostEqual(v, d2[k], 6)
+                else:
+                    self.assertEqual(v, d2[k], (t1, k))
+
+    def test_same_as_sqlite(self):
+        rnd = random.Random(0)
+        pts = make_points(3000, step=7)
+        tsdb = self.connect('t', define(block_size=100, partition='hour'))
+        ref = sqlite('t')
+        for i in range(0, 3000, 500):
+            for db in (tsdb, ref):
+                db.write_points('t', copy_points(pts[i:i + 500]))
+        values = {'s': Sum('v'), 'm': Mean('f'), 'c': Count('f'), 'mx': Max('f'), 'mn': Min('v'), 'fi': First('f'), 'la': Last('f')}
+        for _ in range(40):
+            a = START + datetime.timedelta(seconds=rnd.randint(-100, 7000))
+            b = a + datetime.timedelta(seconds=rnd.randint(0, 5000))
+            dev = rnd.choice(['d0', 'd1', 'd2'])
+            q, r = [db.query('t', dev=dev).time_range(a, b) for db in (tsdb, ref)]
+            self.assertEqual(rows(q), rows(r))
+            self.assertEqual(q.count(), r.count())
+            self.assertEqual(rows(q[2:9]), rows(r[2:9]))
+            self.assertEqual(rows([p for p in (q.first(), q.last()) if p != None]), rows([p for p in (r.first(), r.last()) if p != None]))
+            self.assertEqual(rows(q.order_by('-time')), rows(r.order_by('-time')))
+            self.assertEqual([list(c) for c in q.columns('v').values()], [list(c) for c in r.columns('v').values()])
+            self.assertClose(rows(q.time_group('hour').values(**values)), rows(r.time_group('hour').values(**values)))
+        self.assertEqual(tsdb.query('t').count(), ref.query('t').count())
+
+
+if __name__ == '__main__':
+    unittest.main()
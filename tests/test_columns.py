@@ -0,0 +1,78 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import array
+import datetime
+import math
+import sys
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from onetsdb.base import to_column, to_epoch_us
+from tests.util import START, make_points, sqlite, mongo, mongomock
+
+
+def values(col):
+    return [None if isinstance(v, float) and math.isnan(v) else v for v in list(col)]
+
+
+class ColumnsTest(unittest.TestCase):
+    def check(self, tsdb, pts):
+        def fail(*args):
+            raise AssertionError('columns() built a point')
+        # 直接从游标填充, 不经过 TSDBPoint
+        tsdb._db_data_to_point = fail
+        a, b = START + datetime.timedelta(seconds=600), START + datetime.timedelta(seconds=3000)
+        ps = [p for p in pts if p.data['dev'] == 'd0' and a <= p.time <= b]
+        cols = tsdb.query('t', dev='d0').time_range(a, b).columns('v', 'f')
+        self.assertEqual(sorted(cols), ['f', 'time', 'v'])
+        self.assertEqual(cols['time'].dtype, 'int64')
+        self.assertEqual(list(cols['time']), [to_epoch_us(p.time) for p in ps])
+        self.assertEqual(cols['v'].dtype, 'int64')
+        self.assertEqual(list(cols['v']), [p.data['v'] for p in ps])
+        # None 在浮点列中为 nan
+        self.assertEqual(cols['f'].dtype, 'float64')
+        self.assertTrue(None in [p.data['f'] for p in ps])
+        self.assertEqual(values(cols['f']), [p.data['f'] for p in ps])
+        cols = tsdb.query('t').columns()
+        self.assertEqual(sorted(cols), ['dev', 'f', 'time', 'v'])
+        self.assertEqual(list(cols['dev']), [p.data['dev'] for p in pts])
+        cols = tsdb.query('t', dev='d9').columns('v')
+        self.assertEqual((len(cols['time']), len(cols['v'])), (0, 0))
+
+    @unittest.skipIf(numpy == None, 'numpy is not installed')
+    def test_sqlite(self):
+        pts = make_points(300, series=1)
+        self.check(sqlite('t', points=pts), pts)
+
+    @unittest.skipIf(numpy == None or mongomock == None, 'numpy or mongomock is not installed')
+    def test_mongo(self):
+        pts = make_points(300, series=1)
+        self.check(mongo('t', points=pts), pts)
+
+    def test_without_numpy(self):
+        saved = sys.modules.get('numpy')
+        sys.modules['numpy'] = None
+        try:
+            col = to_column([1, 2, 3])
+            self.assertEqual((type(col), col.typecode, list(col)), (array.array, 'q', [1, 2, 3]))
+            col = to_column([1, None, 2.5])
+            self.assertEqual((col.typecode, values(col)), ('d', [1.0, None, 2.5]))
+            self.assertEqual(to_column(['a', None]), ['a', None])
+            col = to_column([1, None], 'int')
+            self.assertEqual((col.typecode, values(col)), ('d', [1.0, None]))
+        finally:
+            if saved == None:
+                del sys.modules['numpy']
+            else:
+                sys.modules['numpy'] = saved
+
+
+if __name__ == '__main__':
+    unittest.main()
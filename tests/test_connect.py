@@ -0,0 +1,99 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+try:
+    import pymongo
+except ImportError:
+    pymongo = None
+
+try:
+    import influxdb
+except ImportError:
+    influxdb = None
+
+from onetsdb import connect, TSDBPoint
+from onetsdb.base import release_clients
+from tests.util import START, define
+
+
+class ConnectTest(unittest.TestCase):
+    def tearDown(self):
+        release_clients()
+
+    @unittest.skipIf(pymongo == None, 'pymongo is not installed')
+    def test_mongo(self):
+        a, b = connect('mongodb://localhost:27017/a'), connect('mongodb://localhost:27017/b?pool_size=7')
+        # 同一服务器共用一个客户端, 不会再次建立连接池
+        self.assertTrue(a.db.client is b.db.client)
+        self.assertEqual((a.db.name, b.db.name), ('a', 'b'))
+        self.assertTrue(connect('mongodb://localhost:27017/a').db.client is a.db.client)
+        self.assertFalse(connect('mongodb://localhost:27017/a?pool=0').db.client is a.db.client)
+        self.assertFalse(connect('mongodb://localhost:27018/a').db.client is a.db.client)
+        # 客户端只在第一次创建时使用 pool_size
+        c = connect('mongodb://localhost:27019/a?pool_size=7')
+        self.assertEqual(c.db.client.options.pool_options.max_pool_size, 7)
+        release_clients()
+        self.assertFalse(connect('mongodb://localhost:27017/a').db.client is a.db.client)
+
+    @unittest.skipIf(influxdb == None, 'influxdb is not installed')
+    def test_influx(self):
+        a, b = connect('influxdb://localhost:8086/a'), connect('influxdb://localhost:8086/a')
+        self.assertTrue(a.db is b.db)
+        self.assertTrue(connect('influxdb://localhost:8086/c').db.client is a.db.client)
+        self.assertFalse(connect('influxdb://localhost:8086/a?pool=0').db is a.db)
+        client = a.db.client
+        created, written = [], []
+        client.create_database = created.append
+        client.write_points = lambda points, **kwargs: written.append(kwargs) or True
+        # 数据库在第一次写入时创建一次
+        a.register_table('t', define())
+        self.assertEqual(created, [])
+        for tsdb in (a, b, connect('influxdb://localhost:8086/a')):
+            tsdb.register_table('t', define())
+            tsdb.write_points('t', [TSDBPoint(time=START, data={'dev': 'd0', 'v': 1})])
+        self.assertEqual(created, ['a'])
+        self.assertEqual(written, [{'database': 'a'}] * 3)
+
+    def test_sqlite_thread_local(self):
+        path = tempfile.mkdtemp()
+        try:
+            tsdb = connect('sqlite3://localhost%s?thread_local=1' % os.path.join(path, 'tsdb.sqlite3'))
+            tsdb.register_table('t', define(layout='series'))
+            cons = []
+
+            def read():
+                cons.append(tsdb.con)
+                cons.append(tsdb.con)
+                tsdb.query('t').count()
+
+            threads = [threading.Thread(target=read) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            # 每个线程一个连接, 同一线程复用
+            self.assertEqual(len(set(id(c) for c in cons)), 3)
+            self.assertTrue(cons[0] is cons[1])
+            tsdb.write_points('t', [TSDBPoint(time=START, data={'dev': 'd0', 'v': 1})])
+            tsdb.close()
+            for con in cons:
+                with self.assertRaises(sqlite3.ProgrammingError):
+                    con.execute('SELECT 1')
+            tsdb = connect('sqlite3://localhost%s' % os.path.join(path, 'tsdb.sqlite3'))
+            self.assertEqual(tsdb.query('t').count(), 1)
+            tsdb.close()
+        finally:
+            shutil.rmtree(path, True)
+
+
+if __name__ == '__main__':
+    unittest.main()
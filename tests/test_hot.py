@@ -0,0 +1,104 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import random
+import unittest
+
+from onetsdb import TSDBPoint
+from onetsdb.base import Sum, Mean, Max, Min, Count, First, Last
+from tests.util import START, copy_points, rows, sqlite
+
+DEFINE = {'tags': {'dev': 'string', 'site': 'string'}, 'fields': {'v': 'float', 'n': 'int'}}
+VALUES = dict(c=Count('v'), s=Sum('v'), mx=Max('n'), mn=Min('v'), me=Mean('v'), fi=First('n'), la=Last('v'))
+
+
+def norm(points):
+    return [(t, dict((k, round(v, 9) if isinstance(v, float) else v) for k, v in d.items())) for t, d in rows(points)]
+
+
+class HotTierTest(unittest.TestCase):
+    def check(self, seed, layout, partition=None, **kwargs):
+        '''
+        random writes, queries and deletes on a table with a hot tier and on the same plain table
+        '''
+        rnd = random.Random(seed)
+        define = dict(DEFINE, layout=layout)
+        if partition:
+            define['partition'] = partition
+        tsdb, ref = sqlite('t', dict(define)), sqlite('t', dict(define))
+        tsdb.set_hot_tier('t', ['dev', 'site'], **kwargs)
+        clock = 0
+        used = set()
+        for step in range(200):
+            if rnd.random() < .4:
+                pts = []
+                for _ in range(rnd.choice([1, 1, 4, 30])):
+                    clock += rnd.randint(1, 300)
+                    # 偶尔写入过去的时间
+                    sec = clock if rnd.random() < .85 else rnd.randint(0, clock)
+                    if layout == 'time':
+                        while sec in used:
+                            sec += 1
+                        used.add(sec)
+                    tm = START + datetime.timedelta(seconds=sec)
+                    if layout == 'series' and pts and rnd.random() < .1:
+                        tm = pts[-1].time
+                    pts.append(TSDBPoint(time=tm, data={'dev': rnd.choice('ab'), 'site': rnd.choice('xy'),
+                                                        'v': rnd.choice([None, rnd.random()]), 'n': rnd.randint(0, 9)}))
+                if layout == 'time':
+                    pts.sort(key=lambda p: p.time)
+                for db in (tsdb, ref):
+                    db.write_points('t', copy_points(pts))
+            flt = {'dev': rnd.choice('abc'), 'site': rnd.choice('xy')} if rnd.random() < .85 else {'dev': 'a'}
+            q, r = tsdb.query('t', **flt), ref.query('t', **flt)
+            if rnd.random() < .5:
+                a = START + datetime.timedelta(seconds=clock - rnd.randint(0, 9000))
+                b = rnd.choice([None, START + datetime.timedelta(seconds=clock - rnd.randint(0, 3000))])
+                q, r = q.time_range(a, b), r.time_range(a, b)
+            if rnd.random() < .15:
+                a = START + datetime.timedelta(seconds=clock - rnd.randint(0, 3000))
+                q, r = q.after(a), r.after(a)
+            if rnd.random() < .3:
+                q, r = q.order_by('-time'), r.order_by('-time')
+            msg = (step, q.options)
+            self.assertEqual(rows([p for p in (q.last(), q.first()) if p != None]),
+                             rows([p for p in (r.last(), r.first()) if p != None]), msg)
+            self.assertEqual(rows(q), rows(r), msg)
+            self.assertEqual(q.count(), r.count(), msg)
+            n = r.count()
+            i = rnd.randint(-n - 1, n)
+            self.assertEqual(rows([p for p in [q[i]] if p != None]), rows([p for p in [r[i]] if p != None]), msg)
+            a, b = rnd.choice([None, rnd.randint(-10, 10)]), rnd.choice([None, rnd.randint(-10, 10)])
+            self.assertEqual(rows(q[a:b]), rows(r[a:b]), msg)
+            qa, ra = q.values(**VALUES), r.values(**VALUES)
+            if rnd.random() < .5:
+                qa, ra = qa.time_group('hour'), ra.time_group('hour')
+            self.assertEqual(norm(qa), norm(ra), msg)
+            a, b = q.columns('v', 'n'), r.columns('v', 'n')
+            self.assertEqual(list(a['time']), list(b['time']), msg)
+            self.assertEqual(list(a['n']), list(b['n']), msg)
+            if rnd.random() < .05:
+                q.delete()
+                r.delete()
+        return tsdb.hot_stats('t')
+
+    def test_time_layout(self):
+        stats = self.check(0, 'time', points=3, window=7200, max_series=100)
+        self.assertTrue(stats['hits'] > 0, stats)
+
+    def test_series_layout(self):
+        stats = self.check(1, 'series', points=20, max_series=100)
+        self.assertTrue(stats['hits'] > 0, stats)
+
+    def test_evicted_series(self):
+        self.check(2, 'series', points=1, window=600, max_series=1)
+
+    def test_partitioned(self):
+        self.check(3, 'time', partition='day', points=3, window=7200, max_series=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import unittest
+
+try:
+    import influxdb
+except ImportError:
+    influxdb = None
+
+from tests.util import START, influx, make_points, FakeInfluxClient
+
+
+class ChunkedClient(FakeInfluxClient):
+    '''
+    every query returns points, in chunks of chunk_size when chunked, counting the chunks sent
+    '''
+
+    def __init__(self, points):
+        FakeInfluxClient.__init__(self)
+        self.points = points
+        self.kwargs = []
+        self.sent = 0
+
+    def _raw(self, points, epoch=None):
+        values = []
+        for p in points:
+            us = int((p.time - START).total_seconds() * 1000000)
+            tm = us if epoch else (START + datetime.timedelta(microseconds=us)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            values.append([tm, p.data['dev'], p.data['f'], p.data['v'], 1])
+        return {'series': [{'name': 't', 'columns': ['time', 'dev', 'f', 'v', '__count__'], 'values': values}]}
+
+    def query(self, ql, **kwargs):
+        from influxdb.resultset import ResultSet
+        self.queries.append(ql)
+        self.kwargs.append(kwargs)
+        if not kwargs.get('chunked'):
+            self.sent += 1
+            return ResultSet(self._raw(self.points, kwargs.get('epoch')))
+        return self._chunks(kwargs['chunk_size'], kwargs.get('epoch'))
+
+    def _chunks(self, size, epoch):
+        from influxdb.resultset import ResultSet
+        for i in range(0, len(self.points), size):
+            self.sent += 1
+            yield ResultSet(self._raw(self.points[i:i + size], epoch))
+
+
+@unittest.skipIf(influxdb == None, 'influxdb is not installed')
+class InfluxQueryTest(unittest.TestCase):
+    def test_empty_slice(self):
+        tsdb, client = influx('t')
+        self.assertEqual(list(tsdb.query('t')[5:5]), [])
+        self.assertEqual(list(tsdb.query('t')[-2:-2]), [])
+        self.assertEqual(client.queries, [])
+
+    def test_limit(self):
+        tsdb, client = influx('t')
+        list(tsdb.query('t')[2:5])
+        self.assertTrue(client.queries[-1].endswith('LIMIT 3 OFFSET 2'))
+        tsdb.query('t').last()
+        self.assertTrue(client.queries[-1].endswith('ORDER BY time DESC LIMIT 1'))
+
+
+@unittest.skipIf(influxdb == None, 'influxdb is not installed')
+class InfluxChunkTest(unittest.TestCase):
+    def test_chunked(self):
+        pts = make_points(100)
+        tsdb, _ = influx('t')
+        tsdb.db.client = client = ChunkedClient(pts)
+        expected = [(tsdb._to_point_time(r[0]), {'dev': r[1], 'f': r[2], 'v': r[3]}) for r in client._raw(pts)['series'][0]['values']]
+        tsdb.chunk_size = 30
+        it = iter(tsdb.query('t'))
+        first = next(it)
+        # 第一个点只需第一块
+        self.assertEqual(client.sent, 1)
+        self.assertEqual(client.kwargs[-1], {'database': 'tsdb', 'chunked': True, 'chunk_size': 30})
+        self.assertEqual([(p.time, dict(p.data)) for p in [first] + list(it)], expected)
+        self.assertEqual(client.sent, 4)
+        self.assertEqual([(p.time, dict(p.data)) for p in tsdb.query('t').view()], expected)
+        cols = tsdb.query('t').chunk(7).columns('v', 'f')
+        self.assertEqual(client.kwargs[-1]['chunk_size'], 7)
+        self.assertEqual(list(cols['v']), [p.data['v'] for p in pts])
+        self.assertEqual(list(cols['time']), [int((p.time - START).total_seconds() * 1000000) for p in pts])
+        # 默认一次返回整个结果
+        tsdb.chunk_size = 0
+        self.assertEqual([(p.time, dict(p.data)) for p in tsdb.query('t')], expected)
+        self.assertFalse(client.kwargs[-1].get('chunked'))
+
+
+if __name__ == '__main__':
+    unittest.main()
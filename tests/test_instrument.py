@@ -0,0 +1,79 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import logging
+import unittest
+
+from onetsdb.base import Mean
+from onetsdb.instrument import normalize
+from tests.util import START, make_points, copy_points, rows, sqlite, mongo, mongomock
+
+
+class InstrumentTest(unittest.TestCase):
+    def check(self, tsdb, ref):
+        '''
+        the events of tsdb count the points, the results are those of the uninstrumented ref
+        '''
+        events = []
+        tsdb.add_hook(events.append)
+        stats = tsdb.enable_stats()
+        pts = make_points(600, step=10)
+        for db in (tsdb, ref):
+            db.write_points('t', copy_points(pts))
+        self.assertEqual([(e['rows_in'], e['error']) for e in events if e['op'] == 'write'], [(600, None)])
+        a, b = START + datetime.timedelta(seconds=300), START + datetime.timedelta(seconds=1500)
+        fetched = 0
+        for dev in ('d0', 'd1'):
+            q, r = tsdb.query('t', dev=dev).time_range(a, b), ref.query('t', dev=dev).time_range(a, b)
+            del events[:]
+            self.assertEqual(rows(q), rows(r))
+            self.assertEqual(q.count(), r.count())
+            self.assertEqual(rows(q.time_group('hour').values(m=Mean('f'))), rows(r.time_group('hour').values(m=Mean('f'))))
+            ops = [e for e in events if e['op'] != 'statement']
+            self.assertEqual([e['op'] for e in ops], ['fetch', 'count', 'aggregate'])
+            self.assertEqual(ops[0]['rows_out'], r.count())
+            fetched += r.count()
+            for e in ops:
+                self.assertTrue(e['statements'])
+                self.assertEqual((e['table'], e['error']), ('t', None))
+                self.assertTrue(e['seconds'] >= 0)
+        self.assertEqual(sum(s['rows_out'] for s in stats.stats() if s['op'] == 'fetch'), fetched)
+        self.assertEqual([(s['count'], s['rows_in']) for s in stats.stats() if s['op'] == 'write'], [(1, 600)])
+        self.assertEqual(stats.top(1, key='rows_out')[0]['op'], 'fetch')
+        tsdb.remove_hook(events.append)
+        tsdb.remove_hook(stats)
+        self.assertEqual(tsdb._instrument, None)
+
+    def test_sqlite(self):
+        self.check(sqlite('t'), sqlite('t'))
+
+    @unittest.skipIf(mongomock == None, 'mongomock is not installed')
+    def test_mongo(self):
+        self.check(mongo('t'), mongo('t'))
+
+    def test_error_and_slow_log(self):
+        tsdb = sqlite('t', points=make_points(30))
+        events = []
+        tsdb.add_hook(events.append)
+        tsdb.set_slow_log(0)
+        with self.assertLogs('onetsdb.slow', logging.WARNING) as logs:
+            with self.assertRaises(Exception):
+                list(tsdb.query('missing'))
+            tsdb.query('t').count()
+        self.assertTrue(events[-2]['error'])
+        self.assertEqual((events[-1]['op'], events[-1]['error']), ('count', None))
+        self.assertEqual(len(logs.output), 2)
+        tsdb.set_slow_log(None)
+        self.assertEqual(len(tsdb._instrument.hooks), 1)
+
+    def test_normalize(self):
+        self.assertEqual(normalize("SELECT * FROM `t` WHERE `dev` = 'a' AND `v` > 1.5 LIMIT 10"),
+                         'SELECT * FROM `t` WHERE `dev` = ? AND `v` > ? LIMIT ?')
+        self.assertEqual(normalize("t.find({'dev': 'a', '_time': {'$gte': 3}})"), "t.find({'dev': ?, '_time': {'$gte': ?}})")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import unittest
+
+from onetsdb import TSDBPoint
+from tests.util import make_points, copy_points, sorted_rows, mongo, mongomock
+
+
+@unittest.skipIf(mongomock == None, 'mongomock is not installed')
+class MongoWriteTest(unittest.TestCase):
+    def test_insert_many(self):
+        pts = make_points(30)
+        tsdb = mongo('t')
+        events = []
+        tsdb.add_hook(events.append)
+        calls = []
+        col = tsdb.db.get_collection('t')
+        insert_many = col.insert_many
+        col.insert_many = lambda docs, **kwargs: calls.append((len(docs), kwargs)) or insert_many(docs, **kwargs)
+        tsdb._get_collection = lambda name: col
+        self.assertEqual(tsdb.write_points('t', copy_points(pts), batch_size=7), 30)
+        # 每 batch_size 个点一次无序的 insert_many
+        self.assertEqual(calls, [(7, {'ordered': False})] * 4 + [(2, {'ordered': False})])
+        self.assertEqual([e['statements'] for e in events if e['op'] == 'write'],
+                         [['t.insert_many(7 docs)'] * 4 + ['t.insert_many(2 docs)']])
+        self.assertEqual(sorted_rows(tsdb.query('t')), sorted_rows(pts))
+        del calls[:]
+        self.assertEqual(tsdb.write_points('t', []), 0)
+        self.assertEqual(calls, [])
+
+    def test_default_time(self):
+        tsdb = mongo('t')
+        tsdb.write_points('t', [TSDBPoint(data={'dev': 'd0', 'v': 1})])
+        self.assertTrue(tsdb.db.t.find_one({'v': 1}).get('_time'))
+        # 不补全时间时原样写入
+        tsdb.default_time = False
+        p = TSDBPoint(data={'dev': 'd0', 'v': 2})
+        tsdb.write_points('t', [p])
+        self.assertEqual(p.time, None)
+        self.assertEqual(tsdb.db.t.find_one({'v': 2}).get('_time'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
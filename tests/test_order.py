@@ -0,0 +1,58 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import unittest
+
+try:
+    import influxdb
+except ImportError:
+    influxdb = None
+
+from onetsdb.base import TSDBException
+from tests.util import make_points, rows, sqlite, mongo, mongomock, influx
+
+
+class OrderByTest(unittest.TestCase):
+    def check(self, tsdb, pts):
+        for dev in ('d0', 'd2'):
+            ps = [p for p in pts if p.data['dev'] == dev]
+            q = tsdb.query('t', dev=dev)
+            self.assertEqual(rows(q.order_by('time')), rows(ps))
+            for o in ('-time', '-_time'):
+                self.assertEqual(rows(q.order_by(o)), rows(ps[::-1]))
+                self.assertEqual(rows(q.order_by(o)[2:7]), rows(ps[::-1][2:7]))
+                self.assertEqual(rows([q.order_by(o).first(), q.order_by(o).last()]), rows([ps[-1], ps[0]]))
+            # 按字段排序, 相同的值按时间倒序
+            expected = sorted(ps[::-1], key=lambda p: p.data['v'])
+            self.assertEqual(rows(q.order_by('v', '-time')), rows(expected))
+            self.assertEqual(rows(q.order_by('-v', 'time')), rows(expected[::-1]))
+            self.assertEqual(rows(q.order_by('v', '-time')[-4:]), rows(expected[-4:]))
+
+    def test_sqlite(self):
+        pts = make_points(300)
+        self.check(sqlite('t', points=pts), pts)
+
+    @unittest.skipIf(mongomock == None, 'mongomock is not installed')
+    def test_mongo(self):
+        pts = make_points(300)
+        self.check(mongo('t', points=pts), pts)
+
+    @unittest.skipIf(influxdb == None, 'influxdb is not installed')
+    def test_influx(self):
+        tsdb, client = influx('t')
+        list(tsdb.query('t', dev='d0'))
+        self.assertFalse('ORDER BY' in client.queries[-1])
+        for o in ('-time', '-_time'):
+            list(tsdb.query('t', dev='d0').order_by(o))
+            self.assertTrue(client.queries[-1].endswith('ORDER BY time DESC'), client.queries[-1])
+        # 倒序查询的末尾按时间正序
+        tsdb.query('t').order_by('-time').last()
+        self.assertTrue(client.queries[-1].endswith('"t" LIMIT 1'), client.queries[-1])
+        with self.assertRaises(TSDBException):
+            list(tsdb.query('t').order_by('v'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import unittest
+
+from onetsdb.base import seek_range
+from tests.util import make_points, rows, sqlite, mongo, mongomock, define
+
+
+class PagesTest(unittest.TestCase):
+    def check_pages(self, tsdb, count):
+        for size in (1, 4, 7, 1000):
+            for order in ('time', '-time'):
+                q = tsdb.query('t').order_by(order)
+                pages = list(q.pages(size))
+                self.assertTrue(all(len(pg) == size for pg in pages[:-1]))
+                self.assertEqual([r for pg in pages for r in rows(pg)], rows(q), (size, order))
+                self.assertEqual(sum(len(pg) for pg in pages), count)
+        q = tsdb.query('t', dev='d1').time_range(make_points()[30].time, None)
+        self.assertEqual([r for pg in q.pages(4) for r in rows(pg)], rows(q))
+
+    def test_sqlite_series(self):
+        self.check_pages(sqlite('t', points=make_points(30)), 30)
+
+    def test_sqlite_time(self):
+        self.check_pages(sqlite('t', define(), make_points(30, series=1)), 30)
+
+    def test_sqlite_partitioned(self):
+        self.check_pages(sqlite('t', define(layout='series', partition='day'), make_points(300, step=3600)), 300)
+
+    @unittest.skipIf(mongomock == None, 'mongomock is not installed')
+    def test_mongo(self):
+        self.check_pages(mongo('t', points=make_points(30)), 30)
+
+    @unittest.skipIf(mongomock == None, 'mongomock is not installed')
+    def test_mongo_partitioned(self):
+        self.check_pages(mongo('t', define(partition='day'), make_points(300, step=3600)), 300)
+
+    def test_order_by_field(self):
+        tsdb = sqlite('t', points=make_points(30))
+        q = tsdb.query('t').order_by('v', '-time')
+        self.assertEqual([r for pg in q.pages(4) for r in rows(pg)], rows(q))
+
+
+class SeekRangeTest(unittest.TestCase):
+    def test_seek_range(self):
+        self.assertEqual(seek_range(slice(-2, 0)), None)
+        self.assertEqual(seek_range(slice(-3, -1)), (True, 1, 2))
+        self.assertEqual(seek_range(slice(2, 5)), (False, 2, 3))
+        self.assertEqual(seek_range(-1), (True, 0, 1))
+        self.assertEqual(seek_range(slice(-2, 3)), None)
+
+    def test_slices(self):
+        # 与列表切片一致
+        pts = make_points(12)
+        tsdb = sqlite('t', points=pts)
+        all_rows = rows(tsdb.query('t'))
+        for a in (None, -13, -5, -1, 0, 2, 11, 20):
+            for b in (None, -13, -5, -1, 0, 2, 11, 20):
+                self.assertEqual(rows(tsdb.query('t')[a:b]), all_rows[a:b], (a, b))
+        for i in (-12, -3, 0, 5, 11):
+            self.assertEqual(rows([tsdb.query('t')[i]]), all_rows[i:i + 1 or None])
+        self.assertEqual(tsdb.query('t')[12], None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from onetsdb import connect
+from onetsdb.base import Sum, Count, Max, Mean, First, Last, get_client
+from tests.util import START, make_points, rows, sqlite, mongo, mongomock, FakeInfluxClient
+
+try:
+    import influxdb
+except ImportError:
+    influxdb = None
+
+VALUES = dict(s=Sum('v'), c=Count('f'), mx=Max('f'), me=Mean('v'), fv=First('f'), lv=Last('v'))
+
+
+def norm(points):
+    return [(t, dict((k, round(v, 6) if isinstance(v, float) else v) for k, v in d.items())) for t, d in rows(points)]
+
+
+class ParallelTest(unittest.TestCase):
+    def check(self, tsdb, ungrouped=True, **kwargs):
+        for q in (tsdb.query('t'), tsdb.query('t', dev='d1').order_by('-time'),
+                  tsdb.query('t').time_range(START + datetime.timedelta(hours=2), START + datetime.timedelta(hours=30))):
+            p = q.parallel(**kwargs)
+            self.assertEqual(rows(p), rows(q))
+            self.assertEqual(p.count(), q.count())
+            if ungrouped:
+                self.assertEqual(norm(p.values(**VALUES)), norm(q.values(**VALUES)))
+            self.assertEqual(norm(p.time_group('hour').values(**VALUES)), norm(q.time_group('hour').values(**VALUES)))
+            self.assertEqual(list(p.columns('v')['v']), list(q.columns('v')['v']))
+
+    def test_sqlite_file(self):
+        path = tempfile.mkdtemp()
+        try:
+            uri = 'sqlite3://localhost%s' % os.path.join(path, 'tsdb.sqlite3')
+            tsdb = sqlite('t', points=make_points(900, step=600), uri=uri)
+            self.check(tsdb, workers=4)
+            self.check(tsdb, workers=3, factory=lambda: connect(uri))
+            tsdb.close()
+        finally:
+            shutil.rmtree(path)
+
+    def test_sqlite_memory(self):
+        # 内存数据库在当前线程依次执行
+        self.check(sqlite('t', points=make_points(300, step=600)), workers=4)
+
+    @unittest.skipIf(mongomock == None, 'mongomock is not installed')
+    def test_mongo(self):
+        # mongodb 只支持按 time_group 聚合
+        self.check(mongo('t', points=make_points(900, step=600)), ungrouped=False, workers=4, shards=7)
+
+    @unittest.skipIf(influxdb == None, 'influxdb is not installed')
+    def test_influx_new_connections(self):
+        # 表定义只在内存中, 新的连接也能查询
+        client = FakeInfluxClient()
+        from onetsdb.influx import InfluxDB
+        get_client(('influxdb', 'parallel-test', None, None, None), lambda: client)
+        get_client(('influxdb', 'parallel-test', None, None, None, 'tsdb'), lambda: InfluxDB('tsdb', client, create=False))
+        uri = 'influxdb://parallel-test/tsdb'
+        tsdb = connect(uri)
+        tsdb.register_table('t', {'tags': {'dev': 'string'}, 'fields': {'v': 'int'}})
+        q = tsdb.query('t', dev='d1').time_range(START, START + datetime.timedelta(days=1))
+        for kwargs in ({}, {'factory': lambda: connect(uri)}):
+            del client.queries[:]
+            self.assertEqual(q.parallel(workers=4, **kwargs).count(), 0)
+            self.assertEqual(q.parallel(workers=4, **kwargs).all(), [])
+            self.assertEqual(len(client.queries), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
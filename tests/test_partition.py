@@ -0,0 +1,118 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import random
+import unittest
+
+from onetsdb import TSDBPoint
+from onetsdb.base import Sum, Mean, Max, Min, Count, First, Last
+from tests.util import START, define, make_points, copy_points, rows, sqlite, mongo, mongomock
+
+VALUES = dict(c=Count('f'), s=Sum('f'), mx=Max('v'), mn=Min('f'), me=Mean('f'), fi=First('v'), la=Last('f'))
+
+
+def norm(points):
+    return [(t, dict((k, round(v, 9) if isinstance(v, float) else v) for k, v in d.items())) for t, d in rows(points)]
+
+
+class PartitionTest(unittest.TestCase):
+    def check(self, tsdb, ref, seed, ungrouped=True, ordered=False):
+        '''
+        random writes, queries and deletes on the partitioned tsdb and the plain ref
+        '''
+        rnd = random.Random(seed)
+        secs = list(range(0, 120 * 86400, 14407))
+        if ordered:
+            secs.reverse()
+        else:
+            rnd.shuffle(secs)
+
+        def rtime():
+            return START + datetime.timedelta(seconds=rnd.randint(-86400, 125 * 86400))
+
+        for step in range(80):
+            if secs and rnd.random() < .3:
+                pts = [TSDBPoint(time=START + datetime.timedelta(seconds=secs.pop()),
+                                 data={'dev': rnd.choice('abc'), 'v': rnd.randint(0, 9), 'f': rnd.choice([None, rnd.random()])})
+                       for _ in range(min(len(secs), rnd.choice([1, 5, 40])))]
+                for db in (tsdb, ref):
+                    db.write_points('t', copy_points(pts))
+            q, r = tsdb.query('t'), ref.query('t')
+            if rnd.random() < .3:
+                dev = rnd.choice('abcz')
+                q, r = q.filter(dev=dev), r.filter(dev=dev)
+            if rnd.random() < .6:
+                a, b = sorted([rtime(), rtime()])
+                q, r = q.time_range(a, b), r.time_range(a, b)
+            if rnd.random() < .2:
+                a = rtime()
+                q, r = q.after(a), r.after(a)
+            if rnd.random() < .3:
+                q, r = q.order_by('-time'), r.order_by('-time')
+            msg = (step, q.options)
+            self.assertEqual(rows(q), rows(r), msg)
+            self.assertEqual(q.count(), r.count(), msg)
+            n = r.count()
+            i = rnd.randint(-n - 2, n + 1)
+            self.assertEqual(rows([p for p in (q[i], q.first(), q.last()) if p != None]),
+                             rows([p for p in (r[i], r.first(), r.last()) if p != None]), msg)
+            a, b = rnd.choice([None, rnd.randint(-30, 30)]), rnd.choice([None, rnd.randint(-30, 30)])
+            self.assertEqual(rows(q[a:b]), rows(r[a:b]), msg)
+            size = rnd.randint(5, 40)
+            self.assertEqual(sum([rows(p) for p in q.pages(size)], []), rows(r), msg)
+            group = rnd.choice(['hour', 'day', 'month'] + ([None] if ungrouped else []))
+            qa, ra = q.values(**VALUES), r.values(**VALUES)
+            if group:
+                qa, ra = qa.time_group(group), ra.time_group(group)
+            self.assertEqual(norm(qa), norm(ra), msg)
+            self.assertEqual(list(q.columns('v')['v']), list(r.columns('v')['v']), msg)
+            if rnd.random() < .05:
+                q.delete()
+                r.delete()
+
+    def test_sqlite(self):
+        for seed, unit in enumerate(['day', 'week', 'month']):
+            self.check(sqlite('t', define(partition=unit)), sqlite('t', define()), seed)
+
+    @unittest.skipIf(mongomock == None, 'mongomock is not installed')
+    def test_mongo(self):
+        # mongodb 只支持按 time_group 聚合, First/Last 按写入顺序, 与未分区的 mongodb 比较
+        for seed, unit in enumerate(['day', 'month']):
+            self.check(mongo('t', define(partition=unit)), mongo('t', define()), seed, ungrouped=False, ordered=True)
+
+    def test_tail_reads(self):
+        # last() 和末尾的切片在最后的分区中倒序查找, 不计数也不从头跳过
+        pts = make_points(3000, step=600)
+        tsdb, ref = sqlite('t', define(partition='day', layout='series'), points=pts), sqlite('t', points=pts)
+        events = []
+        tsdb.add_hook(events.append)
+        for q, r in ((tsdb.query('t'), ref.query('t')), (tsdb.query('t', dev='d1'), ref.query('t', dev='d1'))):
+            del events[:]
+            self.assertEqual(rows([q.last()] + list(q[-3:])), rows([r.last()] + list(r[-3:])))
+            statements = [s for e in events for s in e['statements'] if 'FROM t__p' in s]
+            self.assertEqual(len(statements), 2, statements)
+            for s in statements:
+                self.assertTrue('COUNT' not in s and 'DESC' in s and 'OFFSET 0' in s, s)
+        # 跳过的点只在需要的分区中计数
+        del events[:]
+        self.assertEqual(rows([tsdb.query('t')[-500]]), rows([ref.query('t')[-500]]))
+        self.assertEqual(len([s for e in events for s in e['statements'] if 'COUNT' in s]), 2)
+
+    def test_retention(self):
+        tsdb, ref = sqlite('t', define(partition='day', retention=30)), sqlite('t', define())
+        now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+        pts = [TSDBPoint(time=now - datetime.timedelta(hours=i), data={'dev': 'a', 'v': i, 'f': None}) for i in range(24 * 60, 0, -1)]
+        for db in (tsdb, ref):
+            db.write_points('t', copy_points(pts))
+        tsdb.expire('t')
+        first = tsdb.query('t').first().time
+        self.assertEqual(rows(tsdb.query('t')), rows(ref.query('t').time_range(first, None)))
+        self.assertTrue(now - datetime.timedelta(days=31) <= first <= now - datetime.timedelta(days=29))
+        self.assertEqual(first, datetime.datetime.combine(first.date(), datetime.time()))
+
+
+if __name__ == '__main__':
+    unittest.main()
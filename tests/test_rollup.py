@@ -0,0 +1,127 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import random
+import unittest
+
+from onetsdb import TSDBPoint
+from onetsdb.base import Sum, Count, Max, Min, Mean, First, Last
+from tests.util import START, copy_points, sqlite, mongo, mongomock, define
+
+VALUES = {
+    's': Sum('v'), 'c': Count('f'), 'mx': Max('v'), 'mn': Min('f'), 'me': Mean('v'),
+    'fv': First('v'), 'lv': Last('v'), 'ff': First('f'), 'lf': Last('f'),
+}
+
+
+def random_points(count, seed=0):
+    # 每个点的时间不同, first/last 没有歧义
+    rnd = random.Random(seed)
+    return [TSDBPoint(time=START + datetime.timedelta(seconds=i * 97), data={
+        'dev': rnd.choice(['d0', 'd1', 'd2']),
+        'v': None if rnd.random() < .15 else rnd.randint(-50, 50),
+        'f': None if rnd.random() < .15 else round(rnd.uniform(-10, 10), 3),
+    }) for i in range(count)]
+
+
+def norm(points):
+    # 类型也需一致
+    return [(p.time, sorted((k, type(v).__name__, round(v, 6) if isinstance(v, float) else v) for k, v in p.data.items()))
+            for p in points]
+
+
+class RollupTest(unittest.TestCase):
+    def queries(self, tsdb, values=VALUES):
+        end = START + datetime.timedelta(hours=20, minutes=17)
+        for group in ('hour', 'day'):
+            for flt in ({}, {'dev': 'd1'}):
+                q = tsdb.query('t').filter(**flt).time_group(group).values(**values)
+                yield q
+                yield q.time_range(START + datetime.timedelta(minutes=30), end)
+                yield q.order_by('-time')
+
+    def check(self, tsdb, ref, values=VALUES):
+        n = 0
+        for q, r in zip(self.queries(tsdb, values), self.queries(ref, values)):
+            self.assertTrue(tsdb._find_rollup(q) != None)
+            self.assertEqual(norm(q), norm(r), q.options)
+            n += 1
+        self.assertEqual(n, 12)
+
+    def write(self, tsdb, ref, pts, seed=0, shuffle=True):
+        # 分批写入, 部分乱序
+        rnd = random.Random(seed)
+        batches = [pts[i:i + 37] for i in range(0, len(pts), 37)]
+        if shuffle:
+            rnd.shuffle(batches)
+        for b in batches:
+            tsdb.write_points('t', copy_points(b))
+            ref.write_points('t', copy_points(b))
+
+    def test_sqlite(self):
+        pts = random_points(1500)
+        for layout in ('time', 'series'):
+            tsdb, ref = sqlite('t', define(layout=layout)), sqlite('t', define(layout=layout))
+            tsdb.register_rollup('t', 'hour', VALUES, tags=['dev'])
+            self.write(tsdb, ref, pts)
+            self.check(tsdb, ref)
+
+    def test_register_after_write(self):
+        pts = random_points(500, seed=1)
+        tsdb, ref = sqlite('t', points=pts), sqlite('t', points=pts)
+        tsdb.register_rollup('t', 'hour', VALUES, tags=['dev'])
+        self.check(tsdb, ref)
+        self.write(tsdb, ref, random_points(800, seed=2)[500:])
+        self.check(tsdb, ref)
+
+    def test_atomic_write(self):
+        tsdb = sqlite('t')
+        rollup = tsdb.register_rollup('t', 'hour', VALUES, tags=['dev'])
+        pts = random_points(100)
+        tsdb.write_points('t', copy_points(pts[:50]))
+        before = tsdb.query(rollup.name).all()
+
+        def fail(*args):
+            raise IOError('down')
+
+        tsdb._merge_rollup = fail
+        self.assertRaises(IOError, tsdb.write_points, 't', copy_points(pts[50:]))
+        # 原始数据与 rollup 一起回滚
+        self.assertEqual(tsdb.query('t').count(), 50)
+        self.assertEqual(norm(tsdb.query(rollup.name)), norm(before))
+
+    def test_no_rewrite(self):
+        tsdb = sqlite('t')
+        rollup = tsdb.register_rollup('t', 'hour', VALUES, tags=['dev'])
+
+        def fail(*args):
+            raise AssertionError('rewrite')
+
+        rollup.rewrite = fail
+        tsdb.write_points('t', random_points(300))
+        self.assertEqual(tsdb.query(rollup.name).count(), len(set((p.time, p.data['dev']) for p in tsdb.query(rollup.name))))
+
+    def test_delete(self):
+        pts = random_points(600)
+        tsdb, ref = sqlite('t', points=pts), sqlite('t', points=pts)
+        tsdb.register_rollup('t', 'hour', VALUES, tags=['dev'])
+        for db in (tsdb, ref):
+            db.query('t').filter(dev='d2').time_range(START + datetime.timedelta(hours=3, minutes=10), START + datetime.timedelta(hours=9)).delete()
+        self.check(tsdb, ref)
+
+    @unittest.skipIf(mongomock == None, 'mongomock is not installed')
+    def test_mongo(self):
+        # mongodb 的 Count 计数所有的点, first/last 按写入顺序, 只比较其他聚合且按时间顺序写入
+        values = dict((k, v) for k, v in VALUES.items() if not isinstance(v, Count))
+        pts = random_points(1500)
+        tsdb, ref = mongo('t'), mongo('t')
+        tsdb.register_rollup('t', 'hour', values, tags=['dev'])
+        self.write(tsdb, ref, pts, shuffle=False)
+        self.check(tsdb, ref, values)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import random
+import shutil
+import tempfile
+import unittest
+
+from onetsdb import connect
+from onetsdb.base import Sum, Mean, Max, Min, Count, First, Last
+from tests.util import START, define, make_points, copy_points, rows, sqlite
+
+
+class SegmentTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, True)
+
+    def assertClose(self, a, b):
+        self.assertEqual(len(a), len(b))
+        for (t1, d1), (t2, d2) in zip(a, b):
+            self.assertEqual(t1, t2)
+            self.assertEqual(sorted(d1), sorted(d2))
+            for k, v in d1.items():
+                if isinstance(v, float) and d2[k] != None:
+                    self.assertAlmostEqual(v, d2[k], 6)
+                else:
+                    self.assertEqual(v, d2[k], (t1, k))
+
+    def test_same_as_sqlite(self):
+        rnd = random.Random(0)
+        pts = make_points(3000, step=7)
+        tsdb = connect('segment://localhost%s' % self.path)
+        tsdb.register_table('t', define(segment_size=200))
+        ref = sqlite('t')
+        values = {'s': Sum('v'), 'm': Mean('f'), 'c': Count('f'), 'mx': Max('f'), 'mn': Min('v'), 'fi': First('f'), 'la': Last('f')}
+        for i in range(0, 3000, 500):
+            for db in (tsdb, ref):
+                db.write_points('t', copy_points(pts[i:i + 500]))
+            for _ in range(20):
+                a = START + datetime.timedelta(seconds=rnd.randint(-100, 7000))
+                b = a + datetime.timedelta(seconds=rnd.randint(0, 5000))
+                dev = rnd.choice(['d0', 'd1', 'd2'])
+                q, r = [db.query('t', dev=dev).time_range(a, b) for db in (tsdb, ref)]
+                self.assertEqual(rows(q), rows(r))
+                self.assertEqual(q.count(), r.count())
+                self.assertEqual(rows(q[2:9]), rows(r[2:9]))
+                self.assertEqual(rows([p for p in (q.first(), q.last()) if p != None]), rows([p for p in (r.first(), r.last()) if p != None]))
+                self.assertEqual(rows(q.order_by('-time')), rows(r.order_by('-time')))
+                self.assertEqual([list(c) for c in q.columns('v').values()], [list(c) for c in r.columns('v').values()])
+                self.assertClose(rows(q.time_group('hour').values(**values)), rows(r.time_group('hour').values(**values)))
+                self.assertClose(rows(q.values(**values)), rows(r.values(**values)))
+        self.assertEqual(tsdb.query('t').count(), ref.query('t').count())
+        a = START + datetime.timedelta(seconds=1000)
+        for db in (tsdb, ref):
+            db.query('t', dev='d1').time_range(a, a + datetime.timedelta(seconds=2000)).delete()
+        self.assertEqual(rows(tsdb.query('t', dev='d1')), rows(ref.query('t', dev='d1')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from onetsdb import connect, TSDBPoint
+from onetsdb.base import RowView, Sum, Mean, Max, Min, Count, First, Last
+from tests.util import START, make_points, copy_points, rows, sorted_rows, sqlite, define
+
+VALUES = dict(c=Count('f'), s=Sum('v'), mx=Max('f'), mn=Min('v'), me=Mean('f'), fi=First('f'), la=Last('v'))
+
+
+class RowViewTest(unittest.TestCase):
+    def test_row_view(self):
+        tsdb = sqlite('t', points=make_points(30))
+        q = tsdb.query('t', dev='d2')
+        views = list(q.view())
+        self.assertEqual(rows(views), rows(q))
+        for p in views:
+            self.assertTrue(isinstance(p.data, RowView))
+            # 包装驱动的行, 不复制
+            self.assertTrue(isinstance(p.data._row, tuple))
+            self.assertEqual(len(p.data._row), len(p.data) + 1)
+            with self.assertRaises(TypeError):
+                p.data['v'] = 1
+        self.assertEqual(rows(tsdb.query('t').view()[-3:]), rows(tsdb.query('t')[-3:]))
+
+    def test_slots(self):
+        # 点和行视图都没有 __dict__
+        p = TSDBPoint(time=START, data={'v': 1})
+        with self.assertRaises(AttributeError):
+            p.extra = 1
+        self.assertFalse(hasattr(p, '__dict__'))
+        view = RowView({'dev': 1, 'v': 2}, (START, 'd0', 5))
+        self.assertFalse(hasattr(view, '__dict__'))
+        self.assertEqual((view['v'], view.get('f'), len(view), 'dev' in view, 'f' in view), (5, None, 2, True, False))
+        self.assertEqual(view, {'dev': 'd0', 'v': 5})
+        self.assertEqual(dict(view), {'dev': 'd0', 'v': 5})
+        with self.assertRaises(KeyError):
+            view['f']
+
+
+class WriteTest(unittest.TestCase):
+    def test_batches(self):
+        pts = make_points(100)
+        for i, p in enumerate(pts):
+            if i % 4 == 0:
+                # 另一组字段, 未定义的字段被忽略
+                del p.data['f']
+            elif i % 4 == 1:
+                p.data['x'] = i
+        tsdb = sqlite('t')
+        calls = []
+        executemany = tsdb._executemany
+        tsdb._executemany = lambda sql, rows, con=None: calls.append((sql, len(rows))) or executemany(sql, rows, con)
+        self.assertEqual(tsdb.write_points('t', copy_points(pts), batch_size=7), 100)
+        # 每组字段一条 INSERT, 每批最多 batch_size 个点
+        self.assertEqual(len(set(sql for sql, _ in calls)), 2)
+        self.assertEqual(sorted(n for _, n in calls), sorted([7] * 3 + [4] + [7] * 10 + [5]))
+        for p in pts:
+            p.data.pop('x', None)
+            p.data.setdefault('f', None)
+        self.assertEqual(sorted_rows(tsdb.query('t')), sorted_rows(pts))
+
+    def test_one_transaction(self):
+        tsdb = sqlite('t', define(layout='time'), points=make_points(3, series=1))
+        pts = [TSDBPoint(time=START + datetime.timedelta(seconds=i), data={'dev': 'd0', 'v': i}) for i in range(1, 30)]
+        # 最后一批的重复时间使整个写入回滚
+        pts.append(TSDBPoint(time=START, data={'dev': 'd0', 'v': 0}))
+        with self.assertRaises(sqlite3.IntegrityError):
+            tsdb.write_points('t', pts, batch_size=5)
+        self.assertEqual(tsdb.query('t').count(), 3)
+
+
+class AggregateTest(unittest.TestCase):
+    def test_first_last(self):
+        pts = make_points(900, step=100)
+        tsdb = sqlite('t', points=pts)
+        events = []
+        tsdb.add_hook(events.append)
+        for dev in ('d0', 'd1'):
+            buckets = {}
+            for p in pts:
+                if p.data['dev'] == dev:
+                    buckets.setdefault(p.time.replace(minute=0, second=0), []).append(p)
+            # first/last 按时间取值, 包括 NULL
+            expected = [(k, {'fi': ps[0].data['f'], 'la': ps[-1].data['f'], 'c': len([p for p in ps if p.data['f'] != None]),
+                             's': sum(p.data['v'] for p in ps)}) for k, ps in sorted(buckets.items())]
+            self.assertTrue([v for _, d in expected for v in (d['fi'], d['la']) if v == None])
+            del events[:]
+            q = tsdb.query('t', dev=dev).time_group('hour').values(fi=First('f'), la=Last('f'), c=Count('f'), s=Sum('v'))
+            self.assertEqual(rows(q), expected)
+            self.assertEqual(rows(q.order_by('-time')), expected[::-1])
+            # 在 SQL 中分组, 每个桶一行
+            self.assertTrue(' GROUP BY ' in events[0]['statements'][0], events[0]['statements'])
+            self.assertEqual(events[0]['rows_out'], len(expected))
+            ps = [p for p in pts if p.data['dev'] == dev]
+            self.assertEqual(rows(tsdb.query('t', dev=dev).values(fi=First('v'), la=Last('f'))),
+                             [(ps[0].time, {'fi': ps[0].data['v'], 'la': ps[-1].data['f']})])
+
+
+class LayoutTest(unittest.TestCase):
+    def points(self):
+        pts = make_points(600, step=7)
+        for i, p in enumerate(pts):
+            p.time += datetime.timedelta(microseconds=i % 3 * 7 + i // 3 % 2)
+        return pts
+
+    def check(self, tsdb, ref):
+        for dev in ('d0', 'd2'):
+            a, b = START + datetime.timedelta(seconds=100), START + datetime.timedelta(seconds=900)
+            q, r = [db.query('t', dev=dev).time_range(a, b) for db in (tsdb, ref)]
+            self.assertEqual(rows(q), rows(r))
+            self.assertEqual(rows(q.order_by('-time')[3:9]), rows(r.order_by('-time')[3:9]))
+            self.assertEqual(q.count(), r.count())
+            self.assertEqual(rows(q.after(a + datetime.timedelta(microseconds=1))), rows(r.after(a + datetime.timedelta(microseconds=1))))
+            self.assertEqual(list(q.columns('v')['time']), list(r.columns('v')['time']))
+            for group in ('minute', 'hour'):
+                self.assertEqual(rows(q.time_group(group).values(**VALUES)), rows(r.time_group(group).values(**VALUES)))
+        self.assertEqual(rows(tsdb.query('t').values(**VALUES)), rows(ref.query('t').values(**VALUES)))
+
+    def test_time_units(self):
+        pts = self.points()
+        ref = sqlite('t', points=pts)
+        for unit in ('us', 'ns'):
+            for layout in ('time', 'series'):
+                self.check(sqlite('t', define(time_unit=unit, layout=layout), points=pts), ref)
+
+    def test_migrate(self):
+        pts = self.points()
+        ref = sqlite('t', points=pts)
+        tsdb = sqlite('t', define(), points=pts)
+        for options in (define(time_unit='us'), define(time_unit='ns', layout='series'), define(time_unit='us', layout='series'),
+                        define(layout='series'), define(layout='time')):
+            tsdb.register_table('t', options)
+            self.check(tsdb, ref)
+            sql = [r[0] for r in tsdb.con.execute('SELECT sql FROM sqlite_master WHERE type = "index" AND tbl_name = "t"')]
+            self.assertTrue([q for q in sql if q and '`dev`' in q and '`_time`' in q], sql)
+            # series 表有 _time 索引
+            self.assertEqual(len([q for q in sql if q and q.endswith('(`_time`)')]), 1 if options.get('layout') == 'series' else 0, sql)
+        self.assertEqual(tsdb.con.execute('SELECT name FROM sqlite_master WHERE tbl_name = "t__migrate"').fetchall(), [])
+
+
+class DurabilityTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, True)
+
+    def check(self, params, writers=4, count=60):
+        '''
+        concurrent writers, every fourth write fails and every tenth deletes some points of the writer,
+        the committed points match the successful writes less the deleted ones
+        '''
+        uri = 'sqlite3://localhost%s' % os.path.join(self.path, 'tsdb%s.sqlite3' % len(os.listdir(self.path)))
+        tsdb = connect(uri + params)
+        tsdb.register_table('t', define(layout='time'))
+        written = []
+        deleted = []
+        errors = []
+
+        def write(k):
+            for i in range(count):
+                tm = START + datetime.timedelta(days=k, seconds=i)
+                p = TSDBPoint(time=tm, data={'dev': 'd%d' % k, 'v': i, 'f': None})
+                pts = [p, TSDBPoint(time=tm, data=dict(p.data))] if i % 4 == 3 else [p]
+                try:
+                    tsdb.write_points('t', copy_points(pts))
+                    written.append(p)
+                except sqlite3.IntegrityError as e:
+                    errors.append(e)
+                if i % 10 == 9:
+                    a, b = tm - datetime.timedelta(seconds=8), tm - datetime.timedelta(seconds=5)
+                    tsdb.query('t', dev='d%d' % k).time_range(a, b).delete()
+                    deleted.extend(x for x in written if x.data['dev'] == 'd%d' % k and a <= x.time <= b)
+
+        threads = [threading.Thread(target=write, args=(k,)) for k in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        tsdb.flush()
+        self.assertEqual(len(errors), writers * (count // 4))
+        self.assertEqual(len(deleted), writers * (count // 10) * 3)
+        expected = sorted_rows([p for p in written if p not in deleted])
+        self.assertEqual(sorted_rows(tsdb.query('t')), expected)
+        tsdb.close()
+        # 重新打开, 提交的写入和删除都在文件中
+        tsdb = connect(uri)
+        self.assertEqual(sorted_rows(tsdb.query('t')), expected)
+        tsdb.close()
+
+    def test_write(self):
+        self.check('')
+
+    def test_group(self):
+        self.check('?journal_mode=wal&durability=group')
+        self.check('?journal_mode=wal&synchronous=normal&durability=group&pool=0')
+
+    def test_async(self):
+        self.check('?journal_mode=wal&durability=async&commit_interval=0.01')
+        self.check('?durability=async&thread_local=1')
+
+
+if __name__ == '__main__':
+    unittest.main()
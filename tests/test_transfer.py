@@ -0,0 +1,66 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+'''
+from __future__ import print_function
+import shutil
+import tempfile
+import unittest
+
+from onetsdb import connect
+from onetsdb.transfer import copy_table
+from tests.util import make_points, sorted_rows, sqlite, mongo, mongomock, define
+
+
+class TransferTest(unittest.TestCase):
+    def check(self, src, dst, count):
+        for chunk in (4, 7, 1000):
+            dst.query('t').delete()
+            stats = copy_table(src, dst, 't', chunk_size=chunk, queue_size=2)
+            self.assertEqual(stats['points'], count)
+            self.assertEqual(dst.query('t').count(), count)
+            self.assertEqual(sorted_rows(dst.query('t')), sorted_rows(src.query('t')))
+
+    def test_sqlite(self):
+        pts = make_points(30)
+        self.check(sqlite('t', points=pts), sqlite('t'), 30)
+
+    @unittest.skipIf(mongomock == None, 'mongomock is not installed')
+    def test_mongo(self):
+        pts = make_points(30)
+        self.check(mongo('t', points=pts), mongo('t'), 30)
+        self.check(mongo('t', points=pts), sqlite('t'), 30)
+
+    def test_columnar(self):
+        path = tempfile.mkdtemp()
+        try:
+            dst = connect('columnar://localhost%s' % path)
+            dst.register_table('t', define())
+            self.check(sqlite('t', points=make_points(300)), dst, 300)
+        finally:
+            shutil.rmtree(path)
+
+    def test_resume(self):
+        # 中断在同一时间的点之间, 再次运行补齐其他序列
+        pts = make_points(30)
+        src = sqlite('t', points=pts)
+        for n in (1, 14, 15, 29, 30):
+            dst = sqlite('t', points=pts[:n])
+            stats = copy_table(src, dst, 't', chunk_size=4)
+            self.assertEqual(stats['resumed_from'], pts[n - 1].time)
+            self.assertEqual(stats['points'], 30 - n)
+            self.assertEqual(sorted_rows(dst.query('t')), sorted_rows(pts))
+            stats = copy_table(src, dst, 't', chunk_size=4)
+            self.assertEqual(stats['points'], 0)
+            self.assertEqual(dst.query('t').count(), 30)
+
+    def test_range(self):
+        pts = make_points(30)
+        src, dst = sqlite('t', points=pts), sqlite('t')
+        stats = copy_table(src, dst, 't', start=pts[6].time, end=pts[20].time, filter={'dev': 'd1'}, chunk_size=2)
+        self.assertEqual(sorted_rows(dst.query('t')), sorted_rows(p for p in pts[6:21] if p.data['dev'] == 'd1'))
+        self.assertEqual(stats['points'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*
+'''
+Created on 2026-10-18
+
+Helpers of the behaviour tests: the same points written to the backend under test and to a plain sqlite3 table
+'''
+from __future__ import print_function
+import datetime
+import random
+
+from onetsdb import connect, TSDBPoint
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+START = datetime.datetime(2021, 3, 1)
+
+DEFINE = {
+    'tags': {
+        'dev': 'string',
+    },
+    'fields': {
+        'v': 'int',
+        'f': 'float',
+    }
+}
+
+
+def define(**kwargs):
+    d = {'tags': dict(DEFINE['tags']), 'fields': dict(DEFINE['fields'])}
+    d.update(kwargs)
+    return d
+
+
+def make_points(count=300, series=3, seed=0, step=60, nulls=True):
+    '''
+    count points of series devices, the devices of one step share its time
+    '''
+    rnd = random.Random(seed)
+    pts = []
+    for i in range(count):
+        pts.append(TSDBPoint(time=START + datetime.timedelta(seconds=(i // series) * step), data={
+            'dev': 'd%d' % (i % series),
+            'v': rnd.randint(-50, 50),
+            'f': None if nulls and rnd.random() < .1 else round(rnd.uniform(-10, 10), 3),
+        }))
+    return pts
+
+
+def copy_points(points):
+    return [TSDBPoint(time=p.time, data=dict(p.data)) for p in points]
+
+
+def rows(points):
+    '''
+    comparable (time, data) of points
+    '''
+    return [(p.time, dict(p.data)) for p in points]
+
+
+def sorted_rows(points):
+    return sorted(rows(points), key=lambda r: (r[0], sorted((k, repr(v)) for k, v in r[1].items())))
+
+
+def sqlite(table=None, options=None, points=None, uri='sqlite3://:memory:'):
+    '''
+    sqlite3 tsdb, table in the series layout by default to keep several points per time
+    '''
+    tsdb = connect(uri)
+    if table:
+        tsdb.register_table(table, options or define(layout='series'))
+        if points:
+            tsdb.write_points(table, copy_points(points))
+    return tsdb
+
+
+def mongo(table=None, options=None, points=None):
+    from onetsdb.mongo import MongoTSDB
+    tsdb = MongoTSDB(mongomock.MongoClient().get_database('tsdb'))
+    tsdb.uri = 'mongodb://localhost/tsdb'
+    if table:
+        tsdb.register_table(table, options or define())
+        if points:
+            tsdb.write_points(table, copy_points(points))
+    return tsdb
+
+
+class FakeInfluxClient(object):
+    '''
+    InfluxDBClient recording the queries, every query returns no series
+    '''
+
+    def __init__(self):
+        self.queries = []
+
+    def query(self, ql, **kwargs):
+        from influxdb.resultset import ResultSet
+        self.queries.append(ql)
+        rs = ResultSet({'series': []})
+        return iter([rs]) if kwargs.get('chunked') else rs
+
+    def write_points(self, points, **kwargs):
+        return True
+
+    def create_database(self, dbname):
+        pass
+
+
+def influx(table=None, options=None):
+    from onetsdb.influx import InfluxDB, InfluxTSDB
+    client = FakeInfluxClient()
+    tsdb = InfluxTSDB(InfluxDB('tsdb', client, create=False))
+    if table:
+        tsdb.register_table(table, options or define())
+    return tsdb, client